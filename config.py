@@ -6,10 +6,42 @@ USE_STREAMING = True
 LLM_API_URL = "http://127.0.0.1:5050/generate_llama"
 LLM_STREAM_URL = "http://127.0.0.1:5050/generate_stream"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR-KEY-GOES-HERE")
+OPENAI_BASE_URL = None  # set to an OpenAI-compatible server URL to use it instead of api.openai.com
+# Seconds between keepalive pings on the shared LLM connection (0 disables).
+LLM_KEEPALIVE_INTERVAL = 0
+# Provider name (local_streaming, local, openai_streaming, openai); None picks one from USE_LOCAL_LLM / USE_STREAMING.
+LLM_PROVIDER = None
+# Seconds to wait for the first token, between tokens, and for the whole response (None disables).
+LLM_FIRST_TOKEN_TIMEOUT = 60
+LLM_TOKEN_TIMEOUT = 30
+LLM_TOTAL_TIMEOUT = 600
+# Speculative prefetch while the user is still talking: warm the LLM/TTS/blendshape connections
+# and pre-build the request from the chat history, so only the new message is left to add.
+ENABLE_SPECULATIVE_PREFETCH = True
+# Local LLM endpoint that loads a message prefix into its prompt cache ({"messages": [...]}); None if unsupported.
+LLM_PREFILL_URL = None
+# Where the per-turn context (related memories, the current time) goes in the request:
+#   "system"        - appended to the system message (one leading system message; works with every server)
+#   "user"          - prepended to the user message (system + history prefix stays cacheable)
+#   "after_history" - a second system message after the history (cacheable; the server must accept it)
+TURN_CONTEXT_PLACEMENT = "system"
+
+# Rolling chat history sent with each request: newest turns packed into this many prompt tokens.
+ROLLING_CONTEXT_TOKENS = 1000
+# Tokenizer used for the budget: "tiktoken:<encoding>" (needs tiktoken; falls back to an estimate),
+# "approx", or a name added with utils.llm.token_counter.register_tokenizer.
+TOKENIZER = "tiktoken:cl100k_base"
 
 MAX_CHUNK_LENGTH = 500
 FLUSH_TOKEN_COUNT = 300
 
+# Adaptive chunking: flush the first chunk early at a clause boundary (comma or conjunction)
+# once it has this many words (0 disables). Follow-up chunks wait for at least
+# FOLLOW_UP_MIN_CHUNK_LENGTH characters, growing by CHUNK_GROWTH_FACTOR per chunk.
+FIRST_CHUNK_MIN_WORDS = 6
+FOLLOW_UP_MIN_CHUNK_LENGTH = 80
+CHUNK_GROWTH_FACTOR = 1.5
+
 DEFAULT_VOICE_NAME = 'bf_isabella'
 USE_LOCAL_AUDIO = True
 LOCAL_TTS_URL = "http://127.0.0.1:8000/generate_speech" 
@@ -17,10 +49,67 @@ USE_COMBINED_ENDPOINT = False
 
 ENABLE_EMOTE_CALLS = False
 USE_VECTOR_DB = False
+# Approximate (IVF) vector search for large memories; more probes = better recall, slower search.
+VECTOR_DB_ANN = False
+# Clusters searched per query. None probes a quarter of them (at least 16), about 4x fewer rows scored
+# than exact search; recall depends on how clustered the memories are (utils/vector_db/bench_ann.py:
+# 0.76-1.0 at 10k, 0.98-1.0 at 100k). A fixed small number such as 8 is faster but can drop to ~0.6.
+VECTOR_DB_ANN_PROBES = None
+
+# Run the speech pipeline (LLM stream, TTS, blendshapes, playback) as coroutines on one asyncio loop
+# instead of one thread per worker.
+USE_ASYNC_PIPELINE = True
+# Bounds on the items waiting between stages (0 = unbounded) and what a put does when a queue is full:
+#   "block"       - wait for space (backpressure up to the LLM stream)
+#   "drop_oldest" - discard the oldest waiting item (loses speech, never waits)
+#   "coalesce"    - merge into the newest waiting item (text is joined, audio clips are stitched);
+#                   opt in per stage, only where merged items are still valid input for the next stage
+# Queue depth and overflow counts: utils.bounded_queue.queue_metrics().
+CHUNK_QUEUE_SIZE = 32
+CHUNK_QUEUE_POLICY = "block"
+# Audio clips with their facial data are the large items; also bounds TTS audio waiting for blendshapes.
+AUDIO_QUEUE_SIZE = 8
+AUDIO_QUEUE_POLICY = "block"
+# Tokens read ahead of the SentenceBuilder, per turn (coalescing can hide a sentence end inside a token).
+TOKEN_QUEUE_SIZE = 64
+TOKEN_QUEUE_POLICY = "block"
+
+# Per-turn latency trace spans (STT, LLM first token, chunk flushes, TTS, blendshapes, queue waits, pre-encode,
+# audio start, first/last LiveLink frame), kept in a ring buffer of the last TRACE_BUFFER_SIZE records
+# (utils.tracing.tracer.summary() gives percentiles). With TRACE_JSONL_PATH set, every record is also
+# appended to that file as one JSON line, e.g. "logs/trace.jsonl".
+ENABLE_TRACING = True
+TRACE_BUFFER_SIZE = 10000
+TRACE_JSONL_PATH = None
+
+# Stitch sentences that are already queued into one continuous clip (no blend back to idle between them).
+ENABLE_GAPLESS_PLAYBACK = True
+GAPLESS_CROSSFADE_MS = 40
+# When a clip ends with nothing queued, hold the last frame this long for the next sentence before
+# blending back to idle; it is stitched on if it arrives. 0 goes idle at once.
+GAPLESS_LOOKAHEAD_MS = 150
 
 
 BASE_SYSTEM_MESSAGE = "You are Mai, be nice.\n\n"
 
+# ---------------------------
+# LiveLink / Avatar Configuration
+# ---------------------------
+# Default LiveLink UDP target (Unreal's LiveLink Face source).
+LIVELINK_HOST = "127.0.0.1"
+LIVELINK_PORT = 11111
+# Send all avatars' frames of a tick with one sendmmsg() call (Linux); otherwise one sendto() per frame.
+LIVELINK_USE_SENDMMSG = True
+# Avatars driven by utils.avatar_runtime: each gets its own LiveLink subject, target, voice, idle loop and queues.
+# With more than one entry llm_to_face.py runs them all on one AvatarRuntime ("name: text" picks who answers).
+AVATARS = [
+    {"name": "face1", "host": LIVELINK_HOST, "port": LIVELINK_PORT, "voice": DEFAULT_VOICE_NAME},
+]
+# Worker pools shared by all avatars (the LiveLink pool bounds how many avatars speak at once).
+AVATAR_TTS_WORKERS = 2
+AVATAR_BLENDSHAPE_WORKERS = 2
+AVATAR_LIVELINK_WORKERS = 4
+
 # ---------------------------
 # Emote Sender Configuration (new)
 # ---------------------------
@@ -31,6 +120,13 @@ EMOTE_SERVER_PORT = 7777
 # Transcription Server Configuration (new)
 # ---------------------------
 TRANSCRIPTION_SERVER_URL = "http://127.0.0.1:6969/transcribe"
+# Send WAV bytes as the raw request body instead of base64 JSON (falls back automatically if rejected).
+TRANSCRIPTION_RAW_UPLOAD = True
+# Streaming endpoint: chunked PCM upload, newline-delimited JSON partial transcripts back.
+TRANSCRIPTION_STREAM_URL = "http://127.0.0.1:6969/transcribe_stream"
+# Hands-free mode starts the reply once this many partial transcripts in a row are identical; if the
+# final transcript turns out different, that reply is cancelled and restarted. 0 disables speculation.
+SPECULATIVE_TURN_STABLE_UPDATES = 2
 
 # ---------------------------
 # Embedding Configurations (new)
@@ -43,6 +139,12 @@ EMBEDDING_LOCAL_SERVER_URL = "http://127.0.0.1:7070/get_embedding"
 EMBEDDING_OPENAI_MODEL = "text-embedding-3-small"
 LOCAL_EMBEDDING_SIZE = 768
 OPENAI_EMBEDDING_SIZE = 1536
+# Embeddings are cached by model and text: EMBEDDING_CACHE_SIZE entries in memory, plus an on-disk cache (None disables).
+EMBEDDING_CACHE_SIZE = 1024
+EMBEDDING_DISK_CACHE = "chat_logs/embedding_cache"
+# Most embeddings kept on disk (about 3 KB each at 768 dims), in two files of half this size each;
+# when the newer one fills up the older one is deleted.
+EMBEDDING_DISK_CACHE_SIZE = 20000
 
 # ---------------------------
 # Neurosync API Configurations (new)
@@ -75,8 +177,21 @@ def get_llm_config(system_message=None):
         "LLM_API_URL": LLM_API_URL,
         "LLM_STREAM_URL": LLM_STREAM_URL,
         "OPENAI_API_KEY": OPENAI_API_KEY,
+        "OPENAI_BASE_URL": OPENAI_BASE_URL,
+        "LLM_KEEPALIVE_INTERVAL": LLM_KEEPALIVE_INTERVAL,
+        "LLM_PROVIDER": LLM_PROVIDER,
+        "LLM_FIRST_TOKEN_TIMEOUT": LLM_FIRST_TOKEN_TIMEOUT,
+        "LLM_TOKEN_TIMEOUT": LLM_TOKEN_TIMEOUT,
+        "LLM_TOTAL_TIMEOUT": LLM_TOTAL_TIMEOUT,
+        "LLM_PREFILL_URL": LLM_PREFILL_URL,
+        "TURN_CONTEXT_PLACEMENT": TURN_CONTEXT_PLACEMENT,
         "max_chunk_length": MAX_CHUNK_LENGTH,
         "flush_token_count": FLUSH_TOKEN_COUNT,
+        "first_chunk_min_words": FIRST_CHUNK_MIN_WORDS,
+        "follow_up_min_chunk_length": FOLLOW_UP_MIN_CHUNK_LENGTH,
+        "chunk_growth_factor": CHUNK_GROWTH_FACTOR,
+        "TOKEN_QUEUE_SIZE": TOKEN_QUEUE_SIZE,
+        "TOKEN_QUEUE_POLICY": TOKEN_QUEUE_POLICY,
         "system_message": system_message,
     }
 
@@ -148,3 +148,37 @@ def blend_animation_data_to_loop_by_dimension(animation_data, dimensions, blend_
             animation_data[end_index][dim] = blended_value
     return animation_data
 
+
+def stitch_facial_data(facial_clips, start_times, fps=60):
+    """
+    Join several facial-data clips into one continuous frame schedule.
+
+    Each clip is placed at the frame matching its audio start time (see
+    stitch_wav_bytes). Where a clip overlaps the previous one the frames are
+    crossfaded linearly; where there is a gap the last frame is held, so the
+    face never drops back to idle between sentences. Empty clips are skipped.
+    """
+    stitched = []
+
+    for clip, start_time in zip(facial_clips, start_times):
+        clip = [list(frame) for frame in clip]
+        if not clip:
+            continue
+        start = int(round(start_time * fps))
+        if not stitched:
+            # Earlier clips had no frames: hold this clip's first frame until its audio starts.
+            stitched = [list(clip[0]) for _ in range(start)]
+
+        while len(stitched) < start:
+            stitched.append(list(stitched[-1]))
+
+        overlap = min(len(stitched) - start, len(clip))
+        for i in range(overlap):
+            weight = (i + 1) / (overlap + 1)
+            previous = stitched[start + i]
+            stitched[start + i] = [
+                (1 - weight) * a + weight * b for a, b in zip(previous, clip[i])
+            ]
+        stitched.extend(clip[overlap:])
+
+    return stitched
@@ -3,11 +3,11 @@
 # Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
 
 import time
-import socket
 import pandas as pd
 from threading import Event
+from contextlib import nullcontext
 
-from livelink.connect.livelink_init import FaceBlendShape, UDP_IP, UDP_PORT
+from livelink.connect.livelink_init import FaceBlendShape, create_socket_connection
 from livelink.animations.blending_anims import blend_animation_start_end
 from livelink.animations.blending_anims import default_animation_state, blend_animation_start_end
 
@@ -32,21 +32,26 @@ default_animation_data = load_animation(ground_truth_path)
 # Create the blended default animation data
 default_animation_data = blend_animation_start_end(default_animation_data, blend_frames=16)
 
-# Event to signal stopping of the default animation loop
+# Event to signal stopping of the default animation loop (single-face scripts;
+# each avatar in utils.avatar_runtime has its own).
 stop_default_animation = Event()
 
-def default_animation_loop(py_face):
+def default_animation_loop(py_face, stop_event=None, animation_state=None, socket_connection=None):
     """
-    Loops through the default animation and updates global index state.
+    Loops through the default animation and updates the idle index state.
+    stop_event, animation_state and socket_connection default to the
+    module-level single-face state and a new socket to the default target.
     """
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-        s.connect((UDP_IP, UDP_PORT))
-        while not stop_default_animation.is_set():
+    stop_event = stop_event if stop_event is not None else stop_default_animation
+    animation_state = animation_state if animation_state is not None else default_animation_state
+    # A caller's socket stays open; a socket made here is closed when the loop stops.
+    with nullcontext(socket_connection) if socket_connection is not None else create_socket_connection() as s:
+        while not stop_event.is_set():
             for idx, frame in enumerate(default_animation_data):
-                if stop_default_animation.is_set():
+                if stop_event.is_set():
                     break
                 # update shared state
-                default_animation_state['current_index'] = idx
+                animation_state['current_index'] = idx
 
                 for i, value in enumerate(frame):
                     py_face.set_blendshape(FaceBlendShape(i), float(value))
@@ -58,7 +63,7 @@ def default_animation_loop(py_face):
                 # maintain 60fps
                 total_sleep = 1 / 60
                 sleep_interval = 0.005
-                while total_sleep > 0 and not stop_default_animation.is_set():
+                while total_sleep > 0 and not stop_event.is_set():
                     time.sleep(min(sleep_interval, total_sleep))
                     total_sleep -= sleep_interval
 
@@ -0,0 +1,95 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# livelink/connect/bench_udp_batch.py
+#
+# LiveLink send throughput and tick jitter on loopback, sendto() loop vs sendmmsg().
+#   python -m livelink.connect.bench_udp_batch
+#   python -m livelink.connect.bench_udp_batch --faces 1 10 100 500 --seconds 5
+#
+# Every face sends real LiveLink packets to its own receiver port. Receivers are
+# never read, so the numbers are the sender's cost (the kernel drops datagrams
+# once a receiver buffer is full, which does not slow the sender down).
+
+import time
+import socket
+import argparse
+import numpy as np
+
+from livelink.connect.livelink_init import initialize_py_face
+from livelink.connect.udp_batch import BatchSender, LiveLinkTicker
+
+
+class StaticFace:
+    def __init__(self, index, address):
+        face = initialize_py_face(f"bench{index}", f"bench-{index}")
+        self.packet = face.encode()
+        self.address = address
+
+    def next_packet(self, now, timecode):
+        return self.packet
+
+
+def open_receivers(count):
+    receivers = []
+    for _ in range(count):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(("127.0.0.1", 0))
+        receivers.append(s)
+    return receivers
+
+
+def throughput(packets, use_sendmmsg, seconds):
+    sender = BatchSender(use_sendmmsg=use_sendmmsg, min_batch=1)
+    sent, batches = 0, 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        sent += sender.send(packets)
+        batches += 1
+    elapsed = time.perf_counter() - start
+    sender.close()
+    return sent / elapsed, elapsed / batches
+
+
+def jitter(faces, use_sendmmsg, seconds, fps):
+    ticker = LiveLinkTicker(fps=fps, sender=BatchSender(use_sendmmsg=use_sendmmsg, min_batch=1))
+    for face in faces:
+        ticker.add(face)
+    ticker.start()
+    time.sleep(seconds)
+    ticker.stop()
+    ticker.sender.close()
+    lateness = np.array(ticker.lateness) * 1000
+    return np.percentile(lateness, 50), np.percentile(lateness, 99), lateness.max(), ticker.skipped_ticks
+
+
+def run(count, seconds, fps):
+    receivers = open_receivers(count)
+    faces = [StaticFace(i, r.getsockname()) for i, r in enumerate(receivers)]
+    packets = [(face.packet, face.address) for face in faces]
+    print(f"\n{count} faces, {len(packets[0][0])}-byte packets")
+    modes = [("sendto loop", False)]
+    if BatchSender().batched:
+        modes.append(("sendmmsg", True))
+    for label, use_sendmmsg in modes:
+        rate, per_batch = throughput(packets, use_sendmmsg, seconds)
+        p50, p99, worst, skipped = jitter(faces, use_sendmmsg, seconds, fps)
+        print(f"  {label:<12}: {rate:>10,.0f} packets/s  {per_batch * 1e6:8.1f} us/tick  "
+              f"| {fps} fps tick lateness p50 {p50:.3f} ms  p99 {p99:.3f} ms  max {worst:.3f} ms  skipped {skipped}")
+    for r in receivers:
+        r.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched LiveLink UDP benchmark")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--fps", type=int, default=60)
+    args = parser.parse_args()
+    for count in args.faces:
+        run(count, args.seconds, args.fps)
+
+
+if __name__ == "__main__":
+    main()
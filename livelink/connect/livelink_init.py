@@ -6,18 +6,24 @@
 
 import socket
 from livelink.connect.pylivelinkface import PyLiveLinkFace, FaceBlendShape
+from config import LIVELINK_HOST, LIVELINK_PORT
 
 
-UDP_IP = "127.0.0.1"
-UDP_PORT = 11111
+# Default LiveLink target; avatars may each send to their own address.
+UDP_IP = LIVELINK_HOST
+UDP_PORT = LIVELINK_PORT
 
-def create_socket_connection():
+def create_socket_connection(address=None):
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.connect((UDP_IP, UDP_PORT))
+    s.connect(address or (UDP_IP, UDP_PORT))
     return s
 
-def initialize_py_face():
-    py_face = PyLiveLinkFace()
+def initialize_py_face(name="face1", face_uuid=None):
+    """
+    Returns a zeroed PyLiveLinkFace. Faces created without face_uuid share the
+    process-wide default subject id; give each avatar its own uuid and name.
+    """
+    py_face = PyLiveLinkFace(name=name, uuid=face_uuid) if face_uuid else PyLiveLinkFace(name=name)
     initial_blendshapes = [0.0] * 61
     for i, value in enumerate(initial_blendshapes):
         py_face.set_blendshape(FaceBlendShape(i), float(value))
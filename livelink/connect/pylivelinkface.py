@@ -40,13 +40,25 @@ class PyLiveLinkFace:
         self._old_blend_shapes = [deque([0.0], maxlen=filter_size) for _ in range(61)]
 
     def encode(self) -> bytes:
+        return self.encode_header() + self.encode_timecode() + self.encode_body()
+
+    # A packet is header + timecode + body. The header only depends on the
+    # subject and the body only on the blendshapes, so batched senders can
+    # cache them and pack just the timecode once per tick.
+
+    def encode_header(self) -> bytes:
         version_packed = struct.pack('<I', self._version)
         uuid_packed = self.uuid.encode('utf-8')
         name_packed = self.name.encode('utf-8')
         name_length_packed = struct.pack('!i', len(self.name))
+        return version_packed + uuid_packed + name_length_packed + name_packed
+
+    def encode_timecode(self) -> bytes:
         now = datetime.datetime.now()
         timcode = Timecode(self.fps, f'{now.hour}:{now.minute}:{now.second}:{now.microsecond * 0.001}')
-        frames_packed = struct.pack("!II", timcode.frames, self._sub_frame)
+        return struct.pack("!II", timcode.frames, self._sub_frame)
+
+    def encode_body(self) -> bytes:
         frame_rate_packed = struct.pack("!II", self.fps, self._denominator)
     
         scaled_blend_shapes = scale_blendshapes_by_section(
@@ -62,7 +74,7 @@ class PyLiveLinkFace:
     
         data_packed = struct.pack('!B61f', 61, *scaled_blend_shapes)
 
-        return version_packed + uuid_packed + name_length_packed + name_packed + frames_packed + frame_rate_packed + data_packed
+        return frame_rate_packed + data_packed
 
     def set_blendshape(self, index: FaceBlendShape, value: float, no_filter: bool = True) -> None:        
         if index in [FaceBlendShape.HeadYaw, FaceBlendShape.HeadPitch, FaceBlendShape.HeadRoll]:
@@ -0,0 +1,238 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# livelink/connect/udp_batch.py
+#
+# Batched LiveLink sending for many faces. A single LiveLinkTicker thread asks
+# every registered face for its packet once per frame and hands the whole tick
+# to BatchSender, which sends it with one sendmmsg() system call on Linux and
+# falls back to a sendto() loop elsewhere (or if sendmmsg fails).
+
+import sys
+import time
+import errno
+import ctypes
+import socket
+import struct
+import numpy as np
+from collections import deque
+from threading import Thread, Event, Lock
+
+from config import LIVELINK_USE_SENDMMSG
+from livelink.connect.pylivelinkface import PyLiveLinkFace
+
+# Linux caps one sendmmsg() call at UIO_MAXIOV messages.
+MAX_BATCH = 1024
+# Below this many datagrams, setting up the batch costs more than the system calls it saves.
+MIN_BATCH = 16
+
+# 64-bit Linux layouts, as rows of uint64 words:
+#   struct iovec   { iov_base, iov_len }                                   -> 2 words
+#   struct mmsghdr { msg_name, msg_namelen, msg_iov, msg_iovlen,
+#                    msg_control, msg_controllen, msg_flags, msg_len }    -> 8 words
+# (the 32-bit fields share a word with their padding). Filling these with
+# NumPy keeps the per-tick Python work independent of the number of faces.
+_IOV_WORDS = 2
+_MSG_WORDS = 8
+_SOCKADDR_IN_SIZE = 16
+
+
+def _load_sendmmsg():
+    if not sys.platform.startswith("linux") or ctypes.sizeof(ctypes.c_void_p) != 8:
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+class BatchSender:
+    """
+    Sends a list of (payload, (host, port)) datagrams from one unconnected UDP socket.
+    """
+
+    def __init__(self, use_sendmmsg=LIVELINK_USE_SENDMMSG, min_batch=MIN_BATCH):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sendmmsg = _load_sendmmsg() if use_sendmmsg else None
+        self.min_batch = min_batch
+        self._resolved = {}
+        self._sockaddrs = {}
+        self._capacity = 0
+        self._msgs = None
+        self._iovs = None
+
+    @property
+    def batched(self):
+        return self._sendmmsg is not None
+
+    def _resolve(self, address):
+        resolved = self._resolved.get(address)
+        if resolved is None:
+            host, port = address
+            resolved = (socket.gethostbyname(host), port)
+            self._resolved[address] = resolved
+        return resolved
+
+    def _sockaddr(self, address):
+        """
+        Address of a cached struct sockaddr_in for address.
+        """
+        entry = self._sockaddrs.get(address)
+        if entry is None:
+            ip, port = self._resolve(address)
+            # family (host order), port (network order), IPv4 address, 8 bytes padding.
+            raw = struct.pack("=H", socket.AF_INET) + struct.pack("!H", port) + socket.inet_aton(ip) + bytes(8)
+            buffer = ctypes.create_string_buffer(raw, _SOCKADDR_IN_SIZE)
+            entry = (buffer, ctypes.addressof(buffer))
+            self._sockaddrs[address] = entry
+        return entry[1]
+
+    def _ensure_capacity(self, count):
+        if count <= self._capacity:
+            return
+        capacity = max(count, self._capacity * 2, 16)
+        self._iovs = np.zeros((capacity, _IOV_WORDS), dtype=np.uint64)
+        self._msgs = np.zeros((capacity, _MSG_WORDS), dtype=np.uint64)
+        self._msgs[:, 1] = _SOCKADDR_IN_SIZE
+        self._msgs[:, 2] = self._iovs.ctypes.data + np.arange(capacity, dtype=np.uint64) * (_IOV_WORDS * 8)
+        self._msgs[:, 3] = 1
+        self._capacity = capacity
+
+    def send(self, packets):
+        """
+        Returns the number of datagrams handed to the kernel.
+        """
+        if not packets:
+            return 0
+        if self._sendmmsg is None or len(packets) < self.min_batch:
+            return self._send_loop(packets)
+        sent = 0
+        for start in range(0, len(packets), MAX_BATCH):
+            sent += self._send_batch(packets[start:start + MAX_BATCH])
+        return sent
+
+    def _send_loop(self, packets):
+        sent = 0
+        for payload, address in packets:
+            try:
+                self.sock.sendto(payload, self._resolve(address))
+                sent += 1
+            except OSError as e:
+                print(f"Error sending LiveLink packet to {address}: {e}")
+        return sent
+
+    def _send_batch(self, packets):
+        count = len(packets)
+        self._ensure_capacity(count)
+        payloads = [payload for payload, _ in packets]
+        # One contiguous buffer; each datagram's iovec points into it.
+        blob = b"".join(payloads)
+        base = ctypes.cast(ctypes.c_char_p(blob), ctypes.c_void_p).value
+        lengths = np.fromiter(map(len, payloads), dtype=np.uint64, count=count)
+        self._iovs[:count, 0] = base + (np.cumsum(lengths) - lengths)
+        self._iovs[:count, 1] = lengths
+        self._msgs[:count, 0] = [self._sockaddr(address) for _, address in packets]
+
+        sent = 0
+        fd = self.sock.fileno()
+        msgs = self._msgs.ctypes.data
+        while sent < count:
+            result = self._sendmmsg(fd, msgs + sent * _MSG_WORDS * 8, count - sent, 0)
+            if result < 0:
+                if ctypes.get_errno() == errno.EINTR:
+                    continue
+                # Let the plain loop report (and skip) whatever the kernel rejected.
+                return sent + self._send_loop(packets[sent:])
+            sent += result
+        return sent
+
+    def close(self):
+        self.sock.close()
+
+
+class LiveLinkTicker:
+    """
+    One thread that sends a frame for every registered face per tick.
+
+    A face (source) provides `address` and next_packet(now, timecode) -> bytes
+    or None, where timecode is this tick's packed LiveLink timecode. Ticks are
+    scheduled against absolute deadlines, so sleep error does not accumulate;
+    if a tick overruns by more than a frame, missed ticks are skipped rather
+    than sent in a burst. lateness keeps how late each recent tick started.
+    """
+
+    def __init__(self, fps=60, sender=None):
+        self.fps = fps
+        self.sender = sender or BatchSender()
+        self.sources = []
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+        self.timecode_face = PyLiveLinkFace(fps=fps)
+        self.ticks = 0
+        self.packets_sent = 0
+        self.skipped_ticks = 0
+        self.lateness = deque(maxlen=4096)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def add(self, source):
+        with self.lock:
+            if source not in self.sources:
+                self.sources = self.sources + [source]
+
+    def remove(self, source):
+        with self.lock:
+            self.sources = [s for s in self.sources if s is not source]
+
+    def start(self):
+        if not self.running:
+            self.stop_event.clear()
+            self.thread = Thread(target=self._run, name="livelink-ticker", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def tick(self, now):
+        timecode = self.timecode_face.encode_timecode()
+        packets = []
+        for source in self.sources:
+            try:
+                packet = source.next_packet(now, timecode)
+            except Exception as e:
+                print(f"Error building LiveLink frame: {e}")
+                continue
+            if packet is not None:
+                packets.append((packet, source.address))
+        self.packets_sent += self.sender.send(packets)
+        self.ticks += 1
+
+    def _run(self):
+        period = 1 / self.fps
+        next_tick = time.perf_counter()
+        while not self.stop_event.is_set():
+            now = time.perf_counter()
+            if now < next_tick:
+                if self.stop_event.wait(next_tick - now):
+                    break
+                now = time.perf_counter()
+            self.lateness.append(now - next_tick)
+            self.tick(now)
+            next_tick += period
+            behind = time.perf_counter() - next_tick
+            if behind > period:
+                missed = int(behind / period)
+                self.skipped_ticks += missed
+                next_tick += missed * period
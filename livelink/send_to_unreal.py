@@ -14,20 +14,26 @@ from livelink.animations.blending_anims import (
     FAST_BLENDSHAPES,
     default_animation_state,
 )
+from utils.tracing import tracer
 
-def pre_encode_facial_data(facial_data: list, py_face, fps: int = 60, smooth: bool = False) -> list:
+def pre_encode_facial_data(facial_data: list, py_face, fps: int = 60, smooth: bool = False, animation_state: dict = None) -> list:
     """
     Encodes the full stream:
     1. Blend-IN (idle → capture)
     2. Main captured frames
     3. Blend-OUT (capture → idle **frame 0**)
 
+    animation_state is the idle-loop state of the face being encoded (an
+    avatar's own); it defaults to the shared single-face state.
+
     Returns
     -------
     encoded_data : list[bytes]
         Ready-to-send UDP packets.
     """
     encoded_data = []
+    if animation_state is None:
+        animation_state = default_animation_state
     apply_blink_to_facial_data(facial_data, default_animation_data)
 
     total_duration = len(facial_data) / fps
@@ -40,12 +46,14 @@ def pre_encode_facial_data(facial_data: list, py_face, fps: int = 60, smooth: bo
 
     fast_blend_in = generate_blend_frames(
         facial_data, slow_blend_frames, default_animation_data, fps,
-        FAST_BLENDSHAPES, mode='in', active_duration_sec=fast_duration
+        FAST_BLENDSHAPES, mode='in', active_duration_sec=fast_duration,
+        default_start_index=animation_state['current_index']
     )
 
     slow_blend_in = generate_blend_frames(
         facial_data, slow_blend_frames, default_animation_data, fps,
-        set(range(51)) - FAST_BLENDSHAPES, mode='in'
+        set(range(51)) - FAST_BLENDSHAPES, mode='in',
+        default_start_index=animation_state['current_index']
     )
 
     blend_in_frames = combine_frame_streams(slow_blend_in, fast_blend_in, FAST_BLENDSHAPES)
@@ -63,7 +71,7 @@ def pre_encode_facial_data(facial_data: list, py_face, fps: int = 60, smooth: bo
             py_face.set_blendshape(FaceBlendShape(i), frame_data[i])
         encoded_data.append(py_face.encode())
 
-    default_animation_state['current_index'] = 0
+    animation_state['current_index'] = 0
 
     fast_blend_out = generate_blend_frames(
         facial_data, slow_blend_frames, default_animation_data, fps,
@@ -115,9 +123,13 @@ def smooth_facial_data(facial_data: list) -> list:
     return smoothed_data
 
 
-def send_pre_encoded_data_to_unreal(encoded_facial_data: List[bytes], start_event, fps: int, socket_connection=None):
+def send_pre_encoded_data_to_unreal(encoded_facial_data: List[bytes], start_event, fps: int, socket_connection=None, cancel_event=None):
+    """
+    Sends pre-encoded frames at `fps` once start_event is set.
+    Stops before the next frame when cancel_event is set.
+    """
+    own_socket = False
     try:
-        own_socket = False
         if socket_connection is None:
             socket_connection = create_socket_connection()
             own_socket = True
@@ -125,17 +137,30 @@ def send_pre_encoded_data_to_unreal(encoded_facial_data: List[bytes], start_even
         start_event.wait()  
         frame_duration = 1 / fps  
         start_time = time.time()  
+        frames_sent = 0
 
         for frame_index, frame_data in enumerate(encoded_facial_data):
+            if cancel_event is not None and cancel_event.is_set():
+                break
             current_time = time.time()
             elapsed_time = current_time - start_time
             expected_time = frame_index * frame_duration 
             if elapsed_time < expected_time:
-                time.sleep(expected_time - elapsed_time)
+                if cancel_event is not None:
+                    if cancel_event.wait(expected_time - elapsed_time):
+                        break
+                else:
+                    time.sleep(expected_time - elapsed_time)
             elif elapsed_time > expected_time + frame_duration:
                 continue
 
             socket_connection.sendall(frame_data)  
+            if frames_sent == 0:
+                tracer.mark("livelink_first_frame", cancel_event)
+            frames_sent += 1
+
+        if frames_sent:
+            tracer.mark("livelink_last_frame", cancel_event, frames=frames_sent)
 
     except KeyboardInterrupt:
         pass
@@ -7,34 +7,54 @@ import pygame
 import keyboard  
 import time      
 from livelink.animations.default_animation import  stop_default_animation
-from utils.stt.transcribe_whisper import transcribe_audio
-from utils.audio.record_audio import record_audio_until_release
+from utils.stt.transcribe_whisper import transcribe_audio, StreamingTranscriber
+from utils.audio.record_audio import record_audio_until_release, record_audio_until_silence
 from utils.vector_db.vector_db import vector_db
-from utils.llm.turn_processing import process_turn
-from utils.llm.llm_initialiser import initialize_system
-from config import BASE_SYSTEM_MESSAGE, get_llm_config, setup_warnings
+from utils.llm.turn_processing import process_turn, process_avatar_turn, SpeculativeTurn
+from utils.llm.llm_initialiser import initialize_system, initialize_avatar_system
+from utils.llm.speculative_prefetch import SpeculativePrefetch
+from utils.tracing import tracer
+from config import (AVATARS, BASE_SYSTEM_MESSAGE, ENABLE_SPECULATIVE_PREFETCH, SPECULATIVE_TURN_STABLE_UPDATES,
+                    get_llm_config, setup_warnings)
 
 setup_warnings()
 llm_config = get_llm_config(system_message=BASE_SYSTEM_MESSAGE)
 
 def main():
-    system_objects = initialize_system()
-    socket_connection = system_objects['socket_connection']
+    # With several avatars in config.AVATARS they all run on one AvatarRuntime; "name: text" picks who answers.
+    runtime = None
+    if len(AVATARS) > 1:
+        system_objects = initialize_avatar_system()
+        runtime = system_objects['runtime']
+        cancel_current = runtime.cancel_all
+        print("Avatars: " + ", ".join(runtime.avatars) + ". Start a message with 'name:' to choose who answers.")
+    else:
+        system_objects = initialize_system()
+        socket_connection = system_objects['socket_connection']
+        chunk_queue = system_objects['chunk_queue']
+        audio_queue = system_objects['audio_queue']
+        tts_worker_thread = system_objects['tts_worker_thread']
+        audio_worker_thread = system_objects['audio_worker_thread']
+        default_animation_thread = system_objects['default_animation_thread']
+        turn_control = system_objects['turn_control']
+        pipeline = system_objects['pipeline']
+        cancel_current = turn_control.cancel_current
     full_history = system_objects['full_history']
     chat_history = system_objects['chat_history']
-    chunk_queue = system_objects['chunk_queue']
-    audio_queue = system_objects['audio_queue']
-    tts_worker_thread = system_objects['tts_worker_thread']
-    audio_worker_thread = system_objects['audio_worker_thread']
-    default_animation_thread = system_objects['default_animation_thread']
+    bookkeeper = system_objects['bookkeeper']
+    avatar = None
     
     mode = ""
-    while mode not in ['t', 'r']:
-        mode = input("Choose input mode: 't' for text, 'r' for push-to-talk, 'q' to quit: ").strip().lower()
+    while mode not in ['t', 'r', 'v']:
+        mode = input("Choose input mode: 't' for text, 'r' for push-to-talk, 'v' for hands-free voice, 'q' to quit: ").strip().lower()
         if mode == 'q':
             return
+    if mode == 'r':
+        # Barge-in: pressing the talk key cancels the answer in flight (LLM, TTS, audio and face).
+        keyboard.on_press_key('right ctrl', lambda _: cancel_current())
     try:
         while True:
+            prefetch = None
             if mode == 'r':
                 print("\n\nPush-to-talk mode: press/hold Right Ctrl to record, release to finish.")
                 while not keyboard.is_pressed('right ctrl'):
@@ -42,6 +62,8 @@ def main():
                         print("Recording cancelled. Exiting push-to-talk mode.")
                         return
                     time.sleep(0.01)
+                if ENABLE_SPECULATIVE_PREFETCH:
+                    prefetch = SpeculativePrefetch(chat_history, llm_config).start()
                 audio_bytes = record_audio_until_release()
                 transcription, _ = transcribe_audio(audio_bytes)
                 if transcription:
@@ -49,24 +71,72 @@ def main():
                 else:
                     print("Transcription failed. Make sure you have a stt api and it's correctly set in utils > stt > transcribe_whisper.py. Please try again.")
                     continue
+            elif mode == 'v':
+                if ENABLE_SPECULATIVE_PREFETCH:
+                    prefetch = SpeculativePrefetch(chat_history, llm_config).start()
+                # Once the partial transcript settles, the reply starts before recording has even stopped.
+                speculation = []
+                on_stable_partial = None
+                if runtime is None and SPECULATIVE_TURN_STABLE_UPDATES:
+                    on_stable_partial = lambda text: speculation.append(SpeculativeTurn(
+                        text, chat_history, full_history, llm_config, chunk_queue, audio_queue, vector_db,
+                        BASE_SYSTEM_MESSAGE, turn_control, prefetch=prefetch, bookkeeper=bookkeeper).start())
+                transcriber = StreamingTranscriber(sample_rate=88200, on_stable_partial=on_stable_partial,
+                                                   stable_updates=SPECULATIVE_TURN_STABLE_UPDATES).start()
+                audio_bytes = record_audio_until_silence(sr=88200, on_chunk=transcriber.feed)
+                transcription = transcriber.result(timeout=30) if audio_bytes is not None else None
+                if speculation:
+                    updated_history = speculation[0].confirm(transcriber.matches_speculation(transcription))
+                    if updated_history is not None:
+                        chat_history = updated_history
+                        continue
+                if audio_bytes is None:
+                    continue
+                if not transcription:
+                    transcription, _ = transcribe_audio(audio_bytes)
+                if not transcription:
+                    print("Transcription failed. Please try again.")
+                    continue
+                user_input = transcription
             else:
                 user_input = input("\n\nEnter text (or 'q' to quit): ").strip()
                 if user_input.lower() == 'q':
                     break
 
-            chat_history = process_turn(user_input, chat_history, full_history, llm_config, chunk_queue, audio_queue, vector_db, base_system_message=BASE_SYSTEM_MESSAGE)
+            if runtime is not None:
+                avatar, user_input = runtime.addressed(user_input, avatar)
+                chat_history = process_avatar_turn(runtime, avatar, user_input, chat_history, full_history, llm_config, vector_db,
+                                                   base_system_message=BASE_SYSTEM_MESSAGE, prefetch=prefetch,
+                                                   bookkeeper=bookkeeper)
+                continue
+
+            chat_history = process_turn(user_input, chat_history, full_history, llm_config, chunk_queue, audio_queue, vector_db, base_system_message=BASE_SYSTEM_MESSAGE,
+                                        turn_control=turn_control, prefetch=prefetch,
+                                        bookkeeper=bookkeeper)
 
     finally:
-        chunk_queue.join()
-        chunk_queue.put(None)
-        tts_worker_thread.join()
-        audio_queue.join()
-        audio_queue.put(None)
-        audio_worker_thread.join()
-        stop_default_animation.set()
-        default_animation_thread.join()
+        bookkeeper.stop()
+        if runtime is not None:
+            runtime.wait_until_idle()
+            runtime.shutdown()
+        else:
+            chunk_queue.join()
+            chunk_queue.put(None)
+            tts_worker_thread.join()
+            audio_queue.join()
+            audio_queue.put(None)
+            audio_worker_thread.join()
+            if pipeline is not None:
+                pipeline.stop()
+        tracer.close()
+        if tracer.enabled:
+            print("\nLatency per stage:\n" + tracer.format_summary())
+        if runtime is None:
+            stop_default_animation.set()
+            default_animation_thread.join()
         pygame.quit()
-        socket_connection.close()
+        if runtime is None:
+            socket_connection.close()
         
 if __name__ == "__main__":
     main()
@@ -16,7 +16,7 @@ from livelink.animations.default_animation import default_animation_loop, stop_d
 
 from utils.audio.record_audio import record_audio_until_release
 from utils.generated_runners import run_audio_animation
-from utils.files.file_utils import save_generated_data, initialize_directories
+from utils.files.file_utils import save_generated_data_async, generated_data_writer, initialize_directories
 from utils.neurosync.neurosync_api_connect import send_audio_to_neurosync
 
 from utils.emote_sender.send_emote import EmoteConnect
@@ -51,11 +51,12 @@ if __name__ == "__main__":
                         if ENABLE_EMOTE_CALLS:
                             EmoteConnect.send_emote("stopspeaking")
                     
-                    save_generated_data(audio_bytes, generated_facial_data)
+                    save_generated_data_async(audio_bytes, generated_facial_data)
                     break
             if keyboard.is_pressed('q'):
                 break
     finally:
+        generated_data_writer.stop()
         stop_default_animation.set()
         if default_animation_thread:
             default_animation_thread.join()
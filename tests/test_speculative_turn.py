@@ -0,0 +1,125 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# tests/test_speculative_turn.py
+#
+# Hands-free speculation: StreamingTranscriber against a local stand-in server
+# starts a SpeculativeTurn on a stable partial; the final transcript either
+# confirms it (recorded once) or abandons it (cancelled, never recorded).
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from queue import Queue
+
+import utils.llm.turn_processing as turn_processing
+from utils.cancellation import TurnControl
+from utils.llm.turn_processing import SpeculativeTurn
+from utils.stt.transcribe_whisper import StreamingTranscriber
+
+
+def serve_transcript(lines):
+    """
+    Starts a stand-in streaming STT server that reads the chunked upload and
+    answers with the given newline-delimited JSON messages.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                self.rfile.read(size + 2)
+                if size == 0:
+                    break
+            self.send_response(200)
+            self.end_headers()
+            for line in lines:
+                self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class SpeculativeTurnTest(unittest.TestCase):
+
+    def setUp(self):
+        self.streamed = []
+        self.recorded = []
+        self.patched = {
+            "set_turn_context": lambda *args, **kwargs: None,
+            "stop_all_playback": lambda: None,
+            "stream_turn": self.fake_stream_turn,
+            "record_turn": self.fake_record_turn,
+        }
+        self.originals = {name: getattr(turn_processing, name) for name in self.patched}
+        for name, value in self.patched.items():
+            setattr(turn_processing, name, value)
+        self.turn_control = TurnControl()
+
+    def tearDown(self):
+        for name, value in self.originals.items():
+            setattr(turn_processing, name, value)
+
+    def fake_stream_turn(self, user_input, chat_history, llm_config, chunk_queue, cancel_token=None, prefetch=None):
+        # Streams until cancelled, or for half a second.
+        cancelled = cancel_token.wait(0.5)
+        self.streamed.append((user_input, cancelled))
+        return "" if cancelled else f"reply to {user_input}"
+
+    def fake_record_turn(self, user_input, full_response, chat_history, full_history, *args):
+        self.recorded.append((user_input, full_response))
+        return chat_history + [{"input": user_input, "response": full_response}]
+
+    def run_hands_free(self, final_text):
+        server = serve_transcript([
+            {"text": "hello", "is_final": False},
+            {"text": "hello there", "is_final": False},
+            {"text": "hello there", "is_final": False},
+            {"text": final_text, "is_final": True},
+        ])
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        speculation = []
+
+        def on_stable_partial(text):
+            speculation.append(SpeculativeTurn(text, [], [], {}, Queue(), Queue(), None, "system",
+                                               self.turn_control).start())
+
+        url = f"http://127.0.0.1:{server.server_port}/transcribe_stream"
+        transcriber = StreamingTranscriber(url=url, on_stable_partial=on_stable_partial, stable_updates=2)
+        transcriber.feed(b"\x00\x01" * 64)
+        transcriber.feed(None)
+        transcription = transcriber.result(timeout=5)
+
+        self.assertEqual(transcription, final_text)
+        self.assertEqual(transcriber.speculated_text, "hello there")
+        self.assertEqual(len(speculation), 1)
+        return speculation[0], speculation[0].confirm(transcriber.matches_speculation(transcription))
+
+    def test_matching_final_transcript_keeps_the_turn(self):
+        turn, chat_history = self.run_hands_free("Hello there.")
+
+        self.assertFalse(turn.cancel_token.cancelled)
+        self.assertEqual(self.streamed, [("hello there", False)])
+        self.assertEqual(self.recorded, [("hello there", "reply to hello there")])
+        self.assertEqual(chat_history, [{"input": "hello there", "response": "reply to hello there"}])
+
+    def test_different_final_transcript_abandons_the_turn(self):
+        turn, chat_history = self.run_hands_free("hello there general kenobi")
+
+        self.assertIsNone(chat_history)
+        self.assertTrue(turn.cancel_token.cancelled)
+        self.assertEqual(self.streamed, [("hello there", True)])
+        self.assertEqual(self.recorded, [])
+        # The real turn that follows gets a fresh token.
+        self.assertIsNot(self.turn_control.begin_turn(), turn.cancel_token)
+
+
+if __name__ == "__main__":
+    unittest.main()
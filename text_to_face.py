@@ -10,7 +10,7 @@ warnings.filterwarnings(
     "ignore", 
     message="Couldn't find ffmpeg or avconv - defaulting to ffmpeg, but may not work"
 )
-from utils.files.file_utils import save_generated_data, initialize_directories
+from utils.files.file_utils import save_generated_data_async, generated_data_writer, initialize_directories
 from utils.generated_runners import run_audio_animation
 from utils.neurosync.multi_part_return import get_tts_with_blendshapes
 from utils.neurosync.neurosync_api_connect import send_audio_to_neurosync
@@ -20,6 +20,7 @@ from livelink.connect.livelink_init import create_socket_connection, initialize_
 from livelink.animations.default_animation import default_animation_loop, stop_default_animation
 
 from utils.emote_sender.send_emote import EmoteConnect
+from utils.tracing import tracer
 
 voice_name = 'af_nicole' # bf_isabella
 use_elevenlabs = False  # ElevenLabs or Local TTS - if using elevenlabs then use_combined_endpoint must be false and you must use https://github.com/AnimaVR/NeuroSync_Local_API for the blendshapes
@@ -39,8 +40,10 @@ if __name__ == "__main__":
                 break
             elif text_input:
                 start_time = time.time() 
+                tracer.start_turn()
                 if use_combined_endpoint:
-                    audio_bytes, blendshapes = get_tts_with_blendshapes(text_input, voice_name)
+                    with tracer.span("tts_blendshapes", chars=len(text_input)):
+                        audio_bytes, blendshapes = get_tts_with_blendshapes(text_input, voice_name)
                     if audio_bytes and blendshapes:
                         generation_time = time.time() - start_time  
                         print(f"Generation took {generation_time:.2f} seconds.")
@@ -51,16 +54,18 @@ if __name__ == "__main__":
                         finally:
                             if ENABLE_EMOTE_CALLS:
                                 EmoteConnect.send_emote("stopspeaking")
-                        save_generated_data(audio_bytes, blendshapes)
+                        save_generated_data_async(audio_bytes, blendshapes)
                     else:
                         print("❌ Failed to retrieve audio and blendshapes from the API.")
                 else:
-                    if use_elevenlabs:
-                        audio_bytes = get_elevenlabs_audio(text_input, voice_name)
-                    else:
-                        audio_bytes = call_local_tts(text_input)                  
+                    with tracer.span("tts", chars=len(text_input)):
+                        if use_elevenlabs:
+                            audio_bytes = get_elevenlabs_audio(text_input, voice_name)
+                        else:
+                            audio_bytes = call_local_tts(text_input)                  
                     if audio_bytes:
-                        generated_facial_data = send_audio_to_neurosync(audio_bytes)
+                        with tracer.span("blendshapes"):
+                            generated_facial_data = send_audio_to_neurosync(audio_bytes)
                         if generated_facial_data is not None:
                             generation_time = time.time() - start_time  
                             print(f"Generation took {generation_time:.2f} seconds.")
@@ -71,14 +76,17 @@ if __name__ == "__main__":
                             finally:
                                 if ENABLE_EMOTE_CALLS:
                                     EmoteConnect.send_emote("stopspeaking")
-                            save_generated_data(audio_bytes, generated_facial_data)
+                            save_generated_data_async(audio_bytes, generated_facial_data)
                         else:
                             print("❌ Failed to get blendshapes from the API.")
                     else:
                         print("❌ Failed to generate audio.")
+                if tracer.enabled:
+                    print(tracer.format_turn())
             else:
                 print("⚠️ No text provided.")           
     finally:
+        generated_data_writer.stop()
         stop_default_animation.set()
         if default_animation_thread:
             default_animation_thread.join()
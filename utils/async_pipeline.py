@@ -0,0 +1,303 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/async_pipeline.py
+#
+# asyncio orchestration of the speech pipeline. One event loop, on its own
+# thread, runs every stage as a coroutine and connects them with bounded queues:
+#
+#   LLM stream -> chunk_queue -> TTS -> speech_queue -> blendshapes -> audio_queue -> playback
+#
+# Waiting for tokens, queue space or a cancelled turn holds no thread. Only
+# blocking work leaves the loop: requests-based HTTP calls (io_executor), WAV
+# and facial-data stitching (the loop's default executor), and audio playback
+# with its LiveLink frame sender (one playback thread, as before).
+#
+# The queues (utils/bounded_queue.py) keep the queue.Queue methods the threaded
+# workers were driven by (put, get_nowait, task_done, join, empty) and accept
+# calls from any thread, so process_turn and the scripts' shutdown code work
+# unchanged. Each has a bound and an overflow policy (block / drop_oldest /
+# coalesce); the sentinel None always gets through.
+
+import asyncio
+import string
+from functools import partial
+from threading import Thread, Event
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from utils.tts.local_tts import call_local_tts
+from utils.tts.eleven_labs import get_elevenlabs_audio
+from utils.tts.tts_bridge import make_audio_item
+from utils.neurosync.multi_part_return import get_tts_with_blendshapes
+from utils.neurosync.neurosync_api_connect import send_audio_to_neurosync
+from utils.generated_runners import run_audio_animation, start_default_animation
+from utils.audio_face_workers import collect_queued_items, unpack_audio_item, stitch_queued_items, merge_audio_items, NO_ITEM
+from utils.bounded_queue import AsyncStageQueue, BLOCK, merge_chunks
+from utils.emote_sender.send_emote import EmoteConnect
+from utils.cancellation import is_cancelled, run_cancellable_async
+from utils.tracing import tracer
+
+
+class StageHandle:
+    """
+    Thread-like handle (join / is_alive) for a group of stage tasks, so code
+    written for the worker threads can wait for a stage to finish.
+    """
+
+    def __init__(self, pipeline, tasks):
+        self.pipeline = pipeline
+        self.tasks = tasks
+
+    def is_alive(self):
+        return any(not task.done() for task in self.tasks)
+
+    def join(self, timeout=None):
+        future = asyncio.run_coroutine_threadsafe(asyncio.wait(self.tasks), self.pipeline.loop)
+        try:
+            future.result(timeout)
+        except TimeoutError:
+            pass
+
+
+class AsyncSpeechPipeline:
+    """
+    Owns the event loop and the TTS, blendshape and playback stage coroutines.
+
+    The LLM stream of a turn runs on the same loop: stream_llm_chunks hands it
+    to run() when the chunk_queue belongs to a pipeline, and the SentenceBuilder
+    feeds chunk_queue directly, without crossing a thread.
+    """
+
+    def __init__(self, py_face, socket_connection, default_animation_thread, turn_control=None, idle_tracker=None,
+                 use_local_audio=True, voice_name=None, use_combined_endpoint=False, enable_emote_calls=True,
+                 gapless=True, crossfade_ms=40, chunk_queue_size=0, audio_queue_size=0,
+                 chunk_queue_policy=BLOCK, audio_queue_policy=BLOCK, io_workers=4, lookahead_ms=150):
+        self.py_face = py_face
+        self.socket_connection = socket_connection
+        self.default_animation_thread = default_animation_thread
+        self.turn_control = turn_control
+        self.use_local_audio = use_local_audio
+        self.voice_name = voice_name
+        self.use_combined_endpoint = use_combined_endpoint
+        self.enable_emote_calls = enable_emote_calls
+        self.gapless = gapless
+        self.crossfade_ms = crossfade_ms
+        # Same look-ahead as audio_face_queue_worker: wait briefly for the next clip before going idle.
+        self.lookahead = lookahead_ms / 1000 if gapless and lookahead_ms else 0
+
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="speech-io")
+        self.playback_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playback")
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self.started = Event()
+
+        self.chunk_queue = AsyncStageQueue(self.loop, chunk_queue_size, idle_tracker, chunk_queue_policy,
+                                           merge_chunks, "chunk_queue", pipeline=self, trace=True)
+        # Synthesized audio waiting for blendshapes: as heavy as audio_queue items, so bounded the same way.
+        self.speech_queue = AsyncStageQueue(self.loop, audio_queue_size, idle_tracker, audio_queue_policy,
+                                            None, "speech_queue", pipeline=self, trace=True)
+        self.audio_queue = AsyncStageQueue(self.loop, audio_queue_size, idle_tracker, audio_queue_policy,
+                                           partial(merge_audio_items, crossfade_ms=crossfade_ms), "audio_queue",
+                                           pipeline=self, trace=True)
+        self.tts_stage = None
+        self.playback_stage = None
+
+    # ---- loop management ----
+
+    def start(self):
+        self.thread = Thread(target=self._run_loop, name="speech-loop", daemon=True)
+        self.thread.start()
+        self.started.wait()
+        tts = self.run(self._spawn(self._tts_stage()))
+        blendshapes = self.run(self._spawn(self._blendshape_stage()))
+        playback = self.run(self._spawn(self._playback_stage()))
+        self.tts_stage = StageHandle(self, [tts, blendshapes])
+        self.playback_stage = StageHandle(self, [playback])
+        return self
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self.started.set)
+        self.loop.run_forever()
+
+    async def _spawn(self, coro):
+        return asyncio.ensure_future(coro)
+
+    def on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def run(self, coro):
+        """
+        Runs coro on the pipeline loop and returns its result (from another thread).
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def call(self, fn, *args):
+        """
+        Calls a plain function on the loop thread and returns its result.
+        """
+        if self.on_loop():
+            return fn(*args)
+        result = Future()
+
+        def invoke():
+            try:
+                result.set_result(fn(*args))
+            except BaseException as e:
+                result.set_exception(e)
+
+        self.loop.call_soon_threadsafe(invoke)
+        return result.result()
+
+    def stop(self):
+        """
+        Stops the loop. Put None on chunk_queue and audio_queue and join the
+        stages first to let queued speech finish.
+        """
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+        self.io_executor.shutdown(wait=False)
+        self.playback_executor.shutdown(wait=True)
+
+    # ---- stages ----
+
+    async def _tts_stage(self):
+        while True:
+            chunk = await self.chunk_queue.aget()
+            if chunk is None:
+                self.chunk_queue.task_done()
+                await self.speech_queue.aput(None)
+                break
+            try:
+                cancel_token = self.turn_control.current if self.turn_control is not None else None
+                if is_cancelled(cancel_token):
+                    continue
+                # Skip if the chunk is empty or only punctuation/whitespace.
+                if not chunk.strip() or all(c in string.punctuation or c.isspace() for c in chunk):
+                    continue
+                await self._synthesize(chunk, cancel_token)
+            except Exception as e:
+                print(f"Error in TTS stage: {e}")
+            finally:
+                self.chunk_queue.task_done()
+
+    async def _synthesize(self, chunk, cancel_token):
+        if self.use_combined_endpoint:
+            with tracer.span("tts_blendshapes", cancel_token, chars=len(chunk)):
+                result = await run_cancellable_async(get_tts_with_blendshapes, cancel_token, chunk, self.voice_name,
+                                                     executor=self.io_executor)
+            audio_bytes, blendshapes = result if result is not None else (None, None)
+            if is_cancelled(cancel_token):
+                return
+            if audio_bytes and blendshapes:
+                await self.audio_queue.aput(make_audio_item(audio_bytes, blendshapes, cancel_token))
+            else:
+                print("❌ Failed to retrieve audio and blendshapes for chunk:", chunk)
+            return
+
+        with tracer.span("tts", cancel_token, chars=len(chunk)):
+            if self.use_local_audio:
+                audio_bytes = await run_cancellable_async(call_local_tts, cancel_token, chunk,
+                                                          executor=self.io_executor)
+            else:
+                audio_bytes = await run_cancellable_async(get_elevenlabs_audio, cancel_token, chunk, self.voice_name,
+                                                          executor=self.io_executor)
+        if is_cancelled(cancel_token):
+            return
+        if audio_bytes:
+            # The blendshape request for this chunk overlaps TTS of the next one.
+            await self.speech_queue.aput((audio_bytes, cancel_token))
+        else:
+            print("❌ TTS generation failed for chunk:", chunk)
+
+    async def _blendshape_stage(self):
+        while True:
+            item = await self.speech_queue.aget()
+            if item is None:
+                self.speech_queue.task_done()
+                break
+            audio_bytes, cancel_token = item
+            try:
+                with tracer.span("blendshapes", cancel_token):
+                    facial_data = await run_cancellable_async(send_audio_to_neurosync, cancel_token, audio_bytes,
+                                                              executor=self.io_executor)
+                if is_cancelled(cancel_token):
+                    continue
+                if facial_data:
+                    await self.audio_queue.aput(make_audio_item(audio_bytes, facial_data, cancel_token))
+                else:
+                    print("❌ Failed to get facial data for chunk.")
+            except Exception as e:
+                print(f"Error in blendshape stage: {e}")
+            finally:
+                self.speech_queue.task_done()
+
+    async def _playback_stage(self):
+        loop = asyncio.get_running_loop()
+        speaking = False
+        idle_paused = False
+        item = NO_ITEM
+        while True:
+            if item is NO_ITEM:
+                item = await self.audio_queue.aget()
+            if item is None:
+                if idle_paused:
+                    await loop.run_in_executor(self.playback_executor, start_default_animation, self.py_face)
+                self.audio_queue.task_done()
+                break
+
+            if not speaking and self.enable_emote_calls:
+                await loop.run_in_executor(self.io_executor, EmoteConnect.send_emote, "startspeaking")
+                speaking = True
+
+            items = [item]
+            stop_after = False
+            if self.gapless:
+                items, stop_after = collect_queued_items(self.audio_queue, item)
+
+            last_token = NO_ITEM
+            try:
+                playable = [entry for entry in map(unpack_audio_item, items) if not is_cancelled(entry[2])]
+                # Stitching decodes and crossfades audio: CPU work, off the loop.
+                clips = await loop.run_in_executor(None, stitch_queued_items, playable, self.crossfade_ms)
+                for audio_bytes, facial_data, cancel_token in clips:
+                    if is_cancelled(cancel_token):
+                        continue
+                    idle_paused = bool(self.lookahead)
+                    await loop.run_in_executor(self.playback_executor, partial(
+                        run_audio_animation, audio_bytes, facial_data, self.py_face, self.socket_connection,
+                        self.default_animation_thread, cancel_event=cancel_token, resume_idle=not self.lookahead))
+                    last_token = cancel_token
+            except Exception as e:
+                print(f"Error in playback stage: {e}")
+            finally:
+                for _ in items:
+                    self.audio_queue.task_done()
+
+            item = NO_ITEM
+            if idle_paused and not stop_after and last_token is not NO_ITEM and not is_cancelled(last_token):
+                try:
+                    item = await asyncio.wait_for(self.audio_queue.aget(), self.lookahead)
+                except asyncio.TimeoutError:
+                    pass
+            if idle_paused and item is NO_ITEM:
+                await loop.run_in_executor(self.playback_executor, start_default_animation, self.py_face)
+                idle_paused = False
+
+            if stop_after:
+                self.audio_queue.task_done()
+                break
+
+            if speaking and item is NO_ITEM and self.audio_queue.empty() and self.enable_emote_calls:
+                await loop.run_in_executor(self.io_executor, EmoteConnect.send_emote, "stopspeaking")
+                speaking = False
+
+        if speaking and self.enable_emote_calls:
+            await loop.run_in_executor(self.io_executor, EmoteConnect.send_emote, "stopspeaking")
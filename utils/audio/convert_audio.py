@@ -13,6 +13,8 @@ from pydub import AudioSegment
 import soundfile as sf
 from scipy.io.wavfile import write
 
+from utils.audio.resample import resample
+
 # import magic  
 
 
@@ -79,9 +81,19 @@ def bytes_to_wav(audio_bytes, sample_rate, channels, sample_width):
 
 def safely_convert_audio(audio_bytes, input_format, target_sample_rate=88200):
     """
-    Safely convert audio using pydub, changing its frame rate if needed.
+    Safely convert audio to WAV at target_sample_rate.
+    WAV input is resampled in-process with the cached polyphase resampler;
+    other formats go through pydub.
     Returns WAV bytes on success or None on failure.
     """
+    if input_format == "wav":
+        try:
+            data, sr = sf.read(io.BytesIO(audio_bytes), dtype='float32')
+            channels = data.shape[1] if data.ndim > 1 else 1
+            data = np.clip(resample(data, sr, target_sample_rate), -1.0, 1.0)
+            return audio_to_bytes(data, target_sample_rate, channels)
+        except Exception as e:
+            print(f"WAV resample failed, falling back to pydub: {e}")
     try:
         with io.BytesIO(audio_bytes) as input_buffer:
             audio = AudioSegment.from_file(input_buffer, format=input_format)
@@ -108,3 +120,48 @@ def is_valid_audio(audio_bytes, allowed_types=None):
     except Exception as e:
         print(f"Error checking audio MIME type: {e}")
         return False
+
+
+def stitch_wav_bytes(audio_clips, crossfade_ms=40):
+    """
+    Concatenate several WAV clips into one continuous WAV stream, overlapping
+    each boundary with a short linear crossfade so there is no gap or click.
+
+    Returns a tuple (wav_bytes, start_times) where start_times holds the offset
+    in seconds at which each clip begins in the stitched stream, or None if the
+    clips cannot be decoded or do not share a sample rate and channel count.
+    """
+    try:
+        decoded = [sf.read(io.BytesIO(clip), dtype='float32') for clip in audio_clips]
+    except Exception as e:
+        print(f"Audio stitching decode error: {e}")
+        return None
+
+    if not decoded:
+        return None
+
+    sr = decoded[0][1]
+    channels = decoded[0][0].shape[1] if decoded[0][0].ndim > 1 else 1
+    for data, rate in decoded:
+        data_channels = data.shape[1] if data.ndim > 1 else 1
+        if rate != sr or data_channels != channels:
+            return None
+
+    crossfade_samples = int(sr * crossfade_ms / 1000)
+    stitched = decoded[0][0]
+    start_times = [0.0]
+
+    for data, _ in decoded[1:]:
+        overlap = min(crossfade_samples, len(stitched) // 2, len(data) // 2)
+        start_times.append((len(stitched) - overlap) / sr)
+        if overlap > 0:
+            fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+            if channels > 1:
+                fade_in = fade_in[:, None]
+            mixed = stitched[-overlap:] * (1.0 - fade_in) + data[:overlap] * fade_in
+            stitched = np.concatenate([stitched[:-overlap], mixed, data[overlap:]])
+        else:
+            stitched = np.concatenate([stitched, data])
+
+    stitched = np.clip(stitched, -1.0, 1.0)
+    return audio_to_bytes(stitched, sr, channels), start_times
@@ -10,6 +10,7 @@ import io
 import time
 import pygame
 from utils.audio.convert_audio import convert_to_wav
+from utils.tracing import tracer
 
 # --- Helper Functions ---
 
@@ -21,13 +22,35 @@ def init_pygame_mixer():
         pygame.mixer.init()
 
 
-def sync_playback_loop():
+def stop_if_cancelled(cancel_event):
+    """
+    Stop music playback if cancel_event is set. pygame.mixer.stop() only stops
+    Sound channels, so mixer.music has to be stopped explicitly.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        pygame.mixer.music.stop()
+        return True
+    return False
+
+
+def stop_all_playback():
+    """
+    Stop every Sound channel and the music stream.
+    """
+    if pygame.mixer.get_init():
+        pygame.mixer.stop()
+        pygame.mixer.music.stop()
+
+
+def sync_playback_loop(cancel_event=None):
     """
     A playback loop that synchronizes elapsed time with the music position.
     """
     start_time = time.perf_counter()
     clock = pygame.time.Clock()
     while pygame.mixer.music.get_busy():
+        if stop_if_cancelled(cancel_event):
+            break
         elapsed_time = time.perf_counter() - start_time
         current_pos = pygame.mixer.music.get_pos() / 1000.0  # convert ms to sec
 
@@ -39,18 +62,22 @@ def sync_playback_loop():
         clock.tick(10)
 
 
-def simple_playback_loop():
+def simple_playback_loop(cancel_event=None):
     """
     A simple playback loop that just ticks the clock until playback finishes.
+    With a cancel_event it checks every 10 ms so a barge-in stops audio promptly.
     """
     clock = pygame.time.Clock()
+    tick_rate = 10 if cancel_event is None else 100
     while pygame.mixer.music.get_busy():
-        clock.tick(10)
+        if stop_if_cancelled(cancel_event):
+            break
+        clock.tick(tick_rate)
 
 
 # --- Playback Functions ---
 
-def play_audio_bytes(audio_bytes, start_event, sync=True):
+def play_audio_bytes(audio_bytes, start_event, sync=True, cancel_event=None):
     """
     Play audio from raw bytes.
     
@@ -58,22 +85,26 @@ def play_audio_bytes(audio_bytes, start_event, sync=True):
       - audio_bytes: audio data as bytes.
       - start_event: threading.Event to wait for before starting playback.
       - sync: if True, uses time-syncing playback loop.
+      - cancel_event: optional threading.Event that stops playback when set.
     """
     try:
         init_pygame_mixer()
         audio_file = io.BytesIO(audio_bytes)
         pygame.mixer.music.load(audio_file)
         start_event.wait()  # Wait for the signal to start
+        if stop_if_cancelled(cancel_event):
+            return
         pygame.mixer.music.play()
+        tracer.mark("audio_start", cancel_event)
         if sync:
-            sync_playback_loop()
+            sync_playback_loop(cancel_event)
         else:
-            simple_playback_loop()
+            simple_playback_loop(cancel_event)
     except pygame.error as e:
         print(f"Error in play_audio_bytes: {e}")
 
 
-def play_audio_from_memory(audio_data, start_event, sync=False):
+def play_audio_from_memory(audio_data, start_event, sync=False, cancel_event=None):
     """
     Play audio from memory (assumes valid WAV bytes).
     Uses a simple playback loop.
@@ -83,8 +114,11 @@ def play_audio_from_memory(audio_data, start_event, sync=False):
         audio_file = io.BytesIO(audio_data)
         pygame.mixer.music.load(audio_file)
         start_event.wait()
+        if stop_if_cancelled(cancel_event):
+            return
         pygame.mixer.music.play()
-        simple_playback_loop()
+        tracer.mark("audio_start", cancel_event)
+        simple_playback_loop(cancel_event)
     except pygame.error as e:
         if "Unknown WAVE format" in str(e):
             print("Unknown WAVE format encountered. Skipping to the next item in the queue.")
@@ -94,7 +128,7 @@ def play_audio_from_memory(audio_data, start_event, sync=False):
         print(f"Error in play_audio_from_memory: {e}")
 
 
-def play_audio_from_path(audio_path, start_event, sync=True):
+def play_audio_from_path(audio_path, start_event, sync=True, cancel_event=None):
     """
     Play audio from a file path. If the format is unsupported,
     automatically convert it to WAV.
@@ -108,15 +142,45 @@ def play_audio_from_path(audio_path, start_event, sync=True):
             audio_path = convert_to_wav(audio_path)
             pygame.mixer.music.load(audio_path)
         start_event.wait()
+        if stop_if_cancelled(cancel_event):
+            return
         pygame.mixer.music.play()
+        tracer.mark("audio_start", cancel_event)
         if sync:
-            sync_playback_loop()
+            sync_playback_loop(cancel_event)
         else:
-            simple_playback_loop()
+            simple_playback_loop(cancel_event)
     except pygame.error as e:
         print(f"Error in play_audio_from_path: {e}")
 
 
+def play_audio_on_channel(audio_input, start_event, channel_id, cancel_event=None):
+    """
+    Play WAV bytes or a file path on a dedicated mixer channel instead of the
+    single music stream, so several avatars can speak at the same time.
+    """
+    try:
+        init_pygame_mixer()
+        if pygame.mixer.get_num_channels() <= channel_id:
+            pygame.mixer.set_num_channels(channel_id + 1)
+        source = io.BytesIO(audio_input) if isinstance(audio_input, bytes) else audio_input
+        sound = pygame.mixer.Sound(file=source)
+        channel = pygame.mixer.Channel(channel_id)
+        start_event.wait()
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        channel.play(sound)
+        tracer.mark("audio_start", cancel_event, channel=channel_id)
+        clock = pygame.time.Clock()
+        while channel.get_busy():
+            if cancel_event is not None and cancel_event.is_set():
+                channel.stop()
+                break
+            clock.tick(100)
+    except Exception as e:
+        print(f"Error in play_audio_on_channel: {e}")
+
+
 def read_audio_file_as_bytes(file_path):
     """
     Read a WAV audio file from disk as bytes.
@@ -3,6 +3,11 @@ import pyaudio
 import numpy as np
 import keyboard
 import soundfile as sf
+from queue import Queue
+from threading import Event, Thread
+
+from utils.audio.convert_audio import pcm_to_wav
+from utils.audio.stream_audio import EnergyVAD, capture_until_endpoint, stream_microphone, stream_wav_file
 
 # for the best results, record in 88200
 
@@ -37,3 +42,38 @@ def record_audio_until_release(sr=88200):
     
     audio_file.seek(0)  
     return audio_file.read()
+
+
+def record_audio_until_silence(sr=88200, on_chunk=None, wav_path=None, chunk_ms=30, max_seconds=30.0, speech_timeout=None, vad=None):
+    """
+    Hands-free capture: stream PCM chunks from the microphone (or from wav_path,
+    which stands in for the mic) and stop when the VAD hears the end of speech.
+
+    on_chunk receives each PCM chunk of the utterance as it is captured, then None,
+    e.g. a Queue's put method feeding a streaming transcription client.
+    Returns WAV bytes, or None if no speech was detected.
+    """
+    chunk_queue = Queue()
+    stop_event = Event()
+
+    if wav_path is not None:
+        sr = sf.info(wav_path).samplerate
+        source = Thread(target=stream_wav_file, args=(wav_path, chunk_queue, chunk_ms), kwargs={'stop_event': stop_event}, daemon=True)
+    else:
+        source = Thread(target=stream_microphone, args=(chunk_queue, stop_event, sr, chunk_ms), daemon=True)
+
+    if vad is None:
+        vad = EnergyVAD(sr, chunk_ms=chunk_ms)
+
+    print("Listening... start speaking, recording stops when you pause.")
+    source.start()
+    try:
+        pcm = capture_until_endpoint(chunk_queue, vad, on_chunk=on_chunk, max_seconds=max_seconds, speech_timeout=speech_timeout)
+    finally:
+        stop_event.set()
+        source.join()
+    print("Finished recording.")
+
+    if not pcm:
+        return None
+    return pcm_to_wav(pcm, sample_rate=sr).read()
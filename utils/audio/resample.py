@@ -0,0 +1,146 @@
+"""
+resample.py
+-----------
+Polyphase sample-rate conversion with the rate ratio reduced by its gcd and
+the anti-aliasing filter designed once per rate pair. Includes a streaming
+resampler so long audio can be converted block by block with bounded memory.
+
+Kokoro (24 kHz) -> storage (88.2 kHz) reduces to 147/40 instead of 88200/24000.
+"""
+
+import math
+from functools import lru_cache
+
+import numpy as np
+import scipy.signal
+import soundfile as sf
+
+
+def reduce_rate_ratio(orig_sr, target_sr):
+    """
+    Return the (up, down) factors for converting orig_sr to target_sr, reduced by gcd.
+    """
+    orig_sr = int(orig_sr)
+    target_sr = int(target_sr)
+    if orig_sr <= 0 or target_sr <= 0:
+        raise ValueError(f"Sample rates must be positive, got {orig_sr} -> {target_sr}.")
+    g = math.gcd(orig_sr, target_sr)
+    return target_sr // g, orig_sr // g
+
+
+@lru_cache(maxsize=32)
+def _design_filter(up, down):
+    # Same low-pass design scipy.signal.resample_poly uses by default.
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = scipy.signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+    h.setflags(write=False)
+    return h
+
+
+def get_resampling_filter(orig_sr, target_sr):
+    """
+    Return the cached (unscaled) FIR filter for a rate pair.
+    """
+    up, down = reduce_rate_ratio(orig_sr, target_sr)
+    return _design_filter(up, down)
+
+
+def resample(data, orig_sr, target_sr):
+    """
+    Resample a whole signal (samples along axis 0) from orig_sr to target_sr.
+    Returns data unchanged if the rates already match.
+    """
+    if int(orig_sr) == int(target_sr):
+        return data
+    up, down = reduce_rate_ratio(orig_sr, target_sr)
+    return scipy.signal.resample_poly(data, up, down, axis=0, window=_design_filter(up, down))
+
+
+class StreamingResampler:
+    """
+    Resamples audio fed in arbitrary-sized blocks. The concatenated output of
+    process() + flush() matches resample() on the whole signal, while only a
+    short history of input samples (about one filter length) is kept around.
+    """
+
+    def __init__(self, orig_sr, target_sr):
+        self.up, self.down = reduce_rate_ratio(orig_sr, target_sr)
+        self.filter = _design_filter(self.up, self.down) * self.up
+        self.delay = (len(self.filter) - 1) // 2
+        # Enough input to cover one filter span plus room to align the decimation phase.
+        self.history_len = -(-len(self.filter) // self.up) + self.down + 1
+        self.history = None
+        self.history_start = -self.history_len
+        self.next_output = 0
+        self.total_input = 0
+
+    def process(self, block):
+        """
+        Feed a block of samples (1-D, or 2-D with samples along axis 0) and
+        return the resampled samples that are now fully determined.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        if self.history is None:
+            self.history = np.zeros((self.history_len,) + block.shape[1:])
+        self.total_input += len(block)
+        return self._process(block)
+
+    def flush(self):
+        """
+        Return the remaining output samples once all input has been fed.
+        """
+        if self.history is None:
+            return np.zeros(0)
+        expected = -(-self.total_input * self.up // self.down)
+        padding = np.zeros((self.history_len,) + self.history.shape[1:])
+        tail = self._process(padding)
+        remaining = expected - (self.next_output - len(tail))
+        return tail[:max(remaining, 0)]
+
+    def _process(self, block):
+        buffer = np.concatenate([self.history, block])
+        buffer_start = self.history_start
+        buffer_end = buffer_start + len(buffer)
+
+        # Output m sits at position m * down + delay of the upsampled, filtered signal.
+        output_end = (buffer_end * self.up - 1 - self.delay) // self.down + 1
+        count = output_end - self.next_output
+        if count > 0:
+            first = self.next_output * self.down + self.delay
+            start = (first - (len(self.filter) - 1)) // self.up
+            while (first - start * self.up) % self.down:
+                start -= 1
+            offset = (first - start * self.up) // self.down
+            filtered = scipy.signal.upfirdn(
+                self.filter, buffer[start - buffer_start:], self.up, self.down, axis=0
+            )
+            output = filtered[offset:offset + count]
+            self.next_output = output_end
+        else:
+            output = np.zeros((0,) + buffer.shape[1:])
+
+        self.history = buffer[-self.history_len:]
+        self.history_start = buffer_end - self.history_len
+        return output
+
+
+def resample_wav_file(input_path, output_path, target_sr, block_size=65536):
+    """
+    Resample a WAV file to target_sr block by block, writing 16-bit PCM.
+    Memory use stays bounded regardless of the file length.
+    """
+    info = sf.info(input_path)
+    if info.samplerate == target_sr:
+        blocks = sf.blocks(input_path, blocksize=block_size, dtype='float64')
+        with sf.SoundFile(output_path, 'w', samplerate=target_sr, channels=info.channels, subtype='PCM_16') as out:
+            for block in blocks:
+                out.write(block)
+        return output_path
+
+    resampler = StreamingResampler(info.samplerate, target_sr)
+    with sf.SoundFile(output_path, 'w', samplerate=target_sr, channels=info.channels, subtype='PCM_16') as out:
+        for block in sf.blocks(input_path, blocksize=block_size, dtype='float64'):
+            out.write(np.clip(resampler.process(block), -1.0, 1.0))
+        out.write(np.clip(resampler.flush(), -1.0, 1.0))
+    return output_path
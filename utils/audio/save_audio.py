@@ -2,7 +2,7 @@ import soundfile as sf       # Alternative to librosa for loading audio
 import wave
 import io
 import numpy as np
-import scipy.signal         # For high-quality resampling
+from utils.audio.resample import resample  # Cached polyphase resampling
 
 def save_audio_file(audio_bytes, output_path, target_sr=88200):
     # Read the audio data and sampling rate from the bytes using soundfile
@@ -14,9 +14,9 @@ def save_audio_file(audio_bytes, output_path, target_sr=88200):
     
     # Resample the audio if the original sample rate doesn't match the target
     if sr != target_sr:
-        # Using resample_poly for efficient and high-quality resampling.
-        # It rescales the audio by treating target_sr as the "up" factor and sr as the "down" factor.
-        data = scipy.signal.resample_poly(data, target_sr, sr)
+        # Polyphase resampling with the rate ratio reduced by gcd (e.g. 24000 -> 88200 is 147/40)
+        # and the filter designed once per rate pair.
+        data = resample(data, sr, target_sr)
         sr = target_sr
 
     # Write the processed audio data to a WAV file
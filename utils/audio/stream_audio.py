@@ -0,0 +1,177 @@
+"""
+stream_audio.py
+---------------
+Streaming audio capture in fixed-size 16-bit mono PCM chunks, plus a
+lightweight energy-based voice activity detector (VAD) for hands-free
+endpointing. Chunk sources push bytes into a Queue and finish with None, so a
+WAV file can stand in for the microphone.
+"""
+
+import math
+import time
+from collections import deque
+
+import numpy as np
+import soundfile as sf
+
+
+class EnergyVAD:
+    """
+    Frame-energy voice activity detector with an adaptive noise floor.
+
+    A chunk counts as speech when its level is above both threshold_db and
+    the running noise floor plus margin_db. Speech starts after start_frames
+    speech chunks in a row and ends after end_silence_ms of non-speech.
+    """
+
+    def __init__(self, sample_rate, chunk_ms=30, threshold_db=-45.0, margin_db=10.0,
+                 start_frames=3, end_silence_ms=700, noise_adapt=0.05):
+        self.sample_rate = sample_rate
+        self.chunk_ms = chunk_ms
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.start_frames = start_frames
+        self.end_frames = max(1, int(math.ceil(end_silence_ms / chunk_ms)))
+        self.noise_adapt = noise_adapt
+        self.noise_floor_db = threshold_db - margin_db
+        self.reset()
+
+    def reset(self):
+        self.is_speaking = False
+        self.speech_run = 0
+        self.silence_run = 0
+
+    @staticmethod
+    def chunk_level_db(chunk):
+        samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        if samples.size == 0:
+            return -120.0
+        rms = np.sqrt(np.mean(samples * samples)) / 32768.0
+        return 20.0 * math.log10(max(rms, 1e-6))
+
+    def process(self, chunk):
+        """
+        Feed one PCM chunk. Returns "speech_start", "speech_end" or None.
+        """
+        level = self.chunk_level_db(chunk)
+        is_speech = level > max(self.threshold_db, self.noise_floor_db + self.margin_db)
+
+        if not is_speech and not self.is_speaking:
+            self.noise_floor_db += self.noise_adapt * (level - self.noise_floor_db)
+
+        if not self.is_speaking:
+            self.speech_run = self.speech_run + 1 if is_speech else 0
+            if self.speech_run >= self.start_frames:
+                self.is_speaking = True
+                self.silence_run = 0
+                return "speech_start"
+            return None
+
+        self.silence_run = 0 if is_speech else self.silence_run + 1
+        if self.silence_run >= self.end_frames:
+            self.is_speaking = False
+            self.speech_run = 0
+            return "speech_end"
+        return None
+
+
+def chunk_size_for(sample_rate, chunk_ms):
+    return int(sample_rate * chunk_ms / 1000)
+
+
+def stream_microphone(chunk_queue, stop_event, sr=88200, chunk_ms=30):
+    """
+    Read the default microphone in chunk_ms blocks and put each block of PCM
+    bytes on chunk_queue until stop_event is set. Puts None when done.
+    """
+    import pyaudio  # Imported here so the VAD and file sources work without an audio device.
+
+    frames_per_chunk = chunk_size_for(sr, chunk_ms)
+    p = pyaudio.PyAudio()
+    stream = p.open(format=pyaudio.paInt16,
+                    channels=1,
+                    rate=sr,
+                    input=True,
+                    frames_per_buffer=frames_per_chunk)
+    try:
+        while not stop_event.is_set():
+            chunk_queue.put(stream.read(frames_per_chunk, exception_on_overflow=False))
+    finally:
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
+        chunk_queue.put(None)
+
+
+def stream_wav_file(wav_path, chunk_queue, chunk_ms=30, realtime=False, stop_event=None):
+    """
+    Stand-in for the microphone: put a WAV file on chunk_queue as 16-bit mono
+    PCM chunks, optionally paced in real time. Puts None when done.
+    Returns the file's sample rate.
+    """
+    data, sr = sf.read(wav_path, dtype='int16')
+    if data.ndim > 1:
+        data = data.mean(axis=1).astype(np.int16)
+
+    frames_per_chunk = chunk_size_for(sr, chunk_ms)
+    try:
+        for start in range(0, len(data), frames_per_chunk):
+            if stop_event is not None and stop_event.is_set():
+                break
+            chunk_queue.put(data[start:start + frames_per_chunk].tobytes())
+            if realtime:
+                time.sleep(chunk_ms / 1000)
+    finally:
+        chunk_queue.put(None)
+    return sr
+
+
+def capture_until_endpoint(chunk_queue, vad, on_chunk=None, pre_roll_ms=300, max_seconds=30.0, speech_timeout=None):
+    """
+    Consume PCM chunks from chunk_queue until the VAD detects the end of an
+    utterance, the source ends (None), or max_seconds of speech is reached.
+
+    Chunks from the start of speech onwards (plus pre_roll_ms before it) are
+    passed to on_chunk as they arrive, so a streaming transcription client can
+    start before the user stops talking. on_chunk(None) marks the end.
+
+    Returns the utterance as raw PCM bytes (empty if no speech was heard).
+    If speech_timeout is set and no speech starts within that many seconds,
+    capture stops and returns empty bytes.
+    """
+    pre_roll = deque(maxlen=max(1, int(pre_roll_ms / vad.chunk_ms)))
+    utterance = []
+    max_chunks = int(max_seconds * 1000 / vad.chunk_ms)
+    waited_chunks = 0
+    vad.reset()
+
+    def emit(chunk):
+        utterance.append(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+
+    while True:
+        chunk = chunk_queue.get()
+        if chunk is None:
+            break
+
+        event = vad.process(chunk)
+        if not vad.is_speaking and event != "speech_end":
+            pre_roll.append(chunk)
+            waited_chunks += 1
+            if speech_timeout is not None and waited_chunks * vad.chunk_ms / 1000 >= speech_timeout:
+                break
+            continue
+
+        if event == "speech_start":
+            while pre_roll:
+                emit(pre_roll.popleft())
+
+        emit(chunk)
+        if event == "speech_end" or len(utterance) >= max_chunks:
+            break
+
+    if on_chunk is not None:
+        on_chunk(None)
+    return b''.join(utterance)
+
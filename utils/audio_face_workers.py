@@ -5,22 +5,48 @@
 
 
 import os
+from queue import Empty
 from threading import Lock
 
-from utils.generated_runners import run_audio_animation
+from utils.generated_runners import run_audio_animation, start_default_animation
 from utils.files.file_utils import save_generated_data_from_wav
 from utils.neurosync.neurosync_api_connect import send_audio_to_neurosync
 from utils.audio.play_audio import read_audio_file_as_bytes
+from utils.audio.convert_audio import stitch_wav_bytes
 from utils.emote_sender.send_emote import EmoteConnect
+from livelink.animations.blending_anims import stitch_facial_data
+from utils.cancellation import is_cancelled
+from utils.tracing import log_timing_worker  # moved to utils/tracing.py (trace JSONL sink), still importable here
 
 queue_lock = Lock()
 
+# Returned by wait_for_next_item when nothing arrived (None is the stop sentinel).
+NO_ITEM = object()
 
-def audio_face_queue_worker(audio_face_queue, py_face, socket_connection, default_animation_thread, enable_emote_calls=True):
+
+def audio_face_queue_worker(audio_face_queue, py_face, socket_connection, default_animation_thread, enable_emote_calls=True, gapless=True, crossfade_ms=40,
+                            lookahead_ms=150):
+    """
+    Plays (audio_bytes, facial_data) items from audio_face_queue.
+    Items may carry the turn's cancel token as a third element; cancelled items
+    are dropped, and cancelling mid-playback stops the audio and the face.
+
+    With gapless enabled, any items already waiting in the queue when an item is
+    picked up are stitched onto it, so consecutive sentences play as one
+    continuous clip instead of blending out to idle and back in between them.
+    When a clip ends with the queue empty, the worker waits up to lookahead_ms
+    for the next one (holding the last frame) before going back to idle.
+    """
+    lookahead = lookahead_ms / 1000 if gapless and lookahead_ms else 0
     speaking = False
+    idle_paused = False
+    item = NO_ITEM
     while True:
-        item = audio_face_queue.get()
+        if item is NO_ITEM:
+            item = audio_face_queue.get()
         if item is None:
+            if idle_paused:
+                start_default_animation(py_face)
             audio_face_queue.task_done()
             break
 
@@ -28,24 +54,113 @@ def audio_face_queue_worker(audio_face_queue, py_face, socket_connection, defaul
             EmoteConnect.send_emote("startspeaking")
             speaking = True
 
-        audio_bytes, facial_data = item
-        run_audio_animation(audio_bytes, facial_data, py_face, socket_connection, default_animation_thread)
-        audio_face_queue.task_done()
+        items = [item]
+        stop_after = False
+        if gapless:
+            items, stop_after = collect_queued_items(audio_face_queue, item)
+
+        playable = [entry for entry in map(unpack_audio_item, items) if not is_cancelled(entry[2])]
+        last_token = NO_ITEM
+        for audio_bytes, facial_data, cancel_token in stitch_queued_items(playable, crossfade_ms):
+            if is_cancelled(cancel_token):
+                continue
+            run_audio_animation(audio_bytes, facial_data, py_face, socket_connection, default_animation_thread,
+                                cancel_event=cancel_token, resume_idle=not lookahead)
+            idle_paused = bool(lookahead)
+            last_token = cancel_token
+        for _ in items:
+            audio_face_queue.task_done()
+
+        item = NO_ITEM
+        if idle_paused and not stop_after and last_token is not NO_ITEM and not is_cancelled(last_token):
+            item = wait_for_next_item(audio_face_queue, lookahead)
+        if idle_paused and item is NO_ITEM:
+            start_default_animation(py_face)
+            idle_paused = False
+
+        if stop_after:
+            audio_face_queue.task_done()
+            break
 
-        if speaking and audio_face_queue.empty() and enable_emote_calls:
+        if speaking and item is NO_ITEM and audio_face_queue.empty() and enable_emote_calls:
             EmoteConnect.send_emote("stopspeaking")
             speaking = False
-    
-    
-def log_timing_worker(log_queue):
+
+    if speaking and enable_emote_calls:
+        EmoteConnect.send_emote("stopspeaking")
+
+
+def collect_queued_items(audio_face_queue, first_item):
+    """
+    Drains every item currently waiting in the queue without blocking.
+
+    Returns (items, stop_after) where stop_after is True if the None sentinel was
+    reached, so the caller can finish playback before shutting down.
+    """
+    items = [first_item]
     while True:
         try:
-            log_entry = log_queue.get()
-            if log_entry is None:
-                break 
-            print(log_entry)
-        except Exception as e:
-            print(f"Logging error: {e}")
+            next_item = audio_face_queue.get_nowait()
+        except Empty:
+            return items, False
+        if next_item is None:
+            return items, True
+        items.append(next_item)
+
+
+def wait_for_next_item(audio_face_queue, timeout):
+    """
+    Waits up to timeout seconds for the item after a finished clip, so a sentence
+    that is only just ready still follows on without a blend out to idle and back.
+    Returns the item, or NO_ITEM if none arrived.
+    """
+    try:
+        return audio_face_queue.get(timeout=timeout)
+    except Empty:
+        return NO_ITEM
+
+
+def unpack_audio_item(item):
+    """
+    Returns (audio_bytes, facial_data, cancel_token) for a 2- or 3-tuple queue item.
+    """
+    if len(item) == 3:
+        return item
+    audio_bytes, facial_data = item
+    return audio_bytes, facial_data, None
+
+
+def stitch_queued_items(items, crossfade_ms=40):
+    """
+    Merges several (audio_bytes, facial_data, cancel_token) items into a single item.
+    Returns a list of items to play: the stitched item, or the original items
+    unchanged if their audio cannot be stitched (e.g. mixed sample rates).
+    The stitched item keeps the cancel token of the newest item.
+    """
+    if len(items) <= 1:
+        return items
+
+    stitched_audio = stitch_wav_bytes([audio for audio, _, _ in items], crossfade_ms=crossfade_ms)
+    if stitched_audio is None:
+        print("Could not stitch queued audio, playing clips separately.")
+        return items
+
+    audio_bytes, start_times = stitched_audio
+    facial_data = stitch_facial_data([data for _, data, _ in items], start_times)
+    return [(audio_bytes, facial_data, items[-1][2])]
+
+
+def merge_audio_items(older, newer, crossfade_ms=40):
+    """
+    Coalesce policy for audio queues: stitches a queued item and a new one into
+    a single clip. Returns None (so the put waits instead) if they belong to
+    different turns or cannot be stitched.
+    """
+    older, newer = unpack_audio_item(older), unpack_audio_item(newer)
+    if older[2] is not newer[2]:
+        return None
+    stitched = stitch_queued_items([older, newer], crossfade_ms)
+    return stitched[0] if len(stitched) == 1 else None
 
 
 def process_wav_file(wav_file, py_face, socket_connection, default_animation_thread):
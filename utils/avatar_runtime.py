@@ -0,0 +1,446 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/avatar_runtime.py
+#
+# Several avatars in one process. Each Avatar owns its LiveLink identity
+# (subject name and uuid), UDP target, idle state, audio channel and turn state;
+# the TTS, blendshape and LiveLink stages are worker pools shared by all of them.
+# Frames for every avatar (idle or speaking) go out from one LiveLinkTicker,
+# batched into a single send per tick.
+#
+#   runtime = AvatarRuntime.from_config()        # avatars listed in config.AVATARS
+#   runtime.start()
+#   runtime.speak("face1", "Hello there.")
+#   runtime.respond("face1", user_input, chat_history, get_llm_config())
+#   runtime.wait_until_idle("face1")
+#   runtime.shutdown()
+
+import time
+import uuid
+import string
+from collections import deque
+from threading import Thread, Event, Lock, Condition
+
+from config import (
+    LIVELINK_HOST,
+    LIVELINK_PORT,
+    AVATARS,
+    USE_LOCAL_AUDIO,
+    USE_COMBINED_ENDPOINT,
+    AVATAR_TTS_WORKERS,
+    AVATAR_BLENDSHAPE_WORKERS,
+    AVATAR_LIVELINK_WORKERS,
+)
+from livelink.connect.livelink_init import initialize_py_face, FaceBlendShape
+from livelink.connect.udp_batch import LiveLinkTicker
+from livelink.animations.default_animation import default_animation_data
+from utils.generated_runners import run_audio_animation
+from utils.cancellation import TurnControl, is_cancelled, run_cancellable
+from utils.idle_state import IdleTracker
+from utils.llm.llm_utils import stream_llm_chunks
+from utils.tts.local_tts import call_local_tts
+from utils.tts.eleven_labs import get_elevenlabs_audio
+from utils.neurosync.multi_part_return import get_tts_with_blendshapes
+from utils.neurosync.neurosync_api_connect import send_audio_to_neurosync
+from utils.tracing import tracer
+
+
+# Idle frames look the same for every avatar apart from the packet header, so
+# their bodies are encoded once (by the ticker thread) and shared. The encoding
+# face is created on first use, not when this module is imported.
+_idle_face = None
+_idle_bodies = {}
+
+
+def idle_frame_body(index):
+    global _idle_face
+    body = _idle_bodies.get(index)
+    if body is None:
+        if _idle_face is None:
+            _idle_face = initialize_py_face()
+        for i, value in enumerate(default_animation_data[index]):
+            _idle_face.set_blendshape(FaceBlendShape(i), float(value))
+        body = _idle_face.encode_body()
+        _idle_bodies[index] = body
+    return body
+
+
+class Avatar:
+    """
+    One LiveLink face. py_face and every face from new_face() carry this
+    avatar's subject name and uuid, so Unreal sees exactly one subject per avatar.
+
+    The avatar is a LiveLinkTicker source: each tick it yields the next frame
+    of the clip it is speaking, or else of the idle animation.
+    put(chunk) queues text for the avatar, so it can be handed to the LLM
+    streaming code in place of a chunk_queue.
+    """
+
+    def __init__(self, name, ticker, host=LIVELINK_HOST, port=LIVELINK_PORT, voice=None, face_uuid=None,
+                 audio_channel=None):
+        self.name = name
+        self.ticker = ticker
+        self.address = (host, port)
+        self.voice = voice
+        self.face_uuid = face_uuid or str(uuid.uuid4())
+        self.audio_channel = audio_channel
+        self.py_face = self.new_face()
+        self.header = self.py_face.encode_header()
+        self.idle_state = {'current_index': 0}
+        self.idle_index = -1
+        self.idle_enabled = False
+        self.frame_lock = Lock()
+        self.clip = None
+        self.turn_control = TurnControl()
+        self.idle_tracker = IdleTracker()
+        self.runtime = None
+
+    def new_face(self):
+        return initialize_py_face(self.name, self.face_uuid)
+
+    def start_idle(self):
+        self.idle_enabled = True
+        self.ticker.add(self)
+
+    def stop_idle(self):
+        self.idle_enabled = False
+
+    def play_frames(self, encoded_frames, start_event, fps=60, cancel_event=None):
+        """
+        Hands a pre-encoded clip to the ticker once start_event is set and
+        returns when it has been sent, or cancel_event stopped it.
+        """
+        start_event.wait()
+        done = Event()
+        with self.frame_lock:
+            if self.clip is not None:
+                self.clip["done"].set()
+            self.clip = {"frames": encoded_frames, "start": time.perf_counter(), "fps": fps,
+                         "index": -1, "done": done, "cancel": cancel_event}
+        self.ticker.add(self)
+        while not done.wait(0.05):
+            if not self.ticker.running:
+                break
+
+    def next_packet(self, now, timecode):
+        with self.frame_lock:
+            clip = self.clip
+            if clip is not None:
+                # One frame per tick, skipping ahead if ticks were missed so the face stays on the audio.
+                index = max(clip["index"] + 1, int((now - clip["start"]) * clip["fps"]))
+                if index < len(clip["frames"]) and not is_cancelled(clip["cancel"]):
+                    if clip["index"] < 0:
+                        tracer.mark("livelink_first_frame", clip["cancel"], avatar=self.name)
+                    if index == len(clip["frames"]) - 1:
+                        tracer.mark("livelink_last_frame", clip["cancel"], avatar=self.name)
+                    clip["index"] = index
+                    return clip["frames"][index]
+                self.clip = None
+                clip["done"].set()
+                # The clip blended out towards idle frame 0, so idle resumes from there.
+                self.idle_index = -1
+            if not self.idle_enabled:
+                return None
+            self.idle_index = (self.idle_index + 1) % len(default_animation_data)
+            self.idle_state['current_index'] = self.idle_index
+            return self.header + timecode + idle_frame_body(self.idle_index)
+
+    def put(self, chunk):
+        self.runtime.speak(self, chunk)
+
+    def close(self):
+        self.stop_idle()
+        self.ticker.remove(self)
+
+
+class FairScheduler:
+    """
+    Per-avatar FIFO queues served round-robin.
+
+    get() returns the oldest item of the next avatar that has work queued and
+    nothing in flight, and release(avatar) must follow once it is handled. One
+    busy avatar therefore cannot starve the others, and each avatar's items are
+    handled strictly in order even with several workers.
+    """
+
+    def __init__(self):
+        self.cond = Condition()
+        self.queues = {}
+        self.ring = deque()
+        self.busy = set()
+        self.closed = False
+
+    def put(self, avatar, item):
+        with self.cond:
+            queue = self.queues.setdefault(avatar, deque())
+            if not queue:
+                self.ring.append(avatar)
+            queue.append(item)
+            self.cond.notify()
+
+    def _next(self):
+        for _ in range(len(self.ring)):
+            avatar = self.ring.popleft()
+            if avatar in self.busy:
+                self.ring.append(avatar)
+                continue
+            queue = self.queues[avatar]
+            item = queue.popleft()
+            if queue:
+                self.ring.append(avatar)
+            self.busy.add(avatar)
+            return avatar, item
+        return None
+
+    def get(self):
+        """
+        Blocks for the next (avatar, item); returns None once closed.
+        """
+        with self.cond:
+            while True:
+                if self.closed:
+                    return None
+                job = self._next()
+                if job is not None:
+                    return job
+                self.cond.wait()
+
+    def release(self, avatar):
+        with self.cond:
+            self.busy.discard(avatar)
+            self.cond.notify_all()
+
+    def clear(self, avatar):
+        """
+        Drops the avatar's queued items; returns how many were dropped.
+        """
+        with self.cond:
+            queue = self.queues.get(avatar)
+            if not queue:
+                return 0
+            dropped = len(queue)
+            queue.clear()
+            if avatar in self.ring:
+                self.ring.remove(avatar)
+            return dropped
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class StagePool:
+    """
+    Worker threads running handler(avatar, item) for jobs from a FairScheduler.
+    """
+
+    def __init__(self, name, handler, workers):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.scheduler = FairScheduler()
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, avatar, item):
+        self.scheduler.put(avatar, item)
+
+    def stop(self):
+        self.scheduler.close()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _run(self):
+        while True:
+            job = self.scheduler.get()
+            if job is None:
+                break
+            avatar, item = job
+            try:
+                self.handler(avatar, item)
+            except Exception as e:
+                print(f"Error in {self.name} worker for avatar '{avatar.name}': {e}")
+                avatar.idle_tracker.done()
+            finally:
+                self.scheduler.release(avatar)
+
+
+class AvatarRuntime:
+    """
+    Drives any number of avatars through shared TTS -> blendshape -> LiveLink pools.
+
+    Every spoken chunk counts as pending work on its avatar's IdleTracker from
+    speak() until its clip has played (or was dropped), so each avatar has its
+    own idle/busy state. The LiveLink pool size bounds how many avatars can
+    speak at the same moment.
+    """
+
+    def __init__(self, use_local_audio=USE_LOCAL_AUDIO, use_combined_endpoint=USE_COMBINED_ENDPOINT,
+                 tts_workers=AVATAR_TTS_WORKERS, blendshape_workers=AVATAR_BLENDSHAPE_WORKERS,
+                 livelink_workers=AVATAR_LIVELINK_WORKERS):
+        self.use_local_audio = use_local_audio
+        self.use_combined_endpoint = use_combined_endpoint
+        self.avatars = {}
+        self.started = False
+        self.ticker = LiveLinkTicker()
+        self.tts_pool = StagePool("tts", self._synthesize, tts_workers)
+        self.blendshape_pool = StagePool("blendshape", self._blendshapes, blendshape_workers)
+        self.livelink_pool = StagePool("livelink", self._animate, livelink_workers)
+        self.pools = (self.tts_pool, self.blendshape_pool, self.livelink_pool)
+
+    @classmethod
+    def from_config(cls, avatars=AVATARS, **kwargs):
+        runtime = cls(**kwargs)
+        for spec in avatars:
+            runtime.add_avatar(spec["name"], spec.get("host", LIVELINK_HOST), spec.get("port", LIVELINK_PORT),
+                               voice=spec.get("voice"), face_uuid=spec.get("uuid"))
+        return runtime
+
+    def add_avatar(self, name, host=LIVELINK_HOST, port=LIVELINK_PORT, voice=None, face_uuid=None):
+        if name in self.avatars:
+            raise ValueError(f"Avatar '{name}' already exists.")
+        avatar = Avatar(name, self.ticker, host, port, voice=voice, face_uuid=face_uuid,
+                        audio_channel=len(self.avatars))
+        avatar.runtime = self
+        self.avatars[name] = avatar
+        if self.started:
+            avatar.start_idle()
+        return avatar
+
+    def get_avatar(self, avatar):
+        return avatar if isinstance(avatar, Avatar) else self.avatars[avatar]
+
+    def addressed(self, user_input, default=None):
+        """
+        Splits "name: text" into (avatar, text) when name is one of the avatars;
+        otherwise returns (default, or the first avatar, user_input).
+        """
+        name, sep, text = user_input.partition(":")
+        avatar = self.avatars.get(name.strip()) if sep else None
+        if avatar is not None and text.strip():
+            return avatar, text.strip()
+        if default is not None:
+            return self.get_avatar(default), user_input
+        return next(iter(self.avatars.values())), user_input
+
+    def cancel_all(self):
+        """
+        Barge-in hook for every avatar at once (their queued work is dropped on their next respond()).
+        """
+        for avatar in self.avatars.values():
+            avatar.turn_control.cancel_current()
+
+    def start(self):
+        if not self.started:
+            self.ticker.start()
+            for pool in self.pools:
+                pool.start()
+            for avatar in self.avatars.values():
+                avatar.start_idle()
+            self.started = True
+        return self
+
+    def speak(self, avatar, chunk):
+        """
+        Queues one text chunk for the avatar under its current turn.
+        """
+        avatar = self.get_avatar(avatar)
+        if not chunk.strip() or all(c in string.punctuation or c.isspace() for c in chunk):
+            return
+        avatar.idle_tracker.add()
+        self.tts_pool.put(avatar, (chunk, avatar.turn_control.current))
+
+    def interrupt(self, avatar):
+        """
+        Barge-in for one avatar: cancels its current turn, drops its queued work
+        in every stage and returns the new turn's cancel token.
+        """
+        avatar = self.get_avatar(avatar)
+        cancel_token = avatar.turn_control.begin_turn(cancel_previous=True)
+        dropped = sum(pool.scheduler.clear(avatar) for pool in self.pools)
+        avatar.idle_tracker.done(dropped)
+        return cancel_token
+
+    def respond(self, avatar, user_input, chat_history, config, interrupt=True, payload=None):
+        """
+        Streams an LLM reply into the avatar's pipeline; returns the full response text.
+        Without interrupt the reply is queued after whatever the avatar is still saying.
+        """
+        avatar = self.get_avatar(avatar)
+        if interrupt:
+            cancel_token = self.interrupt(avatar)
+        else:
+            cancel_token = avatar.turn_control.current
+        tracer.start_turn(cancel_token)
+        return stream_llm_chunks(user_input, chat_history, avatar, config, cancel_event=cancel_token, payload=payload)
+
+    def wait_until_idle(self, avatar=None, timeout=None):
+        """
+        Waits for one avatar (or all of them) to finish speaking.
+        """
+        avatars = [self.get_avatar(avatar)] if avatar is not None else list(self.avatars.values())
+        return all(a.idle_tracker.wait_until_idle(timeout) for a in avatars)
+
+    def shutdown(self):
+        for pool in self.pools:
+            pool.stop()
+        for avatar in self.avatars.values():
+            avatar.close()
+        self.ticker.stop()
+        self.started = False
+
+    # ---- stage handlers ----
+
+    def _synthesize(self, avatar, item):
+        chunk, cancel_token = item
+        if is_cancelled(cancel_token):
+            avatar.idle_tracker.done()
+            return
+
+        if self.use_combined_endpoint:
+            with tracer.span("tts_blendshapes", cancel_token, chars=len(chunk), avatar=avatar.name):
+                result = run_cancellable(get_tts_with_blendshapes, cancel_token, chunk, avatar.voice)
+            audio_bytes, blendshapes = result if result is not None else (None, None)
+            if not is_cancelled(cancel_token) and audio_bytes and blendshapes:
+                self.livelink_pool.put(avatar, (audio_bytes, blendshapes, cancel_token))
+                return
+        else:
+            with tracer.span("tts", cancel_token, chars=len(chunk), avatar=avatar.name):
+                if self.use_local_audio:
+                    audio_bytes = run_cancellable(call_local_tts, cancel_token, chunk, avatar.voice)
+                else:
+                    audio_bytes = run_cancellable(get_elevenlabs_audio, cancel_token, chunk, avatar.voice)
+            if not is_cancelled(cancel_token) and audio_bytes:
+                self.blendshape_pool.put(avatar, (audio_bytes, cancel_token))
+                return
+
+        if not is_cancelled(cancel_token):
+            print(f"❌ TTS generation failed for avatar '{avatar.name}', chunk:", chunk)
+        avatar.idle_tracker.done()
+
+    def _blendshapes(self, avatar, item):
+        audio_bytes, cancel_token = item
+        with tracer.span("blendshapes", cancel_token, avatar=avatar.name):
+            facial_data = run_cancellable(send_audio_to_neurosync, cancel_token, audio_bytes)
+        if not is_cancelled(cancel_token) and facial_data:
+            self.livelink_pool.put(avatar, (audio_bytes, facial_data, cancel_token))
+            return
+        if not is_cancelled(cancel_token):
+            print(f"❌ Failed to get facial data for avatar '{avatar.name}'.")
+        avatar.idle_tracker.done()
+
+    def _animate(self, avatar, item):
+        audio_bytes, facial_data, cancel_token = item
+        if not is_cancelled(cancel_token):
+            run_audio_animation(audio_bytes, facial_data, avatar.py_face, None, None,
+                                cancel_event=cancel_token, avatar=avatar)
+        avatar.idle_tracker.done()
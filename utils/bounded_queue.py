@@ -0,0 +1,474 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/bounded_queue.py
+#
+# Bounded pipeline queues with an overflow policy and depth metrics.
+# When a queue is full, a put either waits for space ("block"), discards the
+# oldest waiting item ("drop_oldest") or merges the new item into the newest
+# waiting one ("coalesce", e.g. text is joined so nothing is lost). The None
+# shutdown sentinel is never dropped or merged.
+#
+# BoundedQueue is a queue.Queue for worker threads; AsyncStageQueue is the
+# asyncio counterpart used by the async pipeline and the LLM token stream.
+# queue_metrics() reports depth, wait and overflow counters for every named
+# queue; queues created with trace=True also record each item's wait as a
+# "queue_wait" trace span (utils/tracing.py).
+
+import time
+import asyncio
+from queue import Queue, Empty, Full
+from collections import deque
+from threading import Lock
+from concurrent.futures import Future
+
+from utils.tracing import tracer
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
+
+# overflow_action results
+ADD = "add"
+DROP = "drop"
+MERGE = "merge"
+WAIT = "wait"
+
+
+def merge_tokens(older, newer):
+    if isinstance(older, str) and isinstance(newer, str):
+        return older + newer
+    return None
+
+
+def merge_chunks(older, newer):
+    if isinstance(older, str) and isinstance(newer, str):
+        return f"{older} {newer}"
+    return None
+
+
+def overflow_action(items, item, maxsize, policy, merge=None):
+    """
+    Decides what a put does given the waiting items: (ADD, None) if there is
+    room, (DROP, None) to discard the oldest item first, (MERGE, merged) to
+    replace the newest item with merged, or (WAIT, None) to wait for space.
+    merge(older, newer) may return None to refuse.
+    """
+    if maxsize <= 0 or len(items) < maxsize:
+        return ADD, None
+    if not items:
+        return WAIT, None
+    if policy == DROP_OLDEST and items[0] is not None:
+        return DROP, None
+    if policy == COALESCE and merge is not None and item is not None and items[-1] is not None:
+        merged = merge(items[-1], item)
+        if merged is not None:
+            return MERGE, merged
+    return WAIT, None
+
+
+class QueueMetrics:
+    """
+    Depth and overflow counters for one queue. depths keeps the depth seen by
+    each recent put and waits how long recent items waited to be taken, for
+    the averages and 95th percentiles.
+    """
+
+    def __init__(self, window=1000):
+        self.lock = Lock()
+        self.puts = 0
+        self.gets = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.depth = 0
+        self.max_depth = 0
+        self.depths = deque(maxlen=window)
+        self.waits = deque(maxlen=window)
+
+    def record_put(self, depth):
+        with self.lock:
+            self.puts += 1
+            self.depth = depth
+            self.max_depth = max(self.max_depth, depth)
+            self.depths.append(depth)
+
+    def record_get(self, depth, wait=None):
+        with self.lock:
+            self.gets += 1
+            self.depth = depth
+            if wait is not None:
+                self.waits.append(wait)
+
+    def record_drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def record_coalesce(self):
+        with self.lock:
+            self.coalesced += 1
+
+    def record_blocked(self, seconds):
+        with self.lock:
+            self.blocked += 1
+            self.blocked_seconds += seconds
+
+    def summary(self):
+        with self.lock:
+            depths = sorted(self.depths)
+            waits = sorted(self.waits)
+            return {
+                "depth": self.depth,
+                "max_depth": self.max_depth,
+                "avg_depth": sum(depths) / len(depths) if depths else None,
+                "p95_depth": depths[int(0.95 * (len(depths) - 1))] if depths else None,
+                "avg_wait_s": sum(waits) / len(waits) if waits else None,
+                "p95_wait_s": waits[int(0.95 * (len(waits) - 1))] if waits else None,
+                "puts": self.puts,
+                "gets": self.gets,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "blocked": self.blocked,
+                "blocked_seconds": self.blocked_seconds,
+            }
+
+
+_metrics = {}
+_metrics_lock = Lock()
+
+
+def get_queue_metrics(name=None):
+    """
+    Shared metrics for the named queue (so they accumulate across turns and
+    re-created queues); an unregistered instance if name is None.
+    """
+    if name is None:
+        return QueueMetrics()
+    with _metrics_lock:
+        metrics = _metrics.get(name)
+        if metrics is None:
+            metrics = _metrics[name] = QueueMetrics()
+        return metrics
+
+
+def queue_metrics():
+    """
+    Metrics summary for every named queue.
+    """
+    with _metrics_lock:
+        return {name: metrics.summary() for name, metrics in _metrics.items()}
+
+
+def _check_policy(policy):
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown queue policy '{policy}'. Use one of: {', '.join(POLICIES)}")
+
+
+def _record_wait(queue, item, enqueued, depth):
+    now = time.perf_counter()
+    queue.metrics.record_get(depth, now - enqueued)
+    if queue.trace and item is not None:
+        tracer.record("queue_wait", enqueued, now, queue=queue.name)
+
+
+class BoundedQueue(Queue):
+    """
+    queue.Queue with an overflow policy and metrics. Subclasses get
+    _discard(item) for every item dropped by the drop_oldest policy.
+    """
+
+    def __init__(self, maxsize=0, policy=BLOCK, merge=None, name=None, trace=False):
+        _check_policy(policy)
+        super().__init__(maxsize)
+        self.policy = policy
+        self.merge = merge
+        self.name = name
+        self.trace = trace
+        self.metrics = get_queue_metrics(name)
+        # When each waiting item was put (a merged item keeps the older time).
+        self.enqueued = deque()
+
+    def put(self, item, block=True, timeout=None):
+        while True:
+            with self.not_full:
+                # merge is left out here: it may be slow (stitching audio) and runs below without the lock.
+                action, _ = overflow_action(self.queue, item, self.maxsize, self.policy)
+                if action == DROP:
+                    self._discard(self.queue.popleft())
+                    self.enqueued.popleft()
+                    self.unfinished_tasks -= 1
+                    self.metrics.record_drop()
+                if action != WAIT:
+                    self._put(item)
+                    self.unfinished_tasks += 1
+                    self.not_empty.notify()
+                    return
+                newest = self.queue[-1] if self.queue else None
+            if not self._coalesces(newest, item):
+                break
+            merged = self.merge(newest, item)
+            if merged is None:
+                break
+            with self.not_full:
+                # Only swap it in if the newest item was not taken (or joined by another) meanwhile.
+                if self.queue and self.queue[-1] is newest:
+                    self.queue[-1] = merged
+                    self.metrics.record_coalesce()
+                    return
+        start = time.perf_counter()
+        super().put(item, block, timeout)
+        self.metrics.record_blocked(time.perf_counter() - start)
+
+    def _put(self, item):
+        super()._put(item)
+        self.enqueued.append(time.perf_counter())
+        self.metrics.record_put(len(self.queue))
+
+    def _get(self):
+        item = super()._get()
+        _record_wait(self, item, self.enqueued.popleft(), len(self.queue))
+        return item
+
+    def _coalesces(self, newest, item):
+        return self.policy == COALESCE and self.merge is not None and newest is not None and item is not None
+
+    def _discard(self, item):
+        pass
+
+
+class AsyncStageQueue:
+    """
+    Bounded asyncio queue between two stages running on `loop`.
+
+    Coroutines use `await aput()` / `await aget()`, which wait for space or
+    items without holding a thread. The queue.Queue-style methods (put,
+    get_nowait, task_done, join, empty) can be called from any thread; put()
+    from another thread blocks while a "block" queue is full. Called on the
+    loop itself (the SentenceBuilder inside the LLM coroutine) put() never
+    blocks or raises: items that do not fit wait, in order, in a pending buffer
+    until drain() moves them in, and put() returns a future for the outcome
+    (True once the item is queued, False if it was discarded after close()).
+    Such a producer must `await drain()` between puts (run_llm_pipeline does
+    so after every token). The buffer holds at most maxsize items: beyond that
+    the overflow policy applies to it, and on a "block" queue the item is
+    rejected; its future gets queue.Full and the next drain() raises it.
+    With an idle_tracker every item (the None sentinel included, as for join())
+    counts as work until task_done().
+    """
+
+    def __init__(self, loop, maxsize=0, idle_tracker=None, policy=BLOCK, merge=None, name=None, pipeline=None,
+                 trace=False):
+        _check_policy(policy)
+        self.loop = loop
+        self.maxsize = maxsize
+        self.idle_tracker = idle_tracker
+        self.policy = policy
+        self.merge = merge
+        self.pipeline = pipeline
+        self.name = name
+        self.trace = trace
+        self.metrics = get_queue_metrics(name)
+        self.closed = False
+        self._items = deque()
+        self._enqueued = deque()
+        self._pending = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._all_done = asyncio.Event()
+        self._all_done.set()
+        self._unfinished = 0
+        self._drain_lock = asyncio.Lock()
+        self._drain_task = None
+        self._moving = False
+        self._rejected = None
+
+    # ---- loop side ----
+
+    async def aput(self, item):
+        self._track()
+        await self._enqueue(item)
+
+    async def aget(self):
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self._take()
+
+    async def drain(self):
+        """
+        Moves buffered items into the queue, waiting for space (backpressure).
+        Raises queue.Full if a put on the loop was rejected since the last drain().
+        """
+        await self._drain_pending()
+        rejected, self._rejected = self._rejected, None
+        if rejected is not None:
+            raise rejected
+
+    async def _drain_pending(self):
+        async with self._drain_lock:
+            while self._pending:
+                item, outcome = self._pending.popleft()
+                self._moving = True
+                try:
+                    queued = await self._enqueue(item)
+                finally:
+                    self._moving = False
+                if not outcome.done():
+                    outcome.set_result(queued)
+
+    def close(self):
+        """
+        From now on a put that would have to wait discards its item (the consumer is gone).
+        """
+        self.closed = True
+        self._call(self._not_full.set)
+
+    async def _enqueue(self, item):
+        start = None
+        while not self._offer(item):
+            if self.closed:
+                self._release()
+                return False
+            if start is None:
+                start = time.perf_counter()
+            self._not_full.clear()
+            await self._not_full.wait()
+        if start is not None:
+            self.metrics.record_blocked(time.perf_counter() - start)
+        return True
+
+    def _offer(self, item):
+        """
+        Adds item without waiting, applying the overflow policy; False if it has to wait.
+        """
+        action, merged = overflow_action(self._items, item, self.maxsize, self.policy, self.merge)
+        if action == WAIT:
+            return False
+        if action == MERGE:
+            self._items[-1] = merged
+            self._release()
+            self.metrics.record_coalesce()
+            return True
+        if action == DROP:
+            self._items.popleft()
+            self._enqueued.popleft()
+            self._release()
+            self.metrics.record_drop()
+        self._items.append(item)
+        self._enqueued.append(time.perf_counter())
+        self.metrics.record_put(len(self._items))
+        self._not_empty.set()
+        return True
+
+    def _put_on_loop(self, item):
+        outcome = self.loop.create_future()
+        self._track()
+        if not self._pending and not self._moving and self._offer(item):
+            outcome.set_result(True)
+            return outcome
+        pending_items = deque(pending_item for pending_item, _ in self._pending)
+        action, merged = overflow_action(pending_items, item, self.maxsize, self.policy, self.merge)
+        if action == MERGE:
+            newest, newest_outcome = self._pending[-1]
+            self._pending[-1] = (merged, newest_outcome)
+            self._release()
+            self.metrics.record_coalesce()
+            # Queued (or discarded) together with the item it was merged into.
+            newest_outcome.add_done_callback(lambda f: outcome.done() or outcome.set_result(f.result()))
+            return outcome
+        if action == DROP:
+            _, dropped = self._pending.popleft()
+            dropped.set_result(False)
+            self._release()
+            self.metrics.record_drop()
+        elif action == WAIT:
+            self._release()
+            self._rejected = Full(f"{self.name or 'queue'}: {len(self._pending)} items already wait for drain(); "
+                                  "await it between puts")
+            outcome.set_exception(self._rejected)
+            # Reported by the next drain(); retrieving it here keeps asyncio from logging it as lost.
+            outcome.exception()
+            return outcome
+        self._pending.append((item, outcome))
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.ensure_future(self._drain_pending())
+        return outcome
+
+    def _take(self):
+        item = self._items.popleft()
+        self._not_full.set()
+        _record_wait(self, item, self._enqueued.popleft(), len(self._items))
+        return item
+
+    def _get_nowait(self):
+        if self._items:
+            return self._take()
+        if self._pending:
+            item, outcome = self._pending.popleft()
+            outcome.set_result(True)
+            return item
+        raise Empty
+
+    def _track(self):
+        self._unfinished += 1
+        self._all_done.clear()
+        if self.idle_tracker is not None:
+            self.idle_tracker.add()
+
+    def _release(self):
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._all_done.set()
+        if self.idle_tracker is not None:
+            self.idle_tracker.done()
+
+    # ---- queue.Queue-compatible side, any thread ----
+
+    def on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _call(self, fn, *args):
+        if self.on_loop():
+            return fn(*args)
+        result = Future()
+
+        def invoke():
+            try:
+                result.set_result(fn(*args))
+            except BaseException as e:
+                result.set_exception(e)
+
+        self.loop.call_soon_threadsafe(invoke)
+        return result.result()
+
+    def put(self, item):
+        """
+        On the loop: returns a future for the outcome (see the class docstring).
+        From another thread: blocks until the item is queued.
+        """
+        if self.on_loop():
+            return self._put_on_loop(item)
+        asyncio.run_coroutine_threadsafe(self.aput(item), self.loop).result()
+
+    def get_nowait(self):
+        return self._call(self._get_nowait)
+
+    def task_done(self):
+        self._call(self._release)
+
+    def join(self):
+        asyncio.run_coroutine_threadsafe(self._all_done.wait(), self.loop).result()
+
+    def qsize(self):
+        return len(self._items) + len(self._pending)
+
+    def empty(self):
+        return self.qsize() == 0
@@ -0,0 +1,206 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/cancellation.py
+#
+# Per-turn cancellation (barge-in). Every conversation turn gets a CancelToken;
+# the LLM stream, the TTS worker, the blendshape request, audio playback and the
+# LiveLink frame sender all check the token of the turn their work belongs to,
+# so cancelling it stops the whole pipeline and the face returns to idle.
+
+import asyncio
+from functools import partial
+from threading import Event, Lock
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+
+from utils.http_session import AbortScope, abort_scope
+
+# Blocking requests that may be abandoned run here, so the caller can stop waiting on cancel.
+# Its own pool (not the LLM or embedding executors): a cancelled request that is not on the
+# shared HTTP session cannot be aborted and keeps its worker until it returns by itself.
+_cancellable_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="cancellable")
+
+
+class CancelToken(Event):
+    """
+    A threading.Event that marks one turn as cancelled. Anything that accepts a
+    cancel_event can take a CancelToken.
+
+    Callbacks registered with add_cancel_callback() run when it is set, so
+    waiters can be woken instead of polling is_set().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks_lock = Lock()
+        self._callbacks = []
+
+    def set(self):
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def cancel(self):
+        self.set()
+
+    def add_cancel_callback(self, callback):
+        """
+        Runs callback() (on the cancelling thread) once the token is cancelled,
+        at once if it already is. Returns a function that unregisters it.
+        """
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return partial(self._remove_callback, callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback):
+        with self._callbacks_lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @property
+    def cancelled(self):
+        return self.is_set()
+
+
+class TurnControl:
+    """
+    Holds the CancelToken of the current turn.
+
+    begin_turn() cancels the previous turn (if asked) and hands out a fresh token;
+    cancel_current() is the barge-in hook, e.g. when the user starts talking.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._current = CancelToken()
+
+    @property
+    def current(self):
+        with self._lock:
+            return self._current
+
+    def begin_turn(self, cancel_previous=True):
+        with self._lock:
+            if cancel_previous:
+                self._current.cancel()
+            self._current = CancelToken()
+            return self._current
+
+    def cancel_current(self):
+        with self._lock:
+            self._current.cancel()
+
+
+def is_cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+
+def _call_in_scope(scope, fn, args, kwargs):
+    with abort_scope(scope):
+        return fn(*args, **kwargs)
+
+
+def _resolve(future):
+    if not future.done():
+        try:
+            future.set_result(None)
+        except Exception:
+            pass
+
+
+def _resolve_on_loop(loop, future):
+    try:
+        loop.call_soon_threadsafe(_resolve, future)
+    except RuntimeError:
+        pass  # The loop is already closed; nobody is waiting any more.
+
+
+async def wait_for_cancel(cancel_event, poll_interval=0.02):
+    """
+    Returns once cancel_event is set. A CancelToken wakes the waiter through a
+    future it resolves on cancel; a plain threading.Event has no hook, so it is
+    polled every poll_interval seconds.
+    """
+    if not isinstance(cancel_event, CancelToken):
+        while not cancel_event.is_set():
+            await asyncio.sleep(poll_interval)
+        return
+    loop = asyncio.get_running_loop()
+    cancelled = loop.create_future()
+    remove = cancel_event.add_cancel_callback(partial(_resolve_on_loop, loop, cancelled))
+    try:
+        await cancelled
+    finally:
+        remove()
+
+
+def run_cancellable(fn, cancel_event, *args, poll_interval=0.01, **kwargs):
+    """
+    Call fn(*args, **kwargs), but stop waiting and return None as soon as
+    cancel_event is set. Without a cancel_event this is a plain call.
+
+    On cancel, requests fn has in flight on the shared HTTP session
+    (utils/http_session.py) are aborted, so the worker is freed at once. Any
+    other blocking work is abandoned: it finishes in the background and its
+    result is dropped. A CancelToken wakes the wait directly; poll_interval
+    only applies to plain threading.Events.
+    """
+    if cancel_event is None:
+        return fn(*args, **kwargs)
+    if cancel_event.is_set():
+        return None
+
+    scope = AbortScope()
+    future = _cancellable_executor.submit(_call_in_scope, scope, fn, args, kwargs)
+    if not isinstance(cancel_event, CancelToken):
+        # A plain threading.Event cannot wake us, so check it every poll_interval.
+        while True:
+            try:
+                return future.result(timeout=poll_interval)
+            except FutureTimeout:
+                if cancel_event.is_set():
+                    scope.abort()
+                    return None
+
+    cancelled = Future()
+    remove = cancel_event.add_cancel_callback(partial(_resolve, cancelled))
+    try:
+        wait([future, cancelled], return_when=FIRST_COMPLETED)
+    finally:
+        remove()
+    if future.done():
+        return future.result()
+    scope.abort()
+    return None
+
+
+async def run_cancellable_async(fn, cancel_event, *args, executor=None, poll_interval=0.01, **kwargs):
+    """
+    Coroutine form of run_cancellable: runs the blocking fn on executor (the
+    shared cancellable pool if None) and returns None as soon as cancel_event
+    is set, aborting fn's requests on the shared HTTP session.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    loop = asyncio.get_running_loop()
+    scope = AbortScope()
+    future = loop.run_in_executor(executor or _cancellable_executor, partial(_call_in_scope, scope, fn, args, kwargs))
+    if cancel_event is None:
+        return await future
+    cancel_task = asyncio.ensure_future(wait_for_cancel(cancel_event, poll_interval))
+    try:
+        await asyncio.wait({future, cancel_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        cancel_task.cancel()
+    if future.done():
+        return future.result()
+    scope.abort()
+    # The call finishes in the background and its result (or error) is dropped.
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    return None
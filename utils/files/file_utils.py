@@ -2,12 +2,15 @@
 # For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
 # Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
 
+import io
 import os
 import shutil
 import wave
 import uuid
 import numpy as np
 import soundfile as sf
+from queue import Queue
+from threading import Thread, Lock
 
 from utils.csv.save_csv import save_generated_data_as_csv
 from utils.audio.save_audio import save_audio_file
@@ -100,32 +103,123 @@ def load_animation(csv_path):
     return data.values
 
 
-def save_generated_data(audio_bytes, generated_facial_data):
+def is_valid_wav_bytes(audio_bytes):
+    """
+    Returns True if audio_bytes is a readable PCM WAV container with at least one frame.
+    """
+    try:
+        with wave.open(io.BytesIO(audio_bytes), 'rb') as wav_file:
+            return wav_file.getnframes() > 0
+    except (wave.Error, EOFError):
+        return False
+
+
+def create_generated_paths():
     unique_id = str(uuid.uuid4())
     output_dir = os.path.join(GENERATED_DIR, unique_id)
     os.makedirs(output_dir, exist_ok=True)
 
     audio_path = os.path.join(output_dir, 'audio.wav')
     shapes_path = os.path.join(output_dir, 'shapes.csv')
+    return unique_id, audio_path, shapes_path
 
-    # Attempt to save the audio using the existing method
-    save_audio_file(audio_bytes, audio_path)
 
-    # Validate if the saved file is a valid WAV file
+def write_generated_audio(audio_bytes, audio_path, resample_to=None):
+    """
+    Writes audio for a generation. Valid WAV bytes are written as-is unless
+    resample_to is given, in which case they are decoded and resampled (export step).
+    Anything else goes through the decode/resample path, with a raw PCM fallback.
+    """
+    if resample_to is None and is_valid_wav_bytes(audio_bytes):
+        with open(audio_path, 'wb') as f:
+            f.write(audio_bytes)
+        return
+
     try:
-        with wave.open(audio_path, 'rb') as wav_file:
-            wav_file.readframes(1)  # Try to read the first frame
-    except (wave.Error, EOFError):
-        # If the file is not valid, rewrite it using soundfile
-        print(f"The file {audio_path} was not a valid WAV file. Rewriting it using soundfile.")
+        save_audio_file(audio_bytes, audio_path, target_sr=resample_to or 88200)
+    except Exception as e:
+        # If the bytes could not be decoded, treat them as raw 16-bit PCM.
+        print(f"Could not decode audio for {audio_path} ({e}). Writing it as raw PCM.")
         with sf.SoundFile(audio_path, mode='w', samplerate=88200, channels=1, format='WAV', subtype='PCM_16') as f:
             f.write(np.frombuffer(audio_bytes, dtype=np.int16))
 
+
+def save_generated_data(audio_bytes, generated_facial_data, resample_to=None):
+    unique_id, audio_path, shapes_path = create_generated_paths()
+
+    write_generated_audio(audio_bytes, audio_path, resample_to)
+
     # Save the generated facial data as a CSV file
     save_generated_data_as_csv(generated_facial_data, shapes_path)
 
     return unique_id, audio_path, shapes_path
 
+
+class GeneratedDataWriter:
+    """
+    Persists generated audio + blendshapes on a background thread so saving
+    never delays the next prompt. The queue is bounded: if the disk falls
+    behind, save() blocks once max_pending writes are waiting.
+    """
+
+    def __init__(self, max_pending=8, resample_to=None):
+        self.queue = Queue(maxsize=max_pending)
+        self.resample_to = resample_to
+        self.thread = None
+        self.lock = Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def save(self, audio_bytes, generated_facial_data):
+        """
+        Queues a generation for saving and returns its (unique_id, audio_path, shapes_path) immediately.
+        """
+        self.start()
+        paths = create_generated_paths()
+        self.queue.put((audio_bytes, generated_facial_data, paths))
+        return paths
+
+    def stop(self):
+        """
+        Waits for all pending writes to finish and stops the writer thread.
+        """
+        with self.lock:
+            if self.thread is None:
+                return
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            audio_bytes, generated_facial_data, (unique_id, audio_path, shapes_path) = item
+            try:
+                write_generated_audio(audio_bytes, audio_path, self.resample_to)
+                save_generated_data_as_csv(generated_facial_data, shapes_path)
+            except Exception as e:
+                print(f"Error saving generated data {unique_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+
+generated_data_writer = GeneratedDataWriter()
+
+
+def save_generated_data_async(audio_bytes, generated_facial_data):
+    """
+    Same as save_generated_data but hands the work to the background writer.
+    Call generated_data_writer.stop() on shutdown to flush pending writes.
+    """
+    return generated_data_writer.save(audio_bytes, generated_facial_data)
+
 def save_generated_data_from_wav(wav_file_path, generated_facial_data):
     # Create a unique ID for the output directory
     unique_id = str(uuid.uuid4())
@@ -7,16 +7,32 @@ from threading import Thread, Event, Lock
 import numpy as np
 import random
 
-from utils.audio.play_audio import play_audio_from_path, play_audio_from_memory
+from utils.audio.play_audio import play_audio_from_path, play_audio_from_memory, play_audio_on_channel
 from livelink.send_to_unreal import pre_encode_facial_data, send_pre_encoded_data_to_unreal
 from livelink.animations.default_animation import default_animation_loop, stop_default_animation
 from livelink.connect.livelink_init import initialize_py_face 
 from livelink.animations.animation_emotion import determine_highest_emotion,  merge_emotion_data_into_facial_data_wrapper
 from livelink.animations.animation_loader import emotion_animations
+from utils.tracing import tracer
 
 queue_lock = Lock()
 
-def run_audio_animation(audio_input, generated_facial_data, py_face, socket_connection, default_animation_thread):
+def run_audio_animation(audio_input, generated_facial_data, py_face, socket_connection, default_animation_thread, cancel_event=None, avatar=None,
+                        resume_idle=True):
+    """
+    Plays audio_input while streaming the matching facial data to LiveLink, then
+    restarts the idle animation. Setting cancel_event (barge-in) stops playback
+    and the frame sender mid-clip; the idle loop takes over on the next frame.
+
+    With resume_idle=False the face holds its last frame and the caller restarts
+    the idle animation (start_default_animation) when nothing follows.
+
+    With an avatar (utils.avatar_runtime.Avatar) its own subject, idle state and
+    audio channel are used, and the frames go out through the avatar's shared
+    LiveLink ticker instead of socket_connection and the default animation thread.
+    The global default animation is left alone: the ticker sends the clip in
+    place of that avatar's idle frames and resumes idle when it ends.
+    """
 
     if (generated_facial_data is not None and 
         len(generated_facial_data) > 0 and 
@@ -33,22 +49,35 @@ def run_audio_animation(audio_input, generated_facial_data, py_face, socket_conn
             selected_animation = random.choice(emotion_animations[dominant_emotion])
             generated_facial_data = merge_emotion_data_into_facial_data_wrapper(generated_facial_data, selected_animation)
 
-    encoding_face = initialize_py_face()
-    encoded_facial_data = pre_encode_facial_data(generated_facial_data, encoding_face)
+    with tracer.span("pre_encode", cancel_event, frames=len(generated_facial_data)):
+        if avatar is not None:
+            encoded_facial_data = pre_encode_facial_data(generated_facial_data, avatar.new_face(),
+                                                         animation_state=avatar.idle_state)
+        else:
+            encoding_face = initialize_py_face()
+            encoded_facial_data = pre_encode_facial_data(generated_facial_data, encoding_face)
 
-    with queue_lock:
-        stop_default_animation.set()
-        if default_animation_thread and default_animation_thread.is_alive():
-            default_animation_thread.join()
+            with queue_lock:
+                stop_default_animation.set()
+                if default_animation_thread and default_animation_thread.is_alive():
+                    default_animation_thread.join()
 
     start_event = Event()
 
-    if isinstance(audio_input, bytes):
-        audio_thread = Thread(target=play_audio_from_memory, args=(audio_input, start_event))
+    if avatar is not None and avatar.audio_channel is not None:
+        audio_thread = Thread(target=play_audio_on_channel, args=(audio_input, start_event, avatar.audio_channel),
+                              kwargs={"cancel_event": cancel_event})
+    elif isinstance(audio_input, bytes):
+        audio_thread = Thread(target=play_audio_from_memory, args=(audio_input, start_event), kwargs={"cancel_event": cancel_event})
     else:
-        audio_thread = Thread(target=play_audio_from_path, args=(audio_input, start_event))
+        audio_thread = Thread(target=play_audio_from_path, args=(audio_input, start_event), kwargs={"cancel_event": cancel_event})
 
-    data_thread = Thread(target=send_pre_encoded_data_to_unreal, args=(encoded_facial_data, start_event, 60, socket_connection))
+    if avatar is not None:
+        data_thread = Thread(target=avatar.play_frames, args=(encoded_facial_data, start_event, 60),
+                             kwargs={"cancel_event": cancel_event})
+    else:
+        data_thread = Thread(target=send_pre_encoded_data_to_unreal, args=(encoded_facial_data, start_event, 60, socket_connection),
+                             kwargs={"cancel_event": cancel_event})
 
     audio_thread.start()
     data_thread.start()
@@ -58,9 +87,17 @@ def run_audio_animation(audio_input, generated_facial_data, py_face, socket_conn
     audio_thread.join()
     data_thread.join()
 
+    if avatar is not None or not resume_idle:
+        return
+
+    start_default_animation(py_face)
+
+
+def start_default_animation(py_face):
     with queue_lock:
         stop_default_animation.clear()
         default_animation_thread = Thread(target=default_animation_loop, args=(py_face,))
         default_animation_thread.start()
+    return default_animation_thread
 
 
@@ -0,0 +1,155 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/http_session.py
+#
+# The process-wide requests session for the HTTP services (LLM, TTS,
+# blendshapes, embeddings), so every caller shares one keep-alive connection
+# pool. Lives outside utils/llm so the TTS and blendshape clients do not
+# depend on the LLM package.
+#
+# Requests made on this session inside an AbortScope (run_cancellable sets one
+# up, see utils/cancellation.py) can be aborted from another thread:
+# abort() shuts down the sockets the call is using, so a request blocked on a
+# slow TTS or blendshape server fails at once instead of holding its worker.
+
+import socket
+import requests
+from contextlib import contextmanager
+from threading import Lock, local
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_session = None
+_session_lock = Lock()
+_local = local()
+
+
+def _shutdown(connection):
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class AbortScope:
+    """
+    The pooled connections one cancellable call is using. abort() may be
+    called from any thread; requests started after it fail straight away.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.connections = set()
+        self.aborted = False
+
+    def add(self, connection):
+        with self.lock:
+            if not self.aborted:
+                self.connections.add(connection)
+                return
+        _shutdown(connection)
+
+    def discard(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+
+    def abort(self):
+        with self.lock:
+            self.aborted = True
+            connections = list(self.connections)
+            self.connections.clear()
+        for connection in connections:
+            _shutdown(connection)
+
+
+def current_abort_scope():
+    return getattr(_local, "scope", None)
+
+
+@contextmanager
+def abort_scope(scope):
+    """
+    Requests made by this thread inside the block belong to scope.
+    """
+    previous = current_abort_scope()
+    _local.scope = scope
+    try:
+        yield scope
+    finally:
+        _local.scope = previous
+
+
+class _AbortableConnectionMixin:
+    def connect(self):
+        super().connect()
+        scope = current_abort_scope()
+        if scope is not None and scope.aborted:
+            _shutdown(self)
+
+
+class _AbortableHTTPConnection(_AbortableConnectionMixin, HTTPConnection):
+    pass
+
+
+class _AbortableHTTPSConnection(_AbortableConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _AbortablePoolMixin:
+    def _get_conn(self, timeout=None):
+        scope = current_abort_scope()
+        if scope is not None and scope.aborted:
+            raise ConnectionAbortedError("Request cancelled")
+        connection = super()._get_conn(timeout)
+        if scope is not None:
+            scope.add(connection)
+        return connection
+
+    def _put_conn(self, connection):
+        scope = current_abort_scope()
+        if scope is not None and connection is not None:
+            scope.discard(connection)
+        super()._put_conn(connection)
+
+
+class _AbortableHTTPConnectionPool(_AbortablePoolMixin, HTTPConnectionPool):
+    ConnectionCls = _AbortableHTTPConnection
+
+
+class _AbortableHTTPSConnectionPool(_AbortablePoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _AbortableHTTPSConnection
+
+
+class _AbortableAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _AbortableHTTPConnectionPool,
+            "https": _AbortableHTTPSConnectionPool,
+        }
+
+
+def get_http_session():
+    """
+    Return the shared requests session used for the LLM, TTS and blendshape endpoints.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.mount("http://", _AbortableAdapter())
+            _session.mount("https://", _AbortableAdapter())
+        return _session
+
+
+def close_http_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,110 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/idle_state.py
+#
+# Explicit idle/busy state for the speech pipeline. Every item put on a
+# TrackedQueue counts as pending work until its consumer calls task_done(), so
+# a text chunk stays "busy" through TTS, and its audio item stays busy until
+# playback has finished. When the count reaches zero the tracker wakes all
+# waiters at once instead of being polled.
+
+import asyncio
+from threading import Condition
+
+from utils.bounded_queue import BoundedQueue, BLOCK
+
+
+class IdleTracker:
+    """
+    Counts outstanding pipeline work and signals the busy -> idle transition.
+
+    wait_until_idle(timeout) blocks a thread; `await wait_idle(timeout)` does the
+    same from a coroutine. Both return True when idle, False on timeout.
+    """
+
+    def __init__(self):
+        self._cond = Condition()
+        self._pending = 0
+        self._async_waiters = []
+
+    @property
+    def pending(self):
+        with self._cond:
+            return self._pending
+
+    @property
+    def is_idle(self):
+        return self.pending == 0
+
+    @property
+    def state(self):
+        return "idle" if self.is_idle else "busy"
+
+    def add(self, count=1):
+        with self._cond:
+            self._pending += count
+
+    def done(self, count=1):
+        """
+        Marks count items finished. Like queue.Queue.task_done(), raises
+        ValueError if that is more than are pending.
+        """
+        with self._cond:
+            if count > self._pending:
+                raise ValueError(f"done({count}) called with only {self._pending} pending")
+            self._pending -= count
+            if self._pending == 0 and count:
+                self._cond.notify_all()
+                waiters, self._async_waiters = self._async_waiters, []
+                for wake in waiters:
+                    wake()
+
+    def wait_until_idle(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    async def wait_idle(self, timeout=None):
+        loop = asyncio.get_running_loop()
+        idle = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: idle.done() or idle.set_result(True))
+
+        with self._cond:
+            if self._pending == 0:
+                return True
+            self._async_waiters.append(wake)
+        try:
+            return await asyncio.wait_for(idle, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._cond:
+                if wake in self._async_waiters:
+                    self._async_waiters.remove(wake)
+
+
+class TrackedQueue(BoundedQueue):
+    """
+    A BoundedQueue whose unfinished items count towards an IdleTracker, exactly
+    as they count towards join(): every item put, the None sentinel included.
+    Consumers must call task_done() for every item they take (including flushed ones).
+    Items dropped or coalesced away by the overflow policy stop counting at once.
+    """
+
+    def __init__(self, idle_tracker, maxsize=0, policy=BLOCK, merge=None, name=None, trace=False):
+        super().__init__(maxsize, policy, merge, name, trace)
+        self.idle_tracker = idle_tracker
+
+    def _put(self, item):
+        super()._put(item)
+        self.idle_tracker.add(1)
+
+    def task_done(self):
+        super().task_done()
+        self.idle_tracker.done(1)
+
+    def _discard(self, item):
+        self.idle_tracker.done(1)
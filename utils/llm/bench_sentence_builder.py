@@ -0,0 +1,72 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/llm/bench_sentence_builder.py
+#
+# Microbenchmark for SentenceBuilder.
+#   python -m utils.llm.bench_sentence_builder                 # synthetic token stream
+#   python -m utils.llm.bench_sentence_builder tokens.json     # recorded stream (JSON list of token strings)
+#
+# The second table feeds one long run-on chunk (no sentence ends) at growing
+# chunk limits; per-token cost should stay flat as the chunk grows.
+
+import re
+import sys
+import json
+import time
+from queue import Queue
+
+from utils.llm.sentence_builder import SentenceBuilder
+
+SAMPLE_TEXT = (
+    "Dr. Smith measured 3.14 litres, i.e. just over three. \"Really?\" she asked... "
+    "Well, yes! The results, as you'd expect, were fine.\n"
+    "Then Mr. Jones arrived at 5.30 p.m. and everyone went home. "
+)
+
+
+def tokenize_like_llm(text):
+    """
+    Rough stand-in for LLM tokens: words keep their leading space, punctuation is split off.
+    """
+    return re.findall(r"\s*\w+|\s*[^\w\s]|\s+", text)
+
+
+def load_token_stream(path=None, repeat=200):
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return tokenize_like_llm(SAMPLE_TEXT) * repeat
+
+
+def time_stream(tokens, max_chunk_length=500, flush_token_count=300, rounds=5):
+    best = float("inf")
+    chunks = 0
+    for _ in range(rounds):
+        chunk_queue = Queue()
+        builder = SentenceBuilder(chunk_queue, max_chunk_length, flush_token_count)
+        start = time.perf_counter()
+        for token in tokens:
+            builder.add_token(token)
+        builder.flush_remaining()
+        best = min(best, time.perf_counter() - start)
+        chunks = chunk_queue.qsize()
+    return best, chunks
+
+
+def main(argv):
+    tokens = load_token_stream(argv[1] if len(argv) > 1 else None)
+    elapsed, chunks = time_stream(tokens)
+    print(f"Token stream: {len(tokens)} tokens -> {chunks} chunks")
+    print(f"  {elapsed * 1000:.2f} ms total, {elapsed / len(tokens) * 1e6:.2f} us/token")
+
+    print("\nRun-on chunk scaling (no sentence ends):")
+    run_on = [" word"] * 20000
+    for limit in (100, 1000, 10000, 100000):
+        elapsed, chunks = time_stream(run_on, max_chunk_length=limit, flush_token_count=len(run_on) + 1, rounds=3)
+        print(f"  max_chunk_length={limit:>6}: {elapsed / len(run_on) * 1e6:.2f} us/token ({chunks} chunks)")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,273 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/llm/bookkeeping.py
+#
+# Post-turn bookkeeping off the conversation's critical path: saving the full
+# and rolling history, embedding the exchange and writing it to the vector DB
+# all happen on one background thread.
+#
+# Durability: each turn is appended (and fsynced) to a journal before
+# submit() returns, and a "done" line is appended once each stage finished.
+# recover() replays whatever a crash left unfinished. Whenever the worker
+# catches up the journal is cut down to the turns that still failed (emptied
+# if none), and those are retried with the next batch.
+
+import os
+import json
+import uuid
+from queue import Queue, Empty
+from threading import Thread, Lock
+
+from utils.llm.chat_utils import (
+    CHAT_LOGS_DIR,
+    FULL_LOG_JSONL,
+    FULL_LOG_FILE,
+    get_history_store,
+    get_ai_history_store,
+    save_full_chat_history,
+    build_rolling_history,
+    save_rolling_history,
+    save_full_chat_history_ai,
+    build_rolling_history_ai,
+    save_rolling_history_ai,
+)
+from utils.vector_db.vector_db_utils import format_exchange
+from utils.vector_db.get_embedding import get_embeddings
+
+BOOKKEEPING_JOURNAL = os.path.join(CHAT_LOGS_DIR, "bookkeeping_journal.jsonl")
+
+HISTORY_STAGE = "history"
+VECTOR_STAGE = "vector"
+
+
+class TurnBookkeeper:
+    """
+    Background worker for per-turn persistence.
+
+    Bursts are coalesced: the worker drains every job waiting in the queue,
+    syncs each history once, writes only the newest rolling history and embeds
+    all exchanges for the vector DB in one batch. Jobs of a failed batch are
+    kept in `retry` and run again, stages already done skipped, with the next
+    batch (or when the worker stops).
+    """
+
+    def __init__(self, journal_path=BOOKKEEPING_JOURNAL):
+        self.journal_path = journal_path
+        self.queue = Queue()
+        self.thread = None
+        self.lock = Lock()
+        self.journal_lock = Lock()
+        self.pending = 0
+        self.retry = []
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return self
+
+    def submit(self, user_input, response, full_history, vector_db=None, ai_id=None):
+        """
+        Records the turn in the journal and queues its bookkeeping.
+        full_history must already contain the turn.
+        """
+        self.start()
+        job = {
+            "id": uuid.uuid4().hex,
+            "input": user_input,
+            "response": response,
+            "ai_id": ai_id,
+            "vector": vector_db is not None,
+            "text": format_exchange(user_input, response) if vector_db is not None else None,
+        }
+        with self.journal_lock:
+            self.pending += 1
+            self._append_journal({"job": job})
+        self.queue.put((job, full_history, vector_db))
+
+    def flush(self):
+        """
+        Blocks until every queued turn has been written.
+        """
+        self.queue.join()
+
+    def stop(self):
+        """
+        Writes everything still pending, then stops the worker thread.
+        """
+        with self.lock:
+            if self.thread is None:
+                return
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _append_journal(self, record):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @property
+    def failed(self):
+        return bool(self.retry)
+
+    def _mark_done(self, jobs, stage):
+        with self.journal_lock:
+            for job in jobs:
+                self._append_journal({"done": job["id"], "stage": stage})
+                job.setdefault("done", []).append(stage)
+
+    @staticmethod
+    def _stage_done(job, stage):
+        return stage in job.get("done", ())
+
+    def _job_finished(self, job):
+        return self._stage_done(job, HISTORY_STAGE) and (not job["vector"] or self._stage_done(job, VECTOR_STAGE))
+
+    def _finish(self, count):
+        with self.journal_lock:
+            self.pending -= count
+            if self.pending == 0 and os.path.exists(self.journal_path):
+                # Everything submitted so far was attempted; keep only the turns still to retry.
+                self._rewrite_journal([job for job, _, _ in self.retry])
+
+    def _rewrite_journal(self, jobs):
+        if not jobs:
+            open(self.journal_path, "w").close()
+            return
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for job in jobs:
+                f.write(json.dumps({"job": {k: v for k, v in job.items() if k != "done"}}, ensure_ascii=False) + "\n")
+                for stage in job.get("done", ()):
+                    f.write(json.dumps({"done": job["id"], "stage": stage}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = [] if item is None else [item]
+            stop = item is None
+            while not stop:
+                try:
+                    next_item = self.queue.get_nowait()
+                except Empty:
+                    break
+                if next_item is None:
+                    stop = True
+                else:
+                    batch.append(next_item)
+
+            if batch or (stop and self.retry):
+                jobs, self.retry = self.retry + batch, []
+                try:
+                    self._process(jobs)
+                except Exception as e:
+                    print(f"Error in post-turn bookkeeping: {e}")
+                    self.retry = [item for item in jobs if not self._job_finished(item[0])]
+                    print(f"{len(self.retry)} bookkeeping job(s) will be retried.")
+                self._finish(len(batch))
+
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self.queue.task_done()
+            if stop:
+                break
+
+    def _process(self, batch):
+        history_batch = [item for item in batch if not self._stage_done(item[0], HISTORY_STAGE)]
+        histories = {}
+        for job, full_history, _ in history_batch:
+            histories[job["ai_id"]] = full_history
+
+        for ai_id, full_history in histories.items():
+            if ai_id is None:
+                save_full_chat_history(full_history)
+                save_rolling_history(build_rolling_history(full_history))
+            else:
+                save_full_chat_history_ai(ai_id, full_history)
+                save_rolling_history_ai(ai_id, build_rolling_history_ai(ai_id, full_history))
+        self._mark_done([job for job, _, _ in history_batch], HISTORY_STAGE)
+
+        vector_jobs = [(job, vector_db) for job, _, vector_db in batch
+                       if vector_db is not None and not self._stage_done(job, VECTOR_STAGE)]
+        if vector_jobs:
+            self._store_vectors(vector_jobs)
+
+    def _store_vectors(self, vector_jobs):
+        """
+        Embeds and stores the exchanges, marking each one done as soon as it is
+        stored. Raises if any embedding failed, so those jobs stay in the
+        journal and are retried instead of being stored as empty rows.
+        """
+        # Each text carries its own timestamp, so caching its embedding would never pay off.
+        embeddings = get_embeddings([job["text"] for job, _ in vector_jobs], use_openai=False, use_cache=False)
+        failed = 0
+        for (job, vector_db), embedding in zip(vector_jobs, embeddings):
+            if embedding is None or not any(embedding):
+                failed += 1
+                continue
+            vector_db.add_entry(embedding, job["text"])
+            self._mark_done([job], VECTOR_STAGE)
+        if failed:
+            raise RuntimeError(f"{failed} of {len(vector_jobs)} exchange embeddings failed")
+
+    def recover(self, vector_db=None):
+        """
+        Replays turns a crash left unfinished: missing history entries are
+        appended to their history store and missing memories are embedded into
+        vector_db. Call before the histories are loaded.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        jobs, done = [], set()
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if "job" in record:
+                    jobs.append(record["job"])
+                else:
+                    done.add((record["done"], record["stage"]))
+        for job in jobs:
+            job["done"] = [stage for stage in (HISTORY_STAGE, VECTOR_STAGE) if (job["id"], stage) in done]
+
+        history_jobs = [job for job in jobs if (job["id"], HISTORY_STAGE) not in done]
+        for job in history_jobs:
+            if job["ai_id"] is None:
+                store = get_history_store(FULL_LOG_JSONL, FULL_LOG_FILE)
+            else:
+                store = get_ai_history_store(job["ai_id"])
+            entry = {"input": job["input"], "response": job["response"]}
+            # The save may have landed just before the crash, without its done line.
+            if entry not in store.read_tail(len(history_jobs)):
+                store.append(entry)
+            job["done"].append(HISTORY_STAGE)
+
+        vector_jobs = []
+        if vector_db is not None:
+            vector_jobs = [(job, vector_db) for job in jobs if job["vector"] and (job["id"], VECTOR_STAGE) not in done]
+            if vector_jobs:
+                try:
+                    self._store_vectors(vector_jobs)
+                except Exception as e:
+                    print(f"Error recovering memory writes: {e}")
+
+        if history_jobs or vector_jobs:
+            print(f"Recovered {len(history_jobs)} history and {len(vector_jobs)} memory writes from the bookkeeping journal.")
+        # Memories that still failed go to the worker's retry list, keeping their journal entries.
+        unfinished = [job for job in jobs if job["vector"] and not self._stage_done(job, VECTOR_STAGE)]
+        self.retry.extend((job, None, vector_db) for job in unfinished if vector_db is not None)
+        with self.journal_lock:
+            if self.pending == 0:
+                self._rewrite_journal([job for job, _, _ in self.retry])
+
+
+turn_bookkeeper = TurnBookkeeper()
@@ -6,56 +6,79 @@
 import os
 import json
 
+from utils.llm.history_store import ChatHistoryStore, take_recent
+from utils.llm.token_counter import get_token_counter, count_entry_tokens
+from config import ROLLING_CONTEXT_TOKENS, TOKENIZER
+
 # -------------------------------------------------------------------
 # Existing configuration and functions
 CHAT_LOGS_DIR = "chat_logs"
-MAX_CONTEXT_LENGTH = 4000
+# Token budget for the rolling history sent with each request.
+MAX_CONTEXT_TOKENS = ROLLING_CONTEXT_TOKENS
 ROLLING_LOG_FILE = os.path.join(CHAT_LOGS_DIR, "chat_history.json")
+# Legacy full-history JSON file; migrated to FULL_LOG_JSONL on first load.
 FULL_LOG_FILE = os.path.join(CHAT_LOGS_DIR, "chat_history_full.json")
+FULL_LOG_JSONL = os.path.join(CHAT_LOGS_DIR, "chat_history_full.jsonl")
 
 # Ensure the directory exists
 os.makedirs(CHAT_LOGS_DIR, exist_ok=True)
 
+_history_stores = {}
+
+
+def entry_tokens(entry):
+    """
+    Prompt tokens for one history entry, counted with the configured tokenizer.
+    """
+    return count_entry_tokens(entry, get_token_counter(TOKENIZER))
+
+
+def get_history_store(jsonl_path, legacy_json_path=None):
+    """
+    Returns the shared append-only store for a history file.
+    The store caches each entry's token count.
+    """
+    store = _history_stores.get(jsonl_path)
+    if store is None:
+        store = ChatHistoryStore(jsonl_path, legacy_json_path, size_fn=entry_tokens)
+        _history_stores[jsonl_path] = store
+    return store
+
 
 def load_full_chat_history():
     """
-    Loads the never-ending chat history from a JSON file,
+    Loads the never-ending chat history from the JSONL log,
     or returns an empty list if none found.
     """
-    if os.path.exists(FULL_LOG_FILE):
-        with open(FULL_LOG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return get_history_store(FULL_LOG_JSONL, FULL_LOG_FILE).load()
 
 
 def save_full_chat_history(full_history):
     """
     Saves the never-ending chat history to disk (no truncation).
+    Only entries added since the last save are appended.
     """
-    with open(FULL_LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(full_history, f, indent=4)
+    get_history_store(FULL_LOG_JSONL, FULL_LOG_FILE).sync(full_history)
 
 
-def build_rolling_history(full_history):
+def build_rolling_from(full_history, max_context_tokens, store=None):
     """
-    Builds a rolling context from the end of the full_history,
-    ensuring we don't exceed the MAX_CONTEXT_LENGTH in total JSON size.
-    
-    Returns a truncated list that is <= MAX_CONTEXT_LENGTH in size.
+    Newest entries of full_history within max_context_tokens, reusing the
+    store's cached token counts when it holds the same history.
     """
-    rolling = []
-    total_size = 0
+    if store is not None and store.covers(full_history):
+        return store.recent(max_context_tokens)
+    return take_recent(full_history, max_context_tokens, size_fn=entry_tokens)
 
-    # We'll iterate backwards (most recent first), then insert at the front.
-    for entry in reversed(full_history):
-        entry_size = len(json.dumps(entry))
-        if total_size + entry_size <= MAX_CONTEXT_LENGTH:
-            rolling.insert(0, entry)
-            total_size += entry_size
-        else:
-            break
 
-    return rolling
+def build_rolling_history(full_history, max_context_tokens=MAX_CONTEXT_TOKENS):
+    """
+    Builds a rolling context from the end of the full_history,
+    packing the newest turns into max_context_tokens prompt tokens.
+    
+    Returns the newest entries whose token count fits the budget.
+    """
+    return build_rolling_from(full_history, max_context_tokens, get_history_store(FULL_LOG_JSONL, FULL_LOG_FILE))
 
 
 def save_rolling_history(rolling_history):
@@ -86,13 +109,24 @@ def load_chat_history():
     return []
 
 
+def trim_to_context_length(chat_history, max_context_tokens=MAX_CONTEXT_TOKENS):
+    """
+    Drops the oldest entries in place until the total token count fits,
+    counting each entry once.
+    """
+    sizes = [entry_tokens(entry) for entry in chat_history]
+    total_tokens = sum(sizes)
+    drop = 0
+    while total_tokens > max_context_tokens and drop < len(chat_history):
+        total_tokens -= sizes[drop]
+        drop += 1
+    del chat_history[:drop]
+
+
 def save_chat_log(chat_history):
     """Saves the chat history, ensuring it stays within context length."""
     log_file = os.path.join(CHAT_LOGS_DIR, "chat_history_small.json")
-    total_length = sum(len(json.dumps(entry)) for entry in chat_history)
-    while total_length > MAX_CONTEXT_LENGTH and chat_history:
-        chat_history.pop(0)
-        total_length = sum(len(json.dumps(entry)) for entry in chat_history)
+    trim_to_context_length(chat_history)
     with open(log_file, "w", encoding="utf-8") as f:
         json.dump(chat_history, f, indent=4)
 
@@ -104,6 +138,7 @@ def get_ai_log_files(ai_id):
     """
     Returns the rolling and full log file paths for a given AI.
     ai_id should be either 1 or 2.
+    The full log's legacy JSON path is migrated to the same name with .jsonl.
     """
     if ai_id not in (1, 2):
         raise ValueError("ai_id must be 1 or 2")
@@ -112,24 +147,23 @@ def get_ai_log_files(ai_id):
     return rolling_file, full_file
 
 
+def get_ai_history_store(ai_id):
+    _, full_log_file = get_ai_log_files(ai_id)
+    return get_history_store(full_log_file + "l", full_log_file)
+
+
 def load_full_chat_history_ai(ai_id):
     """
     Loads the full chat history for the specified AI.
     """
-    _, full_log_file = get_ai_log_files(ai_id)
-    if os.path.exists(full_log_file):
-        with open(full_log_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return get_ai_history_store(ai_id).load()
 
 
 def save_full_chat_history_ai(ai_id, full_history):
     """
-    Saves the full chat history for the specified AI.
+    Saves the full chat history for the specified AI (appending new entries only).
     """
-    _, full_log_file = get_ai_log_files(ai_id)
-    with open(full_log_file, "w", encoding="utf-8") as f:
-        json.dump(full_history, f, indent=4)
+    get_ai_history_store(ai_id).sync(full_history)
 
 
 def load_rolling_history_ai(ai_id):
@@ -152,26 +186,14 @@ def save_rolling_history_ai(ai_id, rolling_history):
         json.dump(rolling_history, f, indent=4)
 
 
-def build_rolling_history_ai(ai_id, full_history, max_context_length=MAX_CONTEXT_LENGTH):
+def build_rolling_history_ai(ai_id, full_history, max_context_tokens=MAX_CONTEXT_TOKENS):
     """
     Builds a rolling context for the specified AI from its full chat history,
-    ensuring we don't exceed the max_context_length in total JSON size.
+    packing the newest turns into max_context_tokens prompt tokens.
 
-    Returns a truncated list that is <= max_context_length in size.
+    Returns the newest entries whose token count fits the budget.
     """
-    rolling = []
-    total_size = 0
-
-    # Iterate backwards (most recent first), then insert at the front.
-    for entry in reversed(full_history):
-        entry_size = len(json.dumps(entry))
-        if total_size + entry_size <= max_context_length:
-            rolling.insert(0, entry)
-            total_size += entry_size
-        else:
-            break
-
-    return rolling
+    return build_rolling_from(full_history, max_context_tokens, get_ai_history_store(ai_id))
 
 
 def load_chat_history_ai(ai_id):
@@ -190,10 +212,7 @@ def save_chat_log_ai(ai_id, chat_history):
     Saves the chat history for the specified AI, ensuring it stays within context length.
     """
     log_file = os.path.join(CHAT_LOGS_DIR, f"chat_history_small_ai_{ai_id}.json")
-    total_length = sum(len(json.dumps(entry)) for entry in chat_history)
-    while total_length > MAX_CONTEXT_LENGTH and chat_history:
-        chat_history.pop(0)
-        total_length = sum(len(json.dumps(entry)) for entry in chat_history)
+    trim_to_context_length(chat_history)
     with open(log_file, "w", encoding="utf-8") as f:
         json.dump(chat_history, f, indent=4)
 
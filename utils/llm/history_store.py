@@ -0,0 +1,193 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/llm/history_store.py
+#
+# Append-only chat history on disk: one JSON object per line (JSONL). Saving a
+# turn appends one line instead of rewriting the whole history, and the store
+# keeps the cost (token count) of every entry so the rolling context is taken
+# from the tail without re-measuring anything.
+
+import os
+import json
+from threading import Lock
+
+
+def entry_size(entry):
+    """
+    Serialized (JSON) size of an entry; the default cost measure.
+    """
+    return len(json.dumps(entry))
+
+
+def take_recent(entries, max_size, sizes=None, size_fn=entry_size):
+    """
+    Return the longest tail of entries whose total cost is <= max_size.
+    sizes, if given, holds the precomputed size_fn(entry) of each entry.
+    Only the entries that end up in the tail are looked at.
+    """
+    total_size = 0
+    start = len(entries)
+    while start > 0:
+        size = sizes[start - 1] if sizes is not None else size_fn(entries[start - 1])
+        if total_size + size > max_size:
+            break
+        total_size += size
+        start -= 1
+    return entries[start:]
+
+
+class ChatHistoryStore:
+    """
+    JSONL-backed history with O(1) appends.
+
+    entries/sizes/offsets are kept in memory: the entries themselves, their
+    cached cost (size_fn, e.g. a token count), and the byte offset of each
+    line (the tail index), so the newest turns can be read back or trimmed
+    without scanning the file. The store keeps its own copies of the entries
+    and hands out copies, so a caller editing an entry in place does not edit
+    the store's record of what is on disk.
+    An existing legacy JSON file (a list of entries) is migrated on first load.
+    """
+
+    def __init__(self, path, legacy_json_path=None, size_fn=entry_size):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self.size_fn = size_fn
+        self.entries = []
+        self.sizes = []
+        self.offsets = []
+        self.loaded = False
+        self.lock = Lock()
+
+    def load(self):
+        """
+        Returns a copy of all entries. A torn last line (crash mid-append, so
+        no trailing newline) is dropped and cut off the file so later appends
+        start on a clean line. Any other damaged line is skipped with a warning
+        and left in the file; the entries after it are kept.
+        """
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            return [dict(entry) for entry in self.entries]
+
+    def _load(self):
+        self.entries, self.sizes, self.offsets = [], [], []
+        if not os.path.exists(self.path) and self.legacy_json_path and os.path.exists(self.legacy_json_path):
+            self._migrate_legacy()
+
+        if os.path.exists(self.path):
+            torn_at = None
+            with open(self.path, "rb") as f:
+                offset = 0
+                for line in f:
+                    complete = line.endswith(b"\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        if complete:
+                            print(f"Skipping damaged line at byte {offset} of {self.path}.")
+                        else:
+                            print(f"Dropping torn last line at byte {offset} of {self.path}.")
+                            torn_at = offset
+                        offset += len(line)
+                        continue
+                    self._remember(entry, offset)
+                    offset += len(line)
+                    if not complete:
+                        # Written in full but the newline is missing; add it before the next append.
+                        torn_at = offset
+            if torn_at is not None:
+                with open(self.path, "r+b") as f:
+                    f.truncate(torn_at)
+                    if torn_at == offset:
+                        f.seek(torn_at)
+                        f.write(b"\n")
+        self.loaded = True
+
+    def _migrate_legacy(self):
+        with open(self.legacy_json_path, "r", encoding="utf-8") as f:
+            legacy_entries = json.load(f)
+        self._write_all(legacy_entries)
+        print(f"Migrated {len(legacy_entries)} entries from {self.legacy_json_path} to {self.path}.")
+
+    def _remember(self, entry, offset):
+        # Entries are flat dicts of strings, so a shallow copy is a full one.
+        self.entries.append(dict(entry))
+        self.sizes.append(self.size_fn(entry))
+        self.offsets.append(offset)
+
+    def _write_all(self, entries):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def append(self, entry):
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            self._append(entry)
+
+    def _append(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        self._remember(entry, offset)
+
+    def sync(self, full_history):
+        """
+        Persist full_history: new entries at the end are appended; if any
+        earlier entry was changed or removed the file is rewritten once
+        (compaction).
+        """
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            known = len(self.entries)
+            if len(full_history) >= known and full_history[:known] == self.entries:
+                for entry in full_history[known:]:
+                    self._append(entry)
+                return
+            self._write_all(full_history)
+            self.entries, self.sizes, self.offsets = [], [], []
+            self._load()
+
+    def recent(self, max_size):
+        """
+        Newest entries whose total cost fits max_size, using the cached costs.
+        """
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            return [dict(entry) for entry in take_recent(self.entries, max_size, self.sizes)]
+
+    def read_tail(self, count):
+        """
+        Read the last `count` entries back from disk via the offset index.
+        """
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            if count <= 0 or not self.offsets:
+                return []
+            tail = self.offsets[max(0, len(self.offsets) - count):]
+            entries = []
+            with open(self.path, "rb") as f:
+                for offset in tail:
+                    f.seek(offset)
+                    entries.append(json.loads(f.readline()))
+            return entries
+
+    def covers(self, full_history):
+        """
+        True if the store's entries are exactly full_history (so its cached costs apply).
+        """
+        with self.lock:
+            return self.loaded and full_history == self.entries
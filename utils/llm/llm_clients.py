@@ -0,0 +1,89 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/llm/llm_clients.py
+#
+# Process-wide LLM clients. The OpenAI client and the requests session for the
+# local LLM (shared with TTS and blendshapes, see utils/http_session.py) are
+# built once and reused, so the HTTP connection pool (and TLS session) survives
+# between turns and the warm-up request actually helps.
+
+from threading import Thread, Event, Lock
+from openai import OpenAI
+
+from utils.http_session import get_http_session, close_http_session
+
+_clients = {}
+_clients_lock = Lock()
+
+_keepalive_thread = None
+_keepalive_stop = Event()
+
+
+def get_openai_client(config):
+    """
+    Return the shared OpenAI client for the api key / base url in config.
+    Setting OPENAI_BASE_URL points it at any OpenAI-compatible server (e.g. a local stub).
+    """
+    key = ("openai", config["OPENAI_API_KEY"], config.get("OPENAI_BASE_URL"))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(api_key=config["OPENAI_API_KEY"], base_url=config.get("OPENAI_BASE_URL"))
+            _clients[key] = client
+        return client
+
+
+def ping_llm_connection(config):
+    """
+    Cheap request that keeps the pooled connection open without generating text.
+    """
+    if config["USE_LOCAL_LLM"]:
+        get_http_session().head(config["LLM_STREAM_URL"], timeout=2)
+    else:
+        get_openai_client(config).models.list()
+
+
+def _keepalive_loop(config, interval):
+    while not _keepalive_stop.wait(interval):
+        try:
+            ping_llm_connection(config)
+        except Exception as e:
+            print(f"LLM keepalive ping failed: {e}")
+
+
+def start_keepalive(config, interval):
+    """
+    Ping the LLM endpoint every `interval` seconds on a daemon thread so the
+    pooled connection is not closed by idle timeouts between turns.
+    """
+    global _keepalive_thread
+    if interval <= 0 or (_keepalive_thread is not None and _keepalive_thread.is_alive()):
+        return
+    _keepalive_stop.clear()
+    _keepalive_thread = Thread(target=_keepalive_loop, args=(config, interval), daemon=True)
+    _keepalive_thread.start()
+
+
+def stop_keepalive():
+    global _keepalive_thread
+    _keepalive_stop.set()
+    if _keepalive_thread is not None:
+        _keepalive_thread.join()
+        _keepalive_thread = None
+
+
+def close_clients():
+    """
+    Stop the keepalive and close all pooled connections.
+    """
+    stop_keepalive()
+    with _clients_lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
+    close_http_session()
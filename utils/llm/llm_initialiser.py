@@ -1,7 +1,7 @@
 #utils\llm\llm_initialiser.py
 
 from threading import Thread
-from queue import Queue
+from functools import partial
 
 
 from livelink.connect.livelink_init import create_socket_connection, initialize_py_face
@@ -9,15 +9,34 @@ from livelink.animations.default_animation import default_animation_loop
 from utils.tts.tts_bridge import tts_worker
 from utils.files.file_utils import initialize_directories
 from utils.llm.llm_utils import warm_up_llm_connection
-from utils.audio_face_workers import audio_face_queue_worker
+from utils.llm.llm_clients import start_keepalive
+from utils.audio_face_workers import audio_face_queue_worker, merge_audio_items
 from utils.llm.chat_utils import load_full_chat_history, build_rolling_history
+from utils.cancellation import TurnControl
+from utils.idle_state import IdleTracker, TrackedQueue
+from utils.bounded_queue import merge_chunks
+from utils.llm.bookkeeping import turn_bookkeeper
+from utils.vector_db.vector_db import vector_db
+from utils.async_pipeline import AsyncSpeechPipeline
+from utils.avatar_runtime import AvatarRuntime
+from utils.tracing import tracer
 
 from config import (
     DEFAULT_VOICE_NAME as VOICE_NAME,
     USE_LOCAL_AUDIO,
     USE_COMBINED_ENDPOINT,
     ENABLE_EMOTE_CALLS,
+    ENABLE_GAPLESS_PLAYBACK,
+    GAPLESS_CROSSFADE_MS,
+    GAPLESS_LOOKAHEAD_MS,
+    USE_ASYNC_PIPELINE,
+    CHUNK_QUEUE_SIZE,
+    CHUNK_QUEUE_POLICY,
+    AUDIO_QUEUE_SIZE,
+    AUDIO_QUEUE_POLICY,
+    TRACE_JSONL_PATH,
     BASE_SYSTEM_MESSAGE,
+    AVATARS,
     get_llm_config,
     setup_warnings
 )
@@ -29,9 +48,53 @@ setup_warnings()
 llm_config = get_llm_config(system_message=BASE_SYSTEM_MESSAGE)
 
 
-def initialize_system():
+def _initialize_session():
+    """
+    Steps shared by the single- and multi-avatar setups; returns (full_history, chat_history).
+    """
+    initialize_directories()
+    if TRACE_JSONL_PATH:
+        tracer.open_sink(TRACE_JSONL_PATH)
+
+    # Finish any bookkeeping a previous run left in its journal, then load conversation history.
+    turn_bookkeeper.recover(vector_db if llm_config.get("USE_VECTOR_DB") else None)
+    turn_bookkeeper.start()
+    full_history = load_full_chat_history()
+    chat_history = build_rolling_history(full_history)
+
+    # Warm up the LLM connection.
+    warm_up_llm_connection(llm_config)
+    start_keepalive(llm_config, llm_config.get("LLM_KEEPALIVE_INTERVAL", 0))
+    return full_history, chat_history
+
+
+def initialize_avatar_system(avatars=AVATARS):
+    """
+    Multi-avatar counterpart of initialize_system: every avatar in `avatars`
+    (see config.AVATARS) gets its own LiveLink subject, idle loop and turn
+    state, driven by one AvatarRuntime instead of the single-face workers.
+
+    Returns:
+        dict: full_history, chat_history, runtime (shutdown() it on exit) and
+              bookkeeper (stop() it on exit).
+    """
+    full_history, chat_history = _initialize_session()
+    runtime = AvatarRuntime.from_config(avatars).start()
+    return {
+        'full_history': full_history,
+        'chat_history': chat_history,
+        'runtime': runtime,
+        'bookkeeper': turn_bookkeeper,
+    }
+
+
+def initialize_system(use_async_pipeline=USE_ASYNC_PIPELINE):
     """
     Encapsulates all common initialization steps for the system.
+
+    With use_async_pipeline the TTS, blendshape and playback workers are
+    coroutines of an AsyncSpeechPipeline; the returned queues and worker
+    "threads" keep the same put / task_done / join interface either way.
     
     Returns:
         dict: A dictionary containing the initialized objects:
@@ -44,38 +107,66 @@ def initialize_system():
               - audio_queue: the queue for audio data.
               - tts_worker_thread: the thread running the TTS worker.
               - audio_worker_thread: the thread running the audio face worker.
+              - turn_control: per-turn cancel tokens shared by the workers (barge-in).
+              - idle_tracker: idle/busy state of the queues, signalled when the last utterance finishes.
+              - bookkeeper: background worker for history saves and vector DB writes (stop() it on exit).
+              - pipeline: the AsyncSpeechPipeline (stop() it on exit), or None with worker threads.
     """
-    # Initialize directories and hardware interfaces.
-    initialize_directories()
+    full_history, chat_history = _initialize_session()
+
+    # Initialize hardware interfaces.
     py_face = initialize_py_face()
     socket_connection = create_socket_connection()
     
-    # Load conversation history.
-    full_history = load_full_chat_history()
-    chat_history = build_rolling_history(full_history)
-    
-    # Warm up the LLM connection.
-    warm_up_llm_connection(llm_config)
-    
     # Start the default animation thread.
     default_animation_thread = Thread(target=default_animation_loop, args=(py_face,))
     default_animation_thread.start()
     
-    # Create queues for TTS and audio.
-    chunk_queue = Queue()
-    audio_queue = Queue()
+    idle_tracker = IdleTracker()
+    turn_control = TurnControl()
+
+    if use_async_pipeline:
+        pipeline = AsyncSpeechPipeline(
+            py_face, socket_connection, default_animation_thread, turn_control, idle_tracker,
+            use_local_audio=USE_LOCAL_AUDIO, voice_name=VOICE_NAME, use_combined_endpoint=USE_COMBINED_ENDPOINT,
+            enable_emote_calls=ENABLE_EMOTE_CALLS, gapless=ENABLE_GAPLESS_PLAYBACK, crossfade_ms=GAPLESS_CROSSFADE_MS,
+            lookahead_ms=GAPLESS_LOOKAHEAD_MS,
+            chunk_queue_size=CHUNK_QUEUE_SIZE, audio_queue_size=AUDIO_QUEUE_SIZE,
+            chunk_queue_policy=CHUNK_QUEUE_POLICY, audio_queue_policy=AUDIO_QUEUE_POLICY,
+        ).start()
+        return {
+            'py_face': py_face,
+            'socket_connection': socket_connection,
+            'full_history': full_history,
+            'chat_history': chat_history,
+            'default_animation_thread': default_animation_thread,
+            'chunk_queue': pipeline.chunk_queue,
+            'audio_queue': pipeline.audio_queue,
+            'tts_worker_thread': pipeline.tts_stage,
+            'audio_worker_thread': pipeline.playback_stage,
+            'turn_control': turn_control,
+            'idle_tracker': idle_tracker,
+            'bookkeeper': turn_bookkeeper,
+            'pipeline': pipeline,
+        }
+
+    # Create bounded queues for TTS and audio; both report into one idle tracker.
+    chunk_queue = TrackedQueue(idle_tracker, CHUNK_QUEUE_SIZE, CHUNK_QUEUE_POLICY, merge_chunks, "chunk_queue", trace=True)
+    audio_queue = TrackedQueue(idle_tracker, AUDIO_QUEUE_SIZE, AUDIO_QUEUE_POLICY,
+                               partial(merge_audio_items, crossfade_ms=GAPLESS_CROSSFADE_MS), "audio_queue", trace=True)
     
     # Start the TTS worker thread.
     tts_worker_thread = Thread(
         target=tts_worker,
-        args=(chunk_queue, audio_queue, USE_LOCAL_AUDIO, VOICE_NAME, USE_COMBINED_ENDPOINT)
+        args=(chunk_queue, audio_queue, USE_LOCAL_AUDIO, VOICE_NAME, USE_COMBINED_ENDPOINT, turn_control)
     )
     tts_worker_thread.start()
     
     # Start the audio face worker thread.
     audio_worker_thread = Thread(
         target=audio_face_queue_worker,
-        args=(audio_queue, py_face, socket_connection, default_animation_thread, ENABLE_EMOTE_CALLS)
+        args=(audio_queue, py_face, socket_connection, default_animation_thread, ENABLE_EMOTE_CALLS, ENABLE_GAPLESS_PLAYBACK, GAPLESS_CROSSFADE_MS,
+              GAPLESS_LOOKAHEAD_MS)
     )
     audio_worker_thread.start()
     
@@ -90,4 +181,8 @@ def initialize_system():
         'audio_queue': audio_queue,
         'tts_worker_thread': tts_worker_thread,
         'audio_worker_thread': audio_worker_thread,
+        'turn_control': turn_control,
+        'idle_tracker': idle_tracker,
+        'bookkeeper': turn_bookkeeper,
+        'pipeline': None,
     }
@@ -0,0 +1,282 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/llm/llm_providers.py
+#
+# LLM backends behind one interface. A provider only knows how to open a
+# request and yield text; UI echo, chunking, history, cancellation and timeouts
+# live in the shared pipeline (utils/llm/llm_utils.py). New backends subclass
+# LLMProvider, implement open_stream and call register_provider.
+
+import re
+import codecs
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+from utils.llm.llm_clients import get_openai_client
+from utils.http_session import get_http_session
+from utils.bounded_queue import AsyncStageQueue, BLOCK, merge_tokens
+
+from config import AVATARS
+
+# Short blocking calls (opening a request, prompt-cache prefill) run here, so a turn borrows a pooled thread.
+llm_executor = ThreadPoolExecutor(max_workers=max(4, len(AVATARS) + 2), thread_name_prefix="llm-io")
+# A stream's reader holds its thread for the whole response (see _read_tokens), so readers get their own
+# pool: two per avatar that may stream at once (an interrupted stream may still be closing) plus headroom.
+stream_reader_executor = ThreadPoolExecutor(max_workers=2 * len(AVATARS) + 2, thread_name_prefix="llm-stream")
+
+# Read size for streamed LLM responses; reads return as soon as any data is available.
+STREAM_READ_SIZE = 4096
+# Split streamed text after sentence-ending punctuation or at newlines, so the
+# SentenceBuilder still sees every sentence end at the end of a token.
+STREAM_BOUNDARY_PATTERN = re.compile(r'(?<=[.!?])\s+|\n')
+
+
+def iter_response_bytes(response, read_size=STREAM_READ_SIZE):
+    """
+    Yield raw bytes from a streamed requests response as they arrive,
+    one HTTP chunk (or one socket read) at a time instead of byte by byte.
+    """
+    raw = response.raw
+    if getattr(raw, "chunked", False) and hasattr(raw, "read_chunked"):
+        yield from raw.read_chunked(decode_content=True)
+    elif hasattr(raw, "read1"):
+        while True:
+            data = raw.read1(read_size)
+            if not data:
+                break
+            yield data
+    else:
+        yield from response.iter_content(chunk_size=read_size)
+
+
+def iter_stream_text(response, read_size=STREAM_READ_SIZE):
+    """
+    Incrementally decode a streamed response as UTF-8 and yield text pieces
+    at natural boundaries: after sentence ends, at newlines, or up to the last
+    space. A partial word (or split multi-byte character) is held back until
+    the next read completes it.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    for data in iter_response_bytes(response, read_size):
+        pending += decoder.decode(data)
+        if not pending:
+            continue
+        start = 0
+        for match in STREAM_BOUNDARY_PATTERN.finditer(pending):
+            yield pending[start:match.end()]
+            start = match.end()
+        last_space = pending.rfind(" ", start)
+        if last_space >= 0:
+            yield pending[start:last_space + 1]
+            start = last_space + 1
+        pending = pending[start:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def split_words(text):
+    """
+    Split a complete (non-streamed) response into word tokens with trailing spaces.
+    """
+    for token in text.split(' '):
+        yield token + " "
+
+
+class ProviderMetrics:
+    """
+    Running counters and recent latencies for one provider.
+    """
+
+    def __init__(self, window=100):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.tokens = 0
+        self.chars = 0
+        self.first_token_latencies = deque(maxlen=window)
+        self.total_latencies = deque(maxlen=window)
+
+    def summary(self):
+        def average(values):
+            return sum(values) / len(values) if values else None
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "tokens": self.tokens,
+            "chars": self.chars,
+            "avg_first_token_s": average(self.first_token_latencies),
+            "avg_total_s": average(self.total_latencies),
+        }
+
+
+class LLMProvider(ABC):
+    """
+    Base class for LLM backends.
+
+    open_stream(payload, config) runs on a worker thread and returns
+    (iterator, close) where iterator yields text pieces (blocking) and
+    close() aborts the underlying request. stream_tokens wraps it as an
+    async iterator: a pooled thread reads ahead into a bounded per-turn
+    token_queue (TOKEN_QUEUE_SIZE / TOKEN_QUEUE_POLICY in the config).
+    """
+    name = "llm"
+    label = "LLM"
+
+    def __init__(self):
+        self.metrics = ProviderMetrics()
+
+    @abstractmethod
+    def open_stream(self, payload, config):
+        pass
+
+    async def stream_tokens(self, payload, config):
+        loop = asyncio.get_running_loop()
+        iterator, close = await loop.run_in_executor(llm_executor, self.open_stream, payload, config)
+        token_queue = AsyncStageQueue(loop, config.get("TOKEN_QUEUE_SIZE", 64), None,
+                                      config.get("TOKEN_QUEUE_POLICY", BLOCK), merge_tokens, "token_queue")
+        reader = loop.run_in_executor(stream_reader_executor, _read_tokens, iterator, token_queue)
+        try:
+            while True:
+                token = await token_queue.aget()
+                if token is None:
+                    break
+                if isinstance(token, _StreamError):
+                    raise token.error
+                yield token
+        finally:
+            # Abandoned mid-stream (cancel/timeout): the reader stops once close() drops the connection.
+            token_queue.close()
+            reader.add_done_callback(_consume_result)
+            close()
+
+
+class _StreamError:
+    def __init__(self, error):
+        self.error = error
+
+
+def _read_tokens(iterator, token_queue):
+    """
+    Runs on stream_reader_executor: moves tokens from the blocking iterator into
+    token_queue, then None, or a _StreamError if the read failed.
+    """
+    try:
+        for token in iterator:
+            if token_queue.closed:
+                return
+            if token:
+                token_queue.put(token)
+        token_queue.put(None)
+    except (Exception, CancelledError) as e:
+        if not token_queue.closed:
+            token_queue.put(_StreamError(e))
+
+
+def _consume_result(future):
+    if not future.cancelled():
+        future.exception()
+
+
+class LocalStreamingProvider(LLMProvider):
+    name = "local_streaming"
+    label = "streaming - local"
+
+    def open_stream(self, payload, config):
+        response = get_http_session().post(config["LLM_STREAM_URL"], json=payload, stream=True)
+        response.raise_for_status()
+        return iter_stream_text(response), response.close
+
+
+class LocalProvider(LLMProvider):
+    name = "local"
+    label = "non-streaming - local"
+
+    def open_stream(self, payload, config):
+        response = get_http_session().post(config["LLM_API_URL"], json=payload)
+        response.raise_for_status()
+        text = response.json().get('assistant', {}).get('content', "Error: No response.")
+        return split_words(text), response.close
+
+
+class OpenAIStreamingProvider(LLMProvider):
+    name = "openai_streaming"
+    label = "streaming - OpenAI"
+
+    def open_stream(self, payload, config):
+        stream = get_openai_client(config).chat.completions.create(
+            model="gpt-4o",
+            messages=payload["messages"],
+            max_tokens=4000,
+            temperature=1,
+            top_p=0.9,
+            stream=True
+        )
+
+        def tokens():
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta:
+                    yield chunk.choices[0].delta.content or ""
+
+        return tokens(), stream.close
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+    label = "non-streaming - OpenAI"
+
+    def open_stream(self, payload, config):
+        response = get_openai_client(config).chat.completions.create(
+            model="gpt-4o",
+            messages=payload["messages"],
+            max_tokens=4000,
+            temperature=1,
+            top_p=0.9
+        )
+        return split_words(response.choices[0].message.content), lambda: None
+
+
+PROVIDERS = {}
+
+
+def register_provider(provider_class):
+    """
+    Register a provider class under its name. Instances are shared so metrics accumulate.
+    """
+    PROVIDERS[provider_class.name] = provider_class()
+    return provider_class
+
+
+for _provider_class in (LocalStreamingProvider, LocalProvider, OpenAIStreamingProvider, OpenAIProvider):
+    register_provider(_provider_class)
+
+
+def get_provider(config):
+    """
+    Pick the provider named by config["LLM_PROVIDER"], or derive it from
+    USE_LOCAL_LLM / USE_STREAMING when no name is set.
+    """
+    name = config.get("LLM_PROVIDER")
+    if not name:
+        name = "local" if config["USE_LOCAL_LLM"] else "openai"
+        if config["USE_STREAMING"]:
+            name += "_streaming"
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}'. Registered: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]
+
+
+def provider_metrics():
+    """
+    Metrics summary for every registered provider.
+    """
+    return {name: provider.metrics.summary() for name, provider in PROVIDERS.items()}
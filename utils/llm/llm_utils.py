@@ -2,12 +2,15 @@
 # For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
 # Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
 
-import requests
-from threading import Thread
-from queue import Queue
-from openai import OpenAI
+import time
+import asyncio
 
 from utils.llm.sentence_builder import SentenceBuilder
+from utils.llm.llm_clients import get_openai_client
+from utils.http_session import get_http_session
+from utils.llm.llm_providers import PROVIDERS, get_provider
+from utils.tracing import tracer
+from utils.cancellation import wait_for_cancel
 
 
 def warm_up_llm_connection(config):
@@ -17,15 +20,15 @@ def warm_up_llm_connection(config):
     """
     if config["USE_LOCAL_LLM"]:
         try:
-            # For local LLM, use a dummy ping request with a short timeout.
-            requests.post(config["LLM_STREAM_URL"], json={"dummy": "ping"}, timeout=1)
+            # For local LLM, use a dummy ping request with a short timeout on the shared session.
+            get_http_session().post(config["LLM_STREAM_URL"], json={"dummy": "ping"}, timeout=1)
             print("Local LLM connection warmed up.")
         except Exception as e:
             print("Local LLM connection warm-up failed:", e)
     else:
         try:
             # For OpenAI API, send a lightweight ping message.
-            client = OpenAI(api_key=config["OPENAI_API_KEY"])
+            client = get_openai_client(config)
             client.chat.completions.create(
                 model="gpt-4o",
                 messages=[{"role": "system", "content": "ping"}],
@@ -56,11 +59,31 @@ def update_ui(token: str):
         print(token, end='', flush=True)
 
 
-def build_llm_payload(user_input, chat_history, config):
+def build_history_messages(chat_history):
+    """
+    Convert the rolling chat history into user/assistant messages.
+    """
+    messages = []
+    for entry in chat_history:
+        messages.append({"role": "user", "content": entry["input"]})
+        messages.append({"role": "assistant", "content": entry["response"]})
+    return messages
+
+
+def build_llm_payload(user_input, chat_history, config, history_messages=None):
     """
     Build the conversation messages and payload from the user input,
     chat history, and configuration.
 
+    history_messages, if given, is the already converted chat history
+    (see build_history_messages) and is used instead of chat_history.
+    config["turn_context"] (related memories, the time) is placed according
+    to config["TURN_CONTEXT_PLACEMENT"]: appended to the system message
+    ("system", the default), prepended to the user message ("user") or sent
+    as a second system message after the history ("after_history"). The
+    last two keep the system + history prefix the same from one turn to the
+    next, so it stays in the server's prompt cache.
+
     Returns:
         dict: The payload containing the messages and generation parameters.
     """
@@ -68,11 +91,20 @@ def build_llm_payload(user_input, chat_history, config):
         "system_message",
         "You are Mai, speak naturally and like a human might with humour and dryness."
     )
+    if history_messages is None:
+        history_messages = build_history_messages(chat_history)
+    turn_context = (config.get("turn_context") or "").strip()
+    placement = config.get("TURN_CONTEXT_PLACEMENT", "system")
+    if turn_context and placement == "system":
+        system_message = f"{system_message}\n\n{turn_context}"
     messages = [{"role": "system", "content": system_message}]
-    for entry in chat_history:
-        messages.append({"role": "user", "content": entry["input"]})
-        messages.append({"role": "assistant", "content": entry["response"]})
-    messages.append({"role": "user", "content": user_input})
+    messages.extend(history_messages)
+    if turn_context and placement == "after_history":
+        messages.append({"role": "system", "content": turn_context})
+    if turn_context and placement == "user":
+        messages.append({"role": "user", "content": f"{turn_context}\n\n{user_input}"})
+    else:
+        messages.append({"role": "user", "content": user_input})
     
     payload = {
         "messages": messages,
@@ -83,187 +115,172 @@ def build_llm_payload(user_input, chat_history, config):
     return payload
 
 
-def local_llm_streaming(user_input, chat_history, chunk_queue, config):
+def build_sentence_builder(chunk_queue, config, turn=None):
     """
-    Streams tokens from a local LLM using streaming.
+    Create a SentenceBuilder with the chunking policy from the LLM config.
+    turn (the turn's cancel token) attributes its chunk_flush trace spans.
     """
-    payload = build_llm_payload(user_input, chat_history, config)
-    full_response = ""
-    max_chunk_length = config.get("max_chunk_length", 500)
-    flush_token_count = config.get("flush_token_count", 10)
-    
-    # Create the SentenceBuilder and a dedicated token_queue.
-    sentence_builder = SentenceBuilder(chunk_queue, max_chunk_length, flush_token_count)
-    token_queue = Queue()  
-    sb_thread = Thread(target=sentence_builder.run, args=(token_queue,))
-    sb_thread.start()
-    
+    return SentenceBuilder(
+        chunk_queue,
+        max_chunk_length=config.get("max_chunk_length", 500),
+        flush_token_count=config.get("flush_token_count", 10),
+        first_chunk_min_words=config.get("first_chunk_min_words", 0),
+        follow_up_min_length=config.get("follow_up_min_chunk_length", 0),
+        chunk_growth_factor=config.get("chunk_growth_factor", 1.0),
+        turn=turn,
+    )
+
+
+class LLMCancelled(Exception):
+    pass
+
+
+async def _wait_for_cancel(cancel_event):
+    await wait_for_cancel(cancel_event)
+    raise LLMCancelled()
+
+
+async def run_llm_pipeline(provider, user_input, chat_history, chunk_queue, config, cancel_event=None, payload=None):
+    """
+    Shared turn pipeline for every provider: pulls tokens from the provider's
+    async iterator, echoes them to the UI, feeds the SentenceBuilder inline and
+    accumulates the full response.
+
+    Stops early if cancel_event (a threading.Event) is set, if no token arrives
+    within config["LLM_TOKEN_TIMEOUT"] seconds (config["LLM_FIRST_TOKEN_TIMEOUT"]
+    for the first one), or once config["LLM_TOTAL_TIMEOUT"] seconds have passed.
+    Whatever was generated before a timeout is still flushed and returned;
+    on cancellation nothing more is queued for TTS.
+
+    payload may be passed in pre-built (e.g. by SpeculativePrefetch).
+    """
+    if payload is None:
+        payload = build_llm_payload(user_input, chat_history, config)
+    sentence_builder = build_sentence_builder(chunk_queue, config, turn=cancel_event)
+    # Async stage queues buffer chunks that do not fit; awaiting drain() holds the stream back until TTS catches up.
+    drain = getattr(chunk_queue, "drain", None)
+    metrics = provider.metrics
+    response_parts = []
+
+    first_token_timeout = config.get("LLM_FIRST_TOKEN_TIMEOUT")
+    token_timeout = config.get("LLM_TOKEN_TIMEOUT")
+    total_timeout = config.get("LLM_TOTAL_TIMEOUT")
+
+    metrics.requests += 1
+    start_time = time.perf_counter()
+    tokens = provider.stream_tokens(payload, config)
+    cancel_task = asyncio.ensure_future(_wait_for_cancel(cancel_event)) if cancel_event is not None else None
+
     try:
-        session = requests.Session()
-        with session.post(config["LLM_STREAM_URL"], json=payload, stream=True) as response:
-            response.raise_for_status()
-            print("\n\nAssistant Response (streaming - local):\n", flush=True)
-            for token in response.iter_content(chunk_size=1, decode_unicode=True):
-                if not token:
-                    continue
-                full_response += token
-                update_ui(token)
-                token_queue.put(token)
-        session.close()
-        
-        token_queue.put(None)
-        sb_thread.join()
-        return full_response.strip()
-    
+        print(f"\n\nAssistant Response ({provider.label}):\n", flush=True)
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise LLMCancelled()
+            timeout = token_timeout if response_parts else first_token_timeout
+            if total_timeout:
+                remaining = total_timeout - (time.perf_counter() - start_time)
+                timeout = remaining if timeout is None else min(timeout, remaining)
+                if timeout <= 0:
+                    raise asyncio.TimeoutError()
+
+            next_token = asyncio.ensure_future(tokens.__anext__())
+            waiting = {next_token} if cancel_task is None else {next_token, cancel_task}
+            done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if next_token not in done:
+                # Let the provider's generator unwind (and close its request) before stopping.
+                next_token.cancel()
+                await asyncio.wait({next_token})
+                if cancel_task is not None and cancel_task in done:
+                    raise LLMCancelled()
+                raise asyncio.TimeoutError()
+
+            try:
+                token = next_token.result()
+            except StopAsyncIteration:
+                break
+
+            if not response_parts:
+                metrics.first_token_latencies.append(time.perf_counter() - start_time)
+                tracer.record("llm_ttft", start_time, turn=cancel_event, provider=provider.name)
+            metrics.tokens += 1
+            metrics.chars += len(token)
+            response_parts.append(token)
+            update_ui(token)
+            sentence_builder.add_token(token)
+            if drain is not None:
+                await drain()
+
+    except LLMCancelled:
+        metrics.cancelled += 1
+        print("\nLLM response cancelled.")
+        return "".join(response_parts).strip()
+    except asyncio.TimeoutError:
+        metrics.timeouts += 1
+        print(f"\nLLM call ({provider.label}) timed out.")
+        if not response_parts:
+            return f"Error: LLM call ({provider.label}) timed out."
     except Exception as e:
-        print(f"\nError during streaming local LLM call: {e}")
-        return "Error: Streaming LLM call failed."
+        metrics.errors += 1
+        print(f"\nError during LLM call ({provider.label}): {e}")
+        return f"Error: LLM call ({provider.label}) failed."
+    finally:
+        if cancel_task is not None:
+            cancel_task.cancel()
+        await tokens.aclose()
+
+    sentence_builder.flush_remaining()
+    if drain is not None:
+        await drain()
+    metrics.total_latencies.append(time.perf_counter() - start_time)
+    tracer.record("llm_stream", start_time, turn=cancel_event, provider=provider.name, tokens=len(response_parts))
+    return "".join(response_parts).strip()
+
+
+def run_provider(provider_name, user_input, chat_history, chunk_queue, config, cancel_event=None):
+    """
+    Run one turn through the named provider from synchronous code.
+    """
+    provider = PROVIDERS[provider_name]
+    return asyncio.run(run_llm_pipeline(provider, user_input, chat_history, chunk_queue, config, cancel_event))
+
+
+def local_llm_streaming(user_input, chat_history, chunk_queue, config):
+    """
+    Streams tokens from a local LLM using streaming.
+    """
+    return run_provider("local_streaming", user_input, chat_history, chunk_queue, config)
+
 
 def local_llm_non_streaming(user_input, chat_history, chunk_queue, config):
     """
     Calls a local LLM non-streaming endpoint and processes the entire response.
     """
-    payload = build_llm_payload(user_input, chat_history, config)
-    full_response = ""
-    max_chunk_length = config.get("max_chunk_length", 500)
-    flush_token_count = config.get("flush_token_count", 10)
-    
-    # Set up the SentenceBuilder.
-    sentence_builder = SentenceBuilder(chunk_queue, max_chunk_length, flush_token_count)
-    token_queue = Queue()
-    sb_thread = Thread(target=sentence_builder.run, args=(token_queue,))
-    sb_thread.start()
-    
-    try:
-        session = requests.Session()
-        response = session.post(config["LLM_API_URL"], json=payload)
-        session.close()
-        if response.ok:
-            result = response.json()
-            text = result.get('assistant', {}).get('content', "Error: No response.")
-            print("Assistant Response (non-streaming - local):\n", flush=True)
-            tokens = text.split(' ')
-            for token in tokens:
-                token_with_space = token + " "
-                full_response += token_with_space
-                update_ui(token_with_space)
-                token_queue.put(token_with_space)
-            
-            token_queue.put(None)
-            sb_thread.join()
-            return full_response.strip()
-        else:
-            print(f"LLM call failed: HTTP {response.status_code}")
-            return "Error: LLM call failed."
-    
-    except Exception as e:
-        print(f"Error calling local LLM: {e}")
-        return "Error: Exception occurred."
-
+    return run_provider("local", user_input, chat_history, chunk_queue, config)
 
 
 def openai_llm_streaming(user_input, chat_history, chunk_queue, config):
     """
     Streams tokens from the OpenAI API.
     """
-    payload = build_llm_payload(user_input, chat_history, config)
-    full_response = ""
-    max_chunk_length = config.get("max_chunk_length", 500)
-    flush_token_count = config.get("flush_token_count", 10)
-    
-    # Set up the SentenceBuilder.
-    sentence_builder = SentenceBuilder(chunk_queue, max_chunk_length, flush_token_count)
-    token_queue = Queue()
-    sb_thread = Thread(target=sentence_builder.run, args=(token_queue,))
-    sb_thread.start()
-    
-    try:
-        client = OpenAI(api_key=config["OPENAI_API_KEY"])
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=payload["messages"],
-            max_tokens=4000,
-            temperature=1,
-            top_p=0.9,
-            stream=True
-        )
-        print("Assistant Response (streaming - OpenAI):\n", flush=True)
-        for chunk in response:
-            token = chunk.choices[0].delta.content if chunk.choices[0].delta else ""
-            if not token:
-                continue
-            full_response += token
-            update_ui(token)
-            token_queue.put(token)
-        
-        token_queue.put(None)
-        sb_thread.join()
-        return full_response.strip()
-    
-    except Exception as e:
-        print(f"Error calling OpenAI API (streaming): {e}")
-        return "Error: OpenAI API call failed."
-
+    return run_provider("openai_streaming", user_input, chat_history, chunk_queue, config)
 
 
 def openai_llm_non_streaming(user_input, chat_history, chunk_queue, config):
     """
     Calls the OpenAI API without streaming.
     """
-    payload = build_llm_payload(user_input, chat_history, config)
-    full_response = ""
-    max_chunk_length = config.get("max_chunk_length", 500)
-    flush_token_count = config.get("flush_token_count", 10)
-    
-    # Set up the SentenceBuilder.
-    sentence_builder = SentenceBuilder(chunk_queue, max_chunk_length, flush_token_count)
-    token_queue = Queue()
-    sb_thread = Thread(target=sentence_builder.run, args=(token_queue,))
-    sb_thread.start()
-    
-    try:
-        client = OpenAI(api_key=config["OPENAI_API_KEY"])
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=payload["messages"],
-            max_tokens=4000,
-            temperature=1,
-            top_p=0.9
-        )
-        text = response.choices[0].message.content
-        
-        print("Assistant Response (non-streaming - OpenAI):\n", flush=True)
-        tokens = text.split(' ')
-        for token in tokens:
-            token_with_space = token + " "
-            full_response += token_with_space
-            update_ui(token_with_space)
-            token_queue.put(token_with_space)
-        
-        token_queue.put(None)
-        sb_thread.join()
-        return full_response.strip()
-    
-    except Exception as e:
-        print(f"Error calling OpenAI API (non-streaming): {e}")
-        return "Error: OpenAI API call failed."
+    return run_provider("openai", user_input, chat_history, chunk_queue, config)
 
 
-def stream_llm_chunks(user_input, chat_history, chunk_queue, config):
+def stream_llm_chunks(user_input, chat_history, chunk_queue, config, cancel_event=None, payload=None):
     """
-    Dispatches the LLM call to the proper variant based on the configuration.
+    Runs the LLM turn through the provider selected by the configuration
+    (config["LLM_PROVIDER"], or USE_LOCAL_LLM / USE_STREAMING).
+    If chunk_queue belongs to an AsyncSpeechPipeline the turn runs on that
+    pipeline's event loop, next to the TTS and playback stages.
     """
-    USE_LOCAL_LLM = config["USE_LOCAL_LLM"]
-    USE_STREAMING = config["USE_STREAMING"]
-    
-    if USE_LOCAL_LLM:
-        if USE_STREAMING:
-            return local_llm_streaming(user_input, chat_history, chunk_queue, config)
-        else:
-            return local_llm_non_streaming(user_input, chat_history, chunk_queue, config)
-    else:
-        if USE_STREAMING:
-            return openai_llm_streaming(user_input, chat_history, chunk_queue, config)
-        else:
-            return openai_llm_non_streaming(user_input, chat_history, chunk_queue, config)
-
+    provider = get_provider(config)
+    pipeline = getattr(chunk_queue, "pipeline", None)
+    if pipeline is not None:
+        return pipeline.run(run_llm_pipeline(provider, user_input, chat_history, chunk_queue, config, cancel_event, payload))
+    return asyncio.run(run_llm_pipeline(provider, user_input, chat_history, chunk_queue, config, cancel_event, payload))
@@ -3,28 +3,64 @@
 # Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
 
 import re
+import time
 import string
 from queue import Queue
 
+from utils.tracing import tracer
+
 class SentenceBuilder:
     """
     Accumulates tokens into sentences (or partial chunks) and flushes
     complete chunks to a provided chunk_queue for further processing.
+
+    Chunking adapts to latency: when first_chunk_min_words is set, the first
+    chunk is flushed early at a clause boundary (comma, semicolon, colon or
+    before a conjunction) once it has that many words, so speech can start
+    sooner. Later chunks only flush at sentence ends once they reach
+    follow_up_min_length characters, growing by chunk_growth_factor each time,
+    so fewer, longer TTS calls amortize the per-call overhead.
+
+    State is kept incrementally (running character count, current/last word),
+    so each token costs O(len(token)) regardless of how long the chunk is.
     """
     SENTENCE_ENDINGS = {'.', '!', '?'}
     ABBREVIATIONS = {
         "mr.", "mrs.", "ms.", "dr.", "prof.", "sr.", "jr.", "st.",
         "vs.", "e.g.", "i.e.", "etc.", "p.s."
     }
+    # Sentence or clause punctuation (plus closing quotes/brackets) followed by whitespace inside a token.
+    BOUNDARY_PATTERN = re.compile(r'([.!?,;:\u2014]+["\'\u201d\u2019)\]]*)(\s+)')
+    # Sentence punctuation at the very end of a token; confirmed by the next token.
+    TRAILING_END_PATTERN = re.compile(r'[.!?]+["\'\u201d\u2019)\]]*$')
+    CLOSING_CHARS = '"\'\u201d\u2019)]'
+    CLAUSE_ENDINGS = {',', ';', ':', '\u2014'}
+    CONJUNCTIONS = {
+        "and", "but", "or", "so", "because", "although", "though", "while",
+        "which", "when", "whereas", "however", "then", "yet"
+    }
 
-    def __init__(self, chunk_queue, max_chunk_length=500, flush_token_count=300):
+    def __init__(self, chunk_queue, max_chunk_length=500, flush_token_count=300,
+                 first_chunk_min_words=0, follow_up_min_length=0, chunk_growth_factor=1.0, turn=None):
         self.chunk_queue = chunk_queue
+        # The turn's cancel token: each flushed chunk is traced as a span from its first token to the flush.
+        self.turn = turn
+        self.chunk_start = None
         self.max_chunk_length = max_chunk_length
         self.flush_token_count = flush_token_count
+        self.first_chunk_min_words = first_chunk_min_words
+        self.follow_up_min_length = follow_up_min_length
+        self.chunk_growth_factor = chunk_growth_factor
+        self.chunks_flushed = 0
 
         # Internal buffer to accumulate tokens
         self.buffer = []
         self.token_count = 0
+        self.length = 0
+        self.current_word = ""
+        self.last_word = ""
+        self.word_count = 0
+        self.pending_boundary = False
 
     def add_token(self, token: str):
         """
@@ -33,18 +69,42 @@ class SentenceBuilder:
           - The token contains a newline (considered a sentence break).
           - The combined length exceeds max_chunk_length.
           - The token count exceeds flush_token_count.
-          - A sentence-ending punctuation is encountered (unless it's an abbreviation).
+          - A sentence end is detected (not an abbreviation, ellipsis or decimal point)
+            and the chunk has reached the current minimum length.
+          - The first chunk reaches a clause boundary after first_chunk_min_words.
+
+        A boundary at the very end of a token is only confirmed once the next
+        token starts with whitespace, so "3." + "14" and "1," + "000" stay together.
         """
-        self.buffer.append(token)
         self.token_count += 1
 
+        if self.pending_boundary:
+            self.pending_boundary = False
+            if token[:1].isspace():
+                self._flush_buffer()
+
+        if self._wants_clause_flush() and token[:1].isspace() and token.strip().lower() in self.CONJUNCTIONS:
+            self._flush_buffer()
+
+        position = 0
+        for match in self.BOUNDARY_PATTERN.finditer(token):
+            self._append(token[position:match.end(1)])
+            if self._is_sentence_end() and self._reached_min_length():
+                self._flush_buffer()
+            elif self._wants_clause_flush() and self._ends_clause(self.last_word):
+                self._flush_buffer()
+            self._append(match.group(2))
+            position = match.end()
+        if position < len(token):
+            self._append(token[position:])
+
         # Flush immediately if the token contains a newline.
         if '\n' in token:
             self._flush_buffer()
             return
 
         # Flush if raw character length is exceeded
-        if self._current_length() >= self.max_chunk_length:
+        if self.length >= self.max_chunk_length:
             self._flush_buffer()
             return
 
@@ -53,10 +113,12 @@ class SentenceBuilder:
             self._flush_buffer()
             return
 
-        # Flush if we detect a sentence end (unless it is an abbreviation)
-        if self._ends_sentence(token):
-            if not self._is_abbreviation():
-                self._flush_buffer()
+        if self.TRAILING_END_PATTERN.search(token) and self._is_sentence_end():
+            self.pending_boundary = self._reached_min_length()
+        elif self._wants_clause_flush() and self._ends_clause(self.last_word) and not token[-1:].isspace():
+            self.pending_boundary = True
+        elif self._wants_clause_flush() and self._ends_clause(self.last_word):
+            self._flush_buffer()
 
     def flush_remaining(self):
         """
@@ -65,17 +127,39 @@ class SentenceBuilder:
         if self.buffer:
             self._flush_buffer(force=True)
 
+    def _append(self, text: str):
+        """
+        Append text to the buffer and update the running length and word tracker.
+        """
+        if not text:
+            return
+        if not self.buffer:
+            self.chunk_start = time.perf_counter()
+        self.buffer.append(text)
+        self.length += len(text)
+
+        words = text.split()
+        if not words:
+            self.current_word = ""
+            return
+        self.word_count += len(words)
+        if not text[0].isspace() and self.current_word:
+            words[0] = self.current_word + words[0]
+            self.word_count -= 1
+        self.current_word = "" if text[-1].isspace() else words[-1]
+        self.last_word = words[-1]
+
     def _current_length(self) -> int:
         """
         Return the combined length of the tokens in the buffer.
         """
-        return sum(len(t) for t in self.buffer)
+        return self.length
 
     def _ends_sentence(self, token: str) -> bool:
         """
         Return True if the token ends with punctuation that typically ends a sentence.
         """
-        token = token.strip()
+        token = token.strip().rstrip(self.CLOSING_CHARS)
         if not token:
             return False
         return token[-1] in self.SENTENCE_ENDINGS
@@ -85,14 +169,44 @@ class SentenceBuilder:
         Check if the last word in the buffer is an abbreviation.
         For example, "Dr." should not trigger a flush.
         """
-        combined = ''.join(self.buffer).strip()
-        if not combined:
+        return self.last_word.rstrip(self.CLOSING_CHARS).lower() in self.ABBREVIATIONS
+
+    def _ends_clause(self, word: str) -> bool:
+        return bool(word) and word[-1] in self.CLAUSE_ENDINGS
+
+    def _wants_clause_flush(self) -> bool:
+        """
+        True while the first chunk is being built, early flushing is enabled
+        and the chunk already has enough words.
+        """
+        return (
+            self.chunks_flushed == 0
+            and self.first_chunk_min_words > 0
+            and self.word_count >= self.first_chunk_min_words
+        )
+
+    def _reached_min_length(self) -> bool:
+        """
+        Minimum length a follow-up chunk needs before a sentence end flushes it.
+        The first chunk always flushes at its first sentence end.
+        """
+        if self.chunks_flushed == 0 or self.follow_up_min_length <= 0:
+            return True
+        growth = self.chunk_growth_factor ** (self.chunks_flushed - 1)
+        min_length = min(self.follow_up_min_length * growth, self.max_chunk_length // 2)
+        return self.length >= min_length
+
+    def _is_sentence_end(self) -> bool:
+        """
+        Return True if the last word ends a sentence: it ends in . ! or ?,
+        and is not an abbreviation or an ellipsis.
+        """
+        word = self.last_word.rstrip(self.CLOSING_CHARS)
+        if not self._ends_sentence(word):
             return False
-        words = combined.split()
-        if not words:
+        if word.endswith('..'):
             return False
-        last_word = words[-1].lower()
-        return last_word in self.ABBREVIATIONS
+        return not self._is_abbreviation()
 
     def _flush_buffer(self, force=False):
         chunk_text_val = ''.join(self.buffer).strip()
@@ -100,8 +214,16 @@ class SentenceBuilder:
         clean_chunk = clean_text_for_tts(chunk_text_val)
         if clean_chunk:  # Only enqueue if there's something meaningful.
             self.chunk_queue.put(clean_chunk)
+            tracer.record("chunk_flush", self.chunk_start, turn=self.turn, chunk=self.chunks_flushed,
+                          chars=len(clean_chunk), forced=force)
+            self.chunks_flushed += 1
         self.buffer = []
         self.token_count = 0
+        self.length = 0
+        self.current_word = ""
+        self.last_word = ""
+        self.word_count = 0
+        self.pending_boundary = False
 
     def run(self, token_queue: Queue):
         """
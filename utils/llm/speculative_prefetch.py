@@ -0,0 +1,87 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/llm/speculative_prefetch.py
+#
+# Work that can start while the user is still talking (push-to-talk key held,
+# or hands-free capture running): warm the pooled LLM, TTS and blendshape
+# connections, convert the chat history into request messages and, where the
+# local LLM server supports it, prefill its prompt cache with that prefix.
+# When the transcript arrives only the new user message is left to add.
+
+from utils.http_session import get_http_session
+from utils.llm.llm_clients import ping_llm_connection
+from utils.llm.llm_providers import llm_executor
+from utils.llm.llm_utils import build_history_messages, build_llm_payload
+
+from config import USE_LOCAL_AUDIO, LOCAL_TTS_URL, NEUROSYNC_LOCAL_URL
+
+
+def _open_connection(url):
+    # Any response (even 404/405) leaves a pooled keep-alive connection to the host.
+    get_http_session().head(url, timeout=2)
+
+
+class SpeculativePrefetch:
+    """
+    Started when the user begins speaking; consumed by process_turn.
+
+    build_payload(user_input, config) returns the finished LLM payload, or None
+    if the history messages are not built yet or the chat history changed since
+    it started (the caller then builds the payload as usual). It never waits for
+    the warm-up requests.
+    """
+
+    def __init__(self, chat_history, config):
+        self.chat_history = chat_history
+        self.history_length = len(chat_history)
+        self.config = config
+        self.history_messages = None
+        self.future = None
+
+    def start(self):
+        self.future = llm_executor.submit(self._run)
+        return self
+
+    def _run(self):
+        self.history_messages = build_history_messages(self.chat_history)
+
+        warmups = [("LLM", lambda: ping_llm_connection(self.config))]
+        if USE_LOCAL_AUDIO:
+            warmups.append(("TTS", lambda: _open_connection(LOCAL_TTS_URL)))
+        warmups.append(("blendshape", lambda: _open_connection(NEUROSYNC_LOCAL_URL)))
+        for name, warm in warmups:
+            try:
+                warm()
+            except Exception as e:
+                print(f"Prefetch: {name} connection warm-up failed: {e}")
+
+        self._prefill_prompt_cache()
+
+    def _prefill_prompt_cache(self):
+        """
+        Ask the local LLM server to process the system + history prefix now.
+        Only the static system message is sent: the per-turn context follows the
+        history (see build_llm_payload), so this prefix matches the real request.
+        Only done when config["LLM_PREFILL_URL"] is set and the turn context is
+        not merged into the system message (which would change the prefix every
+        turn); OpenAI caches repeated prefixes on its own, so nothing is sent there.
+        """
+        prefill_url = self.config.get("LLM_PREFILL_URL")
+        if not prefill_url or not self.config["USE_LOCAL_LLM"]:
+            return
+        if self.config.get("TURN_CONTEXT_PLACEMENT", "system") == "system":
+            return
+        messages = [{"role": "system", "content": self.config.get("system_message", "")}]
+        messages.extend(self.history_messages)
+        try:
+            get_http_session().post(prefill_url, json={"messages": messages}, timeout=5)
+        except Exception as e:
+            print(f"Prefetch: prompt cache prefill failed: {e}")
+
+    def build_payload(self, user_input, config):
+        # Connection warm-up may still be running; the history messages are built first.
+        if self.history_messages is None or len(self.chat_history) != self.history_length:
+            return None
+        return build_llm_payload(user_input, self.chat_history, config, history_messages=self.history_messages)
@@ -0,0 +1,74 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/llm/token_counter.py
+#
+# Token counting for the rolling context budget. Tokenizers are looked up by
+# name: "tiktoken:<encoding>" uses tiktoken if it is installed, "approx" is a
+# characters/4 estimate, and register_tokenizer adds others (e.g. the local
+# LLM server's own tokenizer). Counts are cached per text, so each turn is
+# tokenized once.
+
+from functools import lru_cache
+
+# Chat formatting overhead per message (role and separators), as in OpenAI's counting guide.
+TOKENS_PER_MESSAGE = 4
+
+_tokenizers = {}
+_counters = {}
+
+
+def approx_token_count(text):
+    """
+    Rough estimate for English text: about four characters per token.
+    """
+    return (len(text) + 3) // 4
+
+
+def register_tokenizer(name, count_fn):
+    """
+    Register count_fn(text) -> int under name.
+    """
+    _tokenizers[name] = count_fn
+    _counters.pop(name, None)
+
+
+register_tokenizer("approx", approx_token_count)
+
+
+def _load_tiktoken(encoding_name):
+    try:
+        import tiktoken
+    except ImportError:
+        print("tiktoken is not installed; estimating token counts from text length.")
+        return approx_token_count
+    try:
+        # Unknown names raise ValueError; a first use without network access fails to download the encoding.
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        print(f"Could not load tiktoken encoding '{encoding_name}' ({e}); estimating token counts from text length.")
+        return approx_token_count
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def get_token_counter(name="tiktoken:cl100k_base"):
+    """
+    Returns a cached count(text) -> int for the named tokenizer.
+    """
+    counter = _counters.get(name)
+    if counter is None:
+        if name not in _tokenizers:
+            if not name.startswith("tiktoken:"):
+                raise ValueError(f"Unknown tokenizer '{name}'. Registered: {', '.join(_tokenizers)}")
+            _tokenizers[name] = _load_tiktoken(name.split(":", 1)[1])
+        counter = lru_cache(maxsize=8192)(_tokenizers[name])
+        _counters[name] = counter
+    return counter
+
+
+def count_entry_tokens(entry, count_text):
+    """
+    Tokens one history entry (a user message and the assistant reply) adds to the prompt.
+    """
+    return 2 * TOKENS_PER_MESSAGE + count_text(entry.get("input", "")) + count_text(entry.get("response", ""))
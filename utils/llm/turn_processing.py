@@ -2,10 +2,12 @@
 
 import time
 import pygame
-from datetime import datetime, timezone
 from queue import Empty
+from threading import Thread
 
 from utils.llm.llm_utils import stream_llm_chunks
+from utils.audio.play_audio import stop_all_playback
+from utils.tracing import tracer
 
 from utils.llm.chat_utils import (
     save_full_chat_history,
@@ -15,32 +17,46 @@ from utils.llm.chat_utils import (
     build_rolling_history_ai,
     save_rolling_history_ai,
 )
-from utils.vector_db.vector_db_utils import update_system_message_with_context, add_exchange_to_vector_db
+from utils.vector_db.vector_db_utils import build_turn_context, add_exchange_to_vector_db
 
 
 def flush_queue(q):
     """
-    Flush all items in the given queue.
+    Flush all items in the given queue, marking each one done so that
+    join() and idle tracking stay balanced.
     """
     try:
         while True:
             q.get_nowait()
+            q.task_done()
     except Empty:
         pass
 
 
-def wait_until_idle(chunk_queue, audio_queue, check_interval=0.05):
+def wait_until_idle(chunk_queue, audio_queue, check_interval=0.05, timeout=None):
     """
-    Wait until:
-      - Both the TTS chunk queue and the audio queue are empty, AND
-      - pygame is not currently playing any audio.
+    Wait until every queued chunk has been spoken and playback has finished.
+
+    Queues created with an IdleTracker (see utils/idle_state.py) are waited on
+    directly: the last task_done() after playback wakes this call. Plain queues
+    fall back to polling the queues and pygame every check_interval seconds.
+
+    Returns True when idle, False if timeout (seconds) expired first.
     """
+    idle_tracker = getattr(chunk_queue, "idle_tracker", None)
+    if idle_tracker is not None and idle_tracker is getattr(audio_queue, "idle_tracker", None):
+        return idle_tracker.wait_until_idle(timeout)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
     while (
         not chunk_queue.empty()
         or not audio_queue.empty()
-        or (pygame.mixer.get_init() and pygame.mixer.get_busy())
+        or (pygame.mixer.get_init() and (pygame.mixer.get_busy() or pygame.mixer.music.get_busy()))
     ):
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
         time.sleep(check_interval)
+    return True
 
 
 def process_turn(
@@ -55,10 +71,14 @@ def process_turn(
     flush=True,
     top_n=4,
     ai_id=None,
+    turn_control=None,
+    prefetch=None,
+    bookkeeper=None,
 ):
     """
     Process a conversation turn by:
-      - Updating the LLM config’s system message (using context from vector DB if enabled).
+      - Setting the LLM config’s system message and this turn's context (related memories
+        from the vector DB if enabled, and the current time).
       - Flushing the queues or waiting until the system is idle.
       - Streaming the LLM response and updating the conversation history.
       - Saving the updated conversation history (using AI‑specific functions if ai_id is provided).
@@ -75,35 +95,173 @@ def process_turn(
       flush (bool): If True, flush the queues; if False, wait until idle.
       top_n (int): The number of related context items to pull from the vector DB (if enabled).
       ai_id (optional): If provided, use AI‑specific conversation logging.
+      turn_control (TurnControl, optional): Hands out this turn's cancel token. With flush,
+        starting the turn cancels whatever the previous turn still has in flight (barge-in).
+      prefetch (SpeculativePrefetch, optional): Started while the user was speaking; supplies
+        the pre-built LLM payload so only the new message has to be added.
+      bookkeeper (TurnBookkeeper, optional): If given, history saves and vector DB writes are
+        journaled and done on its background thread instead of before this call returns.
 
     Returns:
       list: The updated chat history.
     """
-    if llm_config.get("USE_VECTOR_DB"):
-        llm_config["system_message"] = update_system_message_with_context(
-            user_input, base_system_message, vector_db, top_n=top_n
-        )
-    else:
-        current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S GMT")
-        llm_config["system_message"] = (
-            base_system_message + "\nThe current time and date is: " + current_time
-        )
+    set_turn_context(user_input, llm_config, vector_db, base_system_message, top_n)
+    cancel_token = begin_turn(chunk_queue, audio_queue, flush, turn_control)
+    full_response = stream_turn(user_input, chat_history, llm_config, chunk_queue, cancel_token, prefetch)
+    return record_turn(user_input, full_response, chat_history, full_history, llm_config, vector_db, ai_id, bookkeeper)
+
 
+def begin_turn(chunk_queue, audio_queue, flush=True, turn_control=None):
+    """
+    Clears out (flush) or waits for (not flush) the previous turn, then returns
+    the new turn's cancel token from turn_control (None without one).
+    """
+    cancel_token = None
     if flush:
         flush_queue(chunk_queue)
         flush_queue(audio_queue)
+        if turn_control is not None:
+            cancel_token = turn_control.begin_turn(cancel_previous=True)
+            # Anything queued between the first flush and the cancel belongs to the old turn.
+            flush_queue(chunk_queue)
+            flush_queue(audio_queue)
     else:
         wait_until_idle(chunk_queue, audio_queue)
+        if turn_control is not None:
+            cancel_token = turn_control.begin_turn(cancel_previous=False)
+    tracer.start_turn(cancel_token)
+
+    stop_all_playback()
+    return cancel_token
+
+
+def stream_turn(user_input, chat_history, llm_config, chunk_queue, cancel_token=None, prefetch=None):
+    """
+    Streams the reply into the TTS queue and returns it; nothing is recorded.
+    """
+    payload = prefetch.build_payload(user_input, llm_config) if prefetch is not None else None
+    return stream_llm_chunks(user_input, chat_history, chunk_queue, config=llm_config,
+                             cancel_event=cancel_token, payload=payload)
+
+
+class SpeculativeTurn:
+    """
+    A process_turn started on a stable partial transcript, before the final one
+    is in (see StreamingTranscriber.on_stable_partial).
+
+    start() begins the turn on turn_control (cancelling the previous one) and
+    streams the reply on a thread, but nothing is recorded yet. confirm() keeps
+    it when the final transcript matched; otherwise the turn's token is
+    cancelled, it never reaches the histories, and the caller runs process_turn
+    with the final text.
+    """
+
+    def __init__(self, user_input, chat_history, full_history, llm_config, chunk_queue, audio_queue, vector_db,
+                 base_system_message, turn_control, top_n=4, ai_id=None, prefetch=None, bookkeeper=None):
+        self.user_input = user_input
+        self.chat_history = chat_history
+        self.full_history = full_history
+        self.llm_config = llm_config
+        self.chunk_queue = chunk_queue
+        self.audio_queue = audio_queue
+        self.vector_db = vector_db
+        self.base_system_message = base_system_message
+        self.turn_control = turn_control
+        self.top_n = top_n
+        self.ai_id = ai_id
+        self.prefetch = prefetch
+        self.bookkeeper = bookkeeper
+        self.cancel_token = None
+        self.full_response = None
+        self.thread = None
+
+    def start(self):
+        # Begun here rather than on the thread, so abandon() always has the token to cancel.
+        self.cancel_token = begin_turn(self.chunk_queue, self.audio_queue, True, self.turn_control)
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        set_turn_context(self.user_input, self.llm_config, self.vector_db, self.base_system_message, self.top_n)
+        self.full_response = stream_turn(self.user_input, self.chat_history, self.llm_config, self.chunk_queue,
+                                         self.cancel_token, self.prefetch)
+
+    def confirm(self, matches):
+        """
+        Finishes the speculation once the final transcript is known. If it
+        matches, waits for the reply, records it and returns the updated chat
+        history; otherwise cancels the turn and returns None.
+        """
+        if not matches:
+            self.abandon()
+            return None
+        self.thread.join()
+        return record_turn(self.user_input, self.full_response, self.chat_history, self.full_history,
+                           self.llm_config, self.vector_db, self.ai_id, self.bookkeeper)
 
-    if pygame.mixer.get_init():
-        pygame.mixer.stop()
+    def abandon(self):
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+        self.thread.join()
 
-    full_response = stream_llm_chunks(user_input, chat_history, chunk_queue, config=llm_config)
 
+def process_avatar_turn(
+    runtime,
+    avatar,
+    user_input,
+    chat_history,
+    full_history,
+    llm_config,
+    vector_db,
+    base_system_message,
+    flush=True,
+    top_n=4,
+    ai_id=None,
+    prefetch=None,
+    bookkeeper=None,
+):
+    """
+    process_turn for one avatar of an AvatarRuntime (utils/avatar_runtime.py):
+    the reply is spoken by `avatar` through the runtime's shared worker pools.
+    With flush the avatar's current answer is interrupted; otherwise the reply
+    is queued after it. Other avatars keep talking either way.
+
+    Returns:
+      list: The updated chat history.
+    """
+    set_turn_context(user_input, llm_config, vector_db, base_system_message, top_n)
+    payload = prefetch.build_payload(user_input, llm_config) if prefetch is not None else None
+    full_response = runtime.respond(avatar, user_input, chat_history, llm_config, interrupt=flush, payload=payload)
+    return record_turn(user_input, full_response, chat_history, full_history, llm_config, vector_db, ai_id, bookkeeper)
+
+
+def set_turn_context(user_input, llm_config, vector_db, base_system_message, top_n=4):
+    # The system message stays the same every turn so the LLM server can reuse
+    # its cached prefix; the volatile context goes after the chat history.
+    llm_config["system_message"] = base_system_message
+    llm_config["turn_context"] = build_turn_context(
+        user_input, vector_db if llm_config.get("USE_VECTOR_DB") else None, top_n=top_n
+    )
+
+
+def record_turn(user_input, full_response, chat_history, full_history, llm_config, vector_db, ai_id=None,
+                bookkeeper=None):
+    """
+    Adds the finished turn to the histories and saves it (through the
+    bookkeeper if given); returns the updated rolling history.
+    """
     new_turn = {"input": user_input, "response": full_response}
     chat_history.append(new_turn)
     full_history.append(new_turn)
 
+    if bookkeeper is not None:
+        vector_target = vector_db if llm_config.get("USE_VECTOR_DB") else None
+        bookkeeper.submit(user_input, full_response, full_history, vector_target, ai_id)
+        if ai_id is None:
+            return build_rolling_history(full_history)
+        return build_rolling_history_ai(ai_id, full_history)
+
     if ai_id is None:
         save_full_chat_history(full_history)
         updated_chat_history = build_rolling_history(full_history)
@@ -114,6 +272,6 @@ def process_turn(
         save_rolling_history_ai(ai_id, updated_chat_history)
 
     if llm_config.get("USE_VECTOR_DB"):
-        add_exchange_to_vector_db(user_input, full_response, vector_db)
+        add_exchange_to_vector_db(user_input, full_response, vector_db, background=True)
 
     return updated_chat_history
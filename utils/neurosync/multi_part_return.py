@@ -2,7 +2,7 @@
 # For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
 # Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
 import json
-import requests
+from utils.http_session import get_http_session
 from config import TTS_WITH_BLENDSHAPES_REALTIME_API 
 
 def parse_multipart_response(response):
@@ -61,7 +61,7 @@ def get_tts_with_blendshapes(text, voice=None):
         payload["voice"] = voice
 
     try:
-        response = requests.post(TTS_WITH_BLENDSHAPES_REALTIME_API , json=payload)
+        response = get_http_session().post(TTS_WITH_BLENDSHAPES_REALTIME_API , json=payload)
         response.raise_for_status()
         return parse_multipart_response(response)
     except Exception as e:
@@ -4,6 +4,7 @@
 
 import requests
 import json
+from utils.http_session import get_http_session
 from config import NEUROSYNC_API_KEY, NEUROSYNC_REMOTE_URL, NEUROSYNC_LOCAL_URL
 
 def send_audio_to_neurosync(audio_bytes, use_local=True):
@@ -31,7 +32,7 @@ def validate_audio_bytes(audio_bytes):
 
 def post_audio_bytes(audio_bytes, url, headers):
     headers["Content-Type"] = "application/octet-stream"
-    response = requests.post(url, headers=headers, data=audio_bytes)
+    response = get_http_session().post(url, headers=headers, data=audio_bytes)
     return response
 
 def parse_blendshapes_from_json(json_response):
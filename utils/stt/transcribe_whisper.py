@@ -1,10 +1,56 @@
 import requests
 import base64
+import json
 import os
-from config import TRANSCRIPTION_SERVER_URL
+from threading import Thread, Event
+from queue import Queue
+from urllib.parse import urlsplit
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from config import TRANSCRIPTION_SERVER_URL, TRANSCRIPTION_STREAM_URL, TRANSCRIPTION_RAW_UPLOAD
+from utils.tracing import tracer
 
+# Set to False if the first raw upload is rejected (any non-200 answer), so later calls go straight
+# to base64; once a raw upload has succeeded, later errors are reported as errors instead.
+_raw_upload_supported = TRANSCRIPTION_RAW_UPLOAD
+_raw_upload_confirmed = False
+
+
+@tracer.traced("stt", upcoming=True)
 def transcribe_audio(audio_bytes, return_timestamps=False):
     """Transcribe audio with optional timestamps."""
+    global _raw_upload_supported, _raw_upload_confirmed
+    if _raw_upload_supported:
+        try:
+            response = requests.post(
+                TRANSCRIPTION_SERVER_URL,
+                params={'return_timestamps': str(return_timestamps).lower()},
+                headers={'Content-Type': 'application/octet-stream'},
+                data=audio_bytes
+            )
+            if response.status_code == 200:
+                _raw_upload_confirmed = True
+                return parse_transcription_response(response.json(), return_timestamps)
+            if not _raw_upload_confirmed:
+                print(f"Transcription server rejected a raw upload ({response.status_code}), using base64 JSON.")
+                _raw_upload_supported = False
+            else:
+                print("Error: Server returned non-200 status code.")
+                return None, None
+        except requests.exceptions.RequestException as e:
+            print(f"Request failed with exception: {e}")
+            return None, None
+
+    return transcribe_audio_base64(audio_bytes, return_timestamps)
+
+
+def parse_transcription_response(response_data, return_timestamps=False):
+    transcription = response_data.get('transcription', '').strip()
+    timestamps = response_data.get('timestamps', [])
+    return transcription, timestamps if return_timestamps else None
+
+
+def transcribe_audio_base64(audio_bytes, return_timestamps=False):
+    """Transcribe audio sent as base64 inside a JSON body (original protocol)."""
     audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
     try:
         response = requests.post(
@@ -16,10 +62,7 @@ def transcribe_audio(audio_bytes, return_timestamps=False):
         )
 
         if response.status_code == 200:
-            response_data = response.json()
-            transcription = response_data.get('transcription', '').strip()
-            timestamps = response_data.get('timestamps', [])
-            return transcription, timestamps if return_timestamps else None
+            return parse_transcription_response(response.json(), return_timestamps)
 
         print("Error: Server returned non-200 status code.")
     except requests.exceptions.RequestException as e:
@@ -52,3 +95,146 @@ def transcribe_and_save_audio(audio_path, long_form=False):
                     timestamp_file.write(f"[{segment['start']}s - {segment['end']}s]: {segment['text']}\n")
 
     return transcription
+
+
+class StreamingTranscriber:
+    """
+    Uploads PCM chunks to the streaming transcription endpoint while recording
+    is still going on (HTTP chunked transfer), and reads partial transcripts
+    back as newline-delimited JSON: {"text": "...", "is_final": false}.
+
+    The upload runs on its own thread while _run reads the response, so
+    partials (on_partial(text)) arrive during capture rather than after the
+    body is complete. requests cannot do this (it sends the whole body before
+    reading the response), hence http.client.
+
+    feed() matches the on_chunk callback of record_audio_until_silence: pass
+    PCM chunks, then None to finish the upload.
+
+    on_stable_partial(text) is called once, when the same partial has come
+    back stable_updates times in a row, so the caller can start the LLM turn
+    speculatively and later check matches_speculation() on the final text.
+    """
+
+    def __init__(self, sample_rate=88200, url=TRANSCRIPTION_STREAM_URL, on_partial=None,
+                 on_stable_partial=None, stable_updates=2, timeout=30):
+        self.sample_rate = sample_rate
+        self.url = url
+        self.on_partial = on_partial
+        self.on_stable_partial = on_stable_partial
+        self.stable_updates = stable_updates
+        self.timeout = timeout
+
+        self.chunks = Queue()
+        self.done = Event()
+        self.thread = None
+        self.partial = ""
+        self.final = None
+        self.error = None
+        self.speculated_text = None
+        self.closed = False
+
+    def start(self):
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def feed(self, chunk):
+        if self.thread is None:
+            self.start()
+        self.chunks.put(chunk)
+
+    def result(self, timeout=None):
+        """
+        Wait for the final transcript. Returns the text, or None on failure.
+        The wait (the STT latency left once recording stops) is traced as "stt".
+        """
+        with tracer.span("stt", upcoming=True, streaming=True):
+            self.done.wait(timeout)
+        # A reply that arrives after this is too late to speculate on.
+        self.closed = True
+        if self.error is not None:
+            return None
+        return self.final
+
+    def matches_speculation(self, text):
+        """
+        True if text (the final transcript) is what on_stable_partial was called with,
+        ignoring case, spacing and closing punctuation.
+        """
+        if self.speculated_text is None or text is None:
+            return False
+        return normalise_transcript(self.speculated_text) == normalise_transcript(text)
+
+    def _open(self):
+        url = urlsplit(self.url)
+        connection_class = HTTPSConnection if url.scheme == "https" else HTTPConnection
+        connection = connection_class(url.hostname, url.port, timeout=self.timeout)
+        path = url.path or "/"
+        if url.query:
+            path += "?" + url.query
+        connection.putrequest("POST", path)
+        connection.putheader("Content-Type", f"audio/L16; rate={self.sample_rate}; channels=1")
+        connection.putheader("Transfer-Encoding", "chunked")
+        connection.endheaders()
+        return connection
+
+    def _upload(self, connection):
+        """
+        Sends queued chunks as HTTP chunks until None, then the terminating chunk.
+        """
+        try:
+            while True:
+                chunk = self.chunks.get()
+                if chunk is None:
+                    break
+                if chunk:
+                    connection.send(f"{len(chunk):X}\r\n".encode("ascii") + bytes(chunk) + b"\r\n")
+            connection.send(b"0\r\n\r\n")
+        except OSError:
+            # The server closed the connection (e.g. it already sent the final transcript).
+            pass
+
+    def _run(self):
+        connection = None
+        try:
+            connection = self._open()
+            Thread(target=self._upload, args=(connection,), daemon=True).start()
+            response = connection.getresponse()
+            if response.status != 200:
+                raise HTTPException(f"server returned {response.status}")
+            stable_count = 0
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8").strip()
+                if not line:
+                    continue
+                message = json.loads(line)
+                text = message.get('text', '').strip()
+                if message.get('is_final'):
+                    self.final = text
+                    break
+                stable_count = stable_count + 1 if text and text == self.partial else 1
+                self.partial = text
+                if self.on_partial is not None:
+                    self.on_partial(text)
+                if (stable_count >= self.stable_updates and self.speculated_text is None
+                        and self.on_stable_partial is not None and not self.closed):
+                    self.speculated_text = text
+                    self.on_stable_partial(text)
+
+            if self.final is None:
+                self.final = self.partial
+        except (HTTPException, OSError, ValueError) as e:
+            print(f"Streaming transcription failed: {e}")
+            self.error = e
+        finally:
+            if connection is not None:
+                connection.close()
+            self.done.set()
+
+
+def normalise_transcript(text):
+    return " ".join(text.lower().strip().rstrip('.!?').split())
@@ -0,0 +1,240 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/tracing.py
+#
+# Per-turn latency tracing. Each pipeline stage records a span (a start and a
+# duration) or a mark (a point in time) against the turn its work belongs to:
+#
+#   stt, llm_ttft, llm_stream, chunk_flush, tts, tts_blendshapes, blendshapes,
+#   queue_wait, pre_encode, audio_start, livelink_first_frame, livelink_last_frame
+#
+# A turn is identified by its CancelToken (see utils/cancellation.py), which
+# already travels with every chunk and audio item; process_turn registers it
+# with start_turn(). Records keep at_ms, the offset from the turn's start, so a
+# mark like audio_start reads directly as "time until the avatar spoke".
+#
+# Records go to an in-memory ring buffer (summary() gives percentiles per span)
+# and, once open_sink(path) is called, to a JSONL file written by
+# log_timing_worker on its own thread, so stages never wait on disk.
+
+import os
+import json
+import time
+import weakref
+from queue import Queue, Full
+from functools import wraps
+from contextlib import contextmanager
+from collections import deque, OrderedDict
+from threading import Thread, Lock
+
+from config import ENABLE_TRACING, TRACE_BUFFER_SIZE
+
+# Start times kept for this many recent turns.
+MAX_TRACKED_TURNS = 256
+# JSONL lines waiting for the writer thread; more are dropped (and counted) rather than blocking a stage.
+SINK_QUEUE_SIZE = 10000
+
+
+def log_timing_worker(log_queue, log_path=None):
+    """
+    Writes entries from log_queue until None arrives: appended as lines to
+    log_path, or printed if no path is given.
+    """
+    log_file = None
+    if log_path:
+        directory = os.path.dirname(log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        log_file = open(log_path, "a", encoding="utf-8")
+    try:
+        while True:
+            try:
+                log_entry = log_queue.get()
+                if log_entry is None:
+                    break
+                if log_file is None:
+                    print(log_entry)
+                else:
+                    log_file.write(log_entry + "\n")
+                    log_file.flush()
+            except Exception as e:
+                print(f"Logging error: {e}")
+    finally:
+        if log_file is not None:
+            log_file.close()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+
+class Tracer:
+    """
+    Collects spans and marks per turn. Safe to call from any thread.
+
+    turn arguments take the turn's CancelToken; without one the record goes to
+    the current turn, or with upcoming=True to the next one (speech-to-text
+    runs before its turn begins).
+    """
+
+    def __init__(self, capacity=TRACE_BUFFER_SIZE, enabled=ENABLE_TRACING):
+        self.enabled = enabled
+        self.records = deque(maxlen=capacity)
+        self.lock = Lock()
+        self.turn_id = 0
+        self.turn_starts = OrderedDict()
+        self.turn_ids = weakref.WeakKeyDictionary()
+        self.sink = None
+        self.sink_thread = None
+        self.sink_dropped = 0
+
+    # ---- turns ----
+
+    def start_turn(self, cancel_token=None):
+        """
+        Begins a new turn (tied to cancel_token, if given) and returns its id.
+        """
+        now = time.perf_counter()
+        with self.lock:
+            self.turn_id += 1
+            if cancel_token is not None:
+                self.turn_ids[cancel_token] = self.turn_id
+            self._turn_start(self.turn_id, now)
+            return self.turn_id
+
+    def _resolve(self, turn, upcoming):
+        if turn is not None:
+            turn_id = self.turn_ids.get(turn)
+            if turn_id is not None:
+                return turn_id
+        return self.turn_id + 1 if upcoming else self.turn_id
+
+    def _turn_start(self, turn_id, start):
+        # The first record of a turn (e.g. its STT span) marks its start.
+        turn_start = self.turn_starts.get(turn_id)
+        if turn_start is None:
+            turn_start = self.turn_starts[turn_id] = start
+            while len(self.turn_starts) > MAX_TRACKED_TURNS:
+                self.turn_starts.popitem(last=False)
+        return turn_start
+
+    # ---- recording ----
+
+    def record(self, name, start, end=None, turn=None, upcoming=False, **attrs):
+        """
+        Records a span from start to end (time.perf_counter() values; end
+        defaults to now).
+        """
+        if not self.enabled:
+            return
+        if end is None:
+            end = time.perf_counter()
+        with self.lock:
+            turn_id = self._resolve(turn, upcoming)
+            turn_start = self._turn_start(turn_id, start)
+            entry = {
+                "turn": turn_id,
+                "name": name,
+                "at_ms": round((start - turn_start) * 1000, 3),
+                "duration_ms": round((end - start) * 1000, 3),
+                "ts": round(time.time() - (time.perf_counter() - start), 6),
+            }
+            entry.update(attrs)
+            self.records.append(entry)
+            sink = self.sink
+        if sink is not None:
+            try:
+                sink.put_nowait(json.dumps(entry, default=str))
+            except Full:
+                self.sink_dropped += 1
+
+    def mark(self, name, turn=None, **attrs):
+        now = time.perf_counter()
+        self.record(name, now, now, turn, kind="mark", **attrs)
+
+    @contextmanager
+    def span(self, name, turn=None, upcoming=False, **attrs):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, None, turn, upcoming, **attrs)
+
+    def traced(self, name, upcoming=False):
+        """
+        Decorator that records every call of the function as a span.
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name, upcoming=upcoming):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ---- reading ----
+
+    def turn_records(self, turn_id=None):
+        with self.lock:
+            turn_id = self.turn_id if turn_id is None else turn_id
+            return [entry for entry in self.records if entry["turn"] == turn_id]
+
+    def summary(self):
+        """
+        Percentiles per name over the ring buffer: span durations, or for marks
+        the time since the turn started.
+        """
+        with self.lock:
+            records = list(self.records)
+        values = {}
+        for entry in records:
+            value = entry["at_ms"] if entry.get("kind") == "mark" else entry["duration_ms"]
+            values.setdefault(entry["name"], []).append(value)
+        summary = {}
+        for name, samples in values.items():
+            samples.sort()
+            summary[name] = {
+                "count": len(samples),
+                "p50_ms": percentile(samples, 0.5),
+                "p95_ms": percentile(samples, 0.95),
+                "p99_ms": percentile(samples, 0.99),
+                "max_ms": samples[-1],
+            }
+        return summary
+
+    def format_turn(self, turn_id=None):
+        lines = [f"{entry['name']:<22} at {entry['at_ms']:>9.1f} ms  took {entry['duration_ms']:>9.1f} ms"
+                 for entry in self.turn_records(turn_id)]
+        return "\n".join(lines)
+
+    def format_summary(self):
+        return "\n".join(f"{name:<22} n={stats['count']:<5} p50 {stats['p50_ms']:>9.1f} ms  "
+                         f"p95 {stats['p95_ms']:>9.1f} ms  p99 {stats['p99_ms']:>9.1f} ms  max {stats['max_ms']:>9.1f} ms"
+                         for name, stats in self.summary().items())
+
+    # ---- JSONL sink ----
+
+    def open_sink(self, log_path):
+        """
+        Appends every record from now on to log_path as one JSON line.
+        """
+        if self.sink_thread is not None:
+            return
+        self.sink = Queue(maxsize=SINK_QUEUE_SIZE)
+        self.sink_thread = Thread(target=log_timing_worker, args=(self.sink, log_path), name="trace-sink", daemon=True)
+        self.sink_thread.start()
+
+    def close(self):
+        """
+        Writes out what the sink still holds and stops its thread.
+        """
+        sink, self.sink = self.sink, None
+        if sink is not None:
+            sink.put(None)
+            self.sink_thread.join()
+            self.sink_thread = None
+
+
+tracer = Tracer()
@@ -2,6 +2,8 @@ import io
 import json
 import requests
 
+from utils.http_session import get_http_session
+
 voices = {
     "Sarah": "EXAVITQu4vr4xnSDxMaL",
     "Laura": "FGY2WhTYpPnrIDTdsKH5",
@@ -49,7 +51,7 @@ def get_elevenlabs_audio(text, name):
         }
     }
 
-    response = requests.post(API_URL, headers=headers, json=payload)
+    response = get_http_session().post(API_URL, headers=headers, json=payload)
     response.raise_for_status()
 
     audio_data = response.content
@@ -1,5 +1,5 @@
 # utils/local_tts.py
-import requests
+from utils.http_session import get_http_session
 
 from config import LOCAL_TTS_URL
 
@@ -15,7 +15,8 @@ def call_local_tts(text, voice=None):
         payload["voice"] = voice
 
     try:
-        response = requests.post(LOCAL_TTS_URL, json=payload)
+        # Pooled session, so the connection opened by warm-up/prefetch is reused.
+        response = get_http_session().post(LOCAL_TTS_URL, json=payload)
         response.raise_for_status()
         return response.content
     except Exception as e:
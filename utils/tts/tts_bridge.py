@@ -6,9 +6,11 @@ from utils.neurosync.multi_part_return import get_tts_with_blendshapes
 from utils.neurosync.neurosync_api_connect import send_audio_to_neurosync
 from utils.tts.local_tts import call_local_tts 
 from utils.tts.eleven_labs import get_elevenlabs_audio
+from utils.cancellation import run_cancellable, is_cancelled
+from utils.tracing import tracer
 import string
 
-def tts_worker(chunk_queue, audio_queue, USE_LOCAL_AUDIO=True, VOICE_NAME=None, USE_COMBINED_ENDPOINT=False):
+def tts_worker(chunk_queue, audio_queue, USE_LOCAL_AUDIO=True, VOICE_NAME=None, USE_COMBINED_ENDPOINT=False, turn_control=None):
     """
     Processes text chunks from chunk_queue.
     
@@ -17,6 +19,9 @@ def tts_worker(chunk_queue, audio_queue, USE_LOCAL_AUDIO=True, VOICE_NAME=None,
     and then retrieves facial data separately.
     
     The results (audio_bytes, facial/blendshape data) are enqueued into audio_queue.
+    With a turn_control, each chunk is tied to the current turn's cancel token:
+    cancelled chunks are skipped, in-flight requests are abandoned, and the
+    token travels with the result as a third tuple element.
     
     Parameters:
       - chunk_queue: Queue holding text chunks.
@@ -24,12 +29,18 @@ def tts_worker(chunk_queue, audio_queue, USE_LOCAL_AUDIO=True, VOICE_NAME=None,
       - USE_LOCAL_AUDIO (bool): If True, use local TTS. If False, use ElevenLabs.
       - VOICE_NAME (str): Voice name to use for ElevenLabs TTS.
       - USE_COMBINED_ENDPOINT (bool): If True, use the combined TTS+blendshapes endpoint.
+      - turn_control (TurnControl): Optional source of per-turn cancel tokens.
     """
     while True:
         chunk = chunk_queue.get()
         if chunk is None:
             break
 
+        cancel_token = turn_control.current if turn_control is not None else None
+        if is_cancelled(cancel_token):
+            chunk_queue.task_done()
+            continue
+
         # Skip if the chunk is empty or only punctuation/whitespace.
         if not chunk.strip() or all(c in string.punctuation or c.isspace() for c in chunk):
             chunk_queue.task_done()
@@ -37,26 +48,42 @@ def tts_worker(chunk_queue, audio_queue, USE_LOCAL_AUDIO=True, VOICE_NAME=None,
 
         if USE_COMBINED_ENDPOINT:
             # Use the combined endpoint: one call returns both audio and blendshapes.
-            audio_bytes, blendshapes = get_tts_with_blendshapes(chunk, VOICE_NAME)
-            if audio_bytes and blendshapes:
-                audio_queue.put((audio_bytes, blendshapes))
+            with tracer.span("tts_blendshapes", cancel_token, chars=len(chunk)):
+                result = run_cancellable(get_tts_with_blendshapes, cancel_token, chunk, VOICE_NAME)
+            audio_bytes, blendshapes = result if result is not None else (None, None)
+            if is_cancelled(cancel_token):
+                pass
+            elif audio_bytes and blendshapes:
+                audio_queue.put(make_audio_item(audio_bytes, blendshapes, cancel_token))
             else:
                 print("❌ Failed to retrieve audio and blendshapes for chunk:", chunk)
         else:
             # Generate audio using the chosen TTS engine.
-            if USE_LOCAL_AUDIO:
-                audio_bytes = call_local_tts(chunk)
-            else:
-                audio_bytes = get_elevenlabs_audio(chunk, VOICE_NAME)
+            with tracer.span("tts", cancel_token, chars=len(chunk)):
+                if USE_LOCAL_AUDIO:
+                    audio_bytes = run_cancellable(call_local_tts, cancel_token, chunk)
+                else:
+                    audio_bytes = run_cancellable(get_elevenlabs_audio, cancel_token, chunk, VOICE_NAME)
 
-            if audio_bytes:
-                # Retrieve facial/blendshape data using the separate API.
-                facial_data = send_audio_to_neurosync(audio_bytes)
-                if facial_data:
-                    audio_queue.put((audio_bytes, facial_data))
+            if is_cancelled(cancel_token):
+                pass
+            elif audio_bytes:
+                # Retrieve facial/blendshape data using the separate API (skipped if the turn was cancelled meanwhile).
+                with tracer.span("blendshapes", cancel_token):
+                    facial_data = run_cancellable(send_audio_to_neurosync, cancel_token, audio_bytes)
+                if is_cancelled(cancel_token):
+                    pass
+                elif facial_data:
+                    audio_queue.put(make_audio_item(audio_bytes, facial_data, cancel_token))
                 else:
                     print("❌ Failed to get facial data for chunk:", chunk)
             else:
                 print("❌ TTS generation failed for chunk:", chunk)
 
         chunk_queue.task_done()
+
+
+def make_audio_item(audio_bytes, facial_data, cancel_token=None):
+    if cancel_token is None:
+        return (audio_bytes, facial_data)
+    return (audio_bytes, facial_data, cancel_token)
@@ -0,0 +1,94 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/vector_db/bench_ann.py
+#
+# Recall and latency of the IVF index against exact search.
+#   python -m utils.vector_db.bench_ann                                  # 10k and 100k vectors, dim 256
+#   python -m utils.vector_db.bench_ann --sizes 10000 1000000 --dim 128  # up to 1M (needs ~0.5 GB at dim 128)
+#
+# Vectors are drawn around random cluster centres (embeddings of real text are
+# clustered too); queries are perturbed copies of stored vectors.
+
+import time
+import argparse
+import numpy as np
+
+from utils.vector_db.ivf_index import IVFIndex
+
+
+def make_dataset(count, dim, n_clusters=256, spread=1.5, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, 100000):
+        block = min(100000, count - start)
+        labels = rng.integers(0, n_clusters, block)
+        vectors[start:start + block] = centres[labels] + spread * rng.standard_normal((block, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(vectors, count, noise=1.0, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)]
+    queries = queries + noise * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_top(vectors, query, top_n):
+    scores = vectors @ query
+    top = np.argpartition(-scores, top_n - 1)[:top_n]
+    return top[np.argsort(-scores[top])]
+
+
+def percentiles(latencies):
+    values = np.array(latencies) * 1000
+    return np.percentile(values, 50), np.percentile(values, 99)
+
+
+def run(count, dim, top_n=10, n_queries=200, probes=(1, 4, 8, 16, 32, None)):
+    vectors = make_dataset(count, dim)
+    queries = make_queries(vectors, n_queries)
+
+    exact_results, exact_times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        exact_results.append(exact_top(vectors, query, top_n))
+        exact_times.append(time.perf_counter() - start)
+    p50, p99 = percentiles(exact_times)
+    print(f"\n{count} vectors x {dim} dims, top {top_n}, {n_queries} queries")
+    print(f"  exact       : recall 1.000  p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+
+    index = IVFIndex()
+    start = time.perf_counter()
+    index.build(vectors)
+    print(f"  IVF build   : {len(index.lists)} lists in {time.perf_counter() - start:.2f} s")
+
+    for n_probe in probes:
+        # None is the index's own default (a fraction of n_lists).
+        label = f"{n_probe:>3}" if n_probe else f"{index.default_probe():>3} (default)"
+        hits, times = 0, []
+        for query, truth in zip(queries, exact_results):
+            start = time.perf_counter()
+            ids, _ = index.search(vectors, query, top_n, n_probe)
+            times.append(time.perf_counter() - start)
+            hits += len(np.intersect1d(ids, truth))
+        p50, p99 = percentiles(times)
+        print(f"  n_probe {label} : recall {hits / (top_n * n_queries):.3f}  p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF vs exact vector search benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    for count in args.sizes:
+        run(count, args.dim, args.top, args.queries)
+
+
+if __name__ == "__main__":
+    main()
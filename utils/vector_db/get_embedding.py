@@ -3,19 +3,197 @@
 # Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
 
 import os
-import requests
-from config import USE_OPENAI_EMBEDDING, EMBEDDING_LOCAL_SERVER_URL, EMBEDDING_OPENAI_MODEL, LOCAL_EMBEDDING_SIZE, OPENAI_EMBEDDING_SIZE
+import re
+import dbm
+import atexit
+import hashlib
+from array import array
+from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-def get_embedding(text: str, use_openai: bool = USE_OPENAI_EMBEDDING, openai_api_key: str = None, local_server_url: str = EMBEDDING_LOCAL_SERVER_URL) -> list:
+from utils.http_session import get_http_session
+from config import (USE_OPENAI_EMBEDDING, EMBEDDING_LOCAL_SERVER_URL, EMBEDDING_OPENAI_MODEL, EMBEDDING_CACHE_SIZE,
+                    EMBEDDING_DISK_CACHE, EMBEDDING_DISK_CACHE_SIZE)
+
+# Embedding requests run here: local batches fan out over it, and storage embeddings run off the turn's critical path.
+embedding_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="embedding")
+
+# The disk cache is two dbm generations of up to EMBEDDING_DISK_CACHE_SIZE / 2 entries each.
+DISK_GENERATIONS = 2
+
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed by sha256(model, text), backed by an optional
+    on-disk cache so embeddings survive restarts. Values are stored as float32
+    bytes.
+
+    The disk cache is generational: new embeddings go to the current dbm file;
+    once it holds max_disk_size / 2 entries the older file is deleted and a new
+    one started. A hit in the older file is copied into the current one, so
+    embeddings in use survive rotation. Hits never write to disk otherwise,
+    eviction needs no scan, and deleting whole files keeps the size bounded
+    even with dbm.dumb (which never reclaims deleted records).
+    """
+
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, disk_path=EMBEDDING_DISK_CACHE,
+                 max_disk_size=EMBEDDING_DISK_CACHE_SIZE):
+        self.max_size = max_size
+        self.disk_path = disk_path
+        self.max_disk_size = max_disk_size
+        self.memory = OrderedDict()
+        self.lock = Lock()
+        # [(generation number, dbm)], oldest first; the last one takes new entries.
+        self.generations = None
+        self.current_count = 0
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _generation_files(self):
+        """
+        {generation number: [file paths]} for the dbm files next to disk_path.
+        """
+        directory = os.path.dirname(self.disk_path) or "."
+        pattern = re.compile(re.escape(os.path.basename(self.disk_path)) + r"\.(\d+)(\..*)?$")
+        files = {}
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match:
+                files.setdefault(int(match.group(1)), []).append(os.path.join(directory, name))
+        return files
+
+    def _open_generation(self, number):
+        return number, dbm.open(f"{self.disk_path}.{number}", "c")
+
+    def _open_disk(self):
+        if self.generations is None and self.disk_path:
+            try:
+                os.makedirs(os.path.dirname(self.disk_path) or ".", exist_ok=True)
+                files = self._generation_files()
+                numbers = sorted(files)[-DISK_GENERATIONS:] or [0]
+                for number in sorted(files)[:-DISK_GENERATIONS]:
+                    self._remove_files(files[number])
+                self.generations = [self._open_generation(number) for number in numbers]
+                self.current_count = len(self.generations[-1][1])
+            except Exception as e:
+                print(f"Embedding disk cache disabled: {e}")
+                self.generations = None
+                self.disk_path = None
+        return self.generations
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _rotate(self):
+        number, current = self.generations[-1]
+        if len(self.generations) >= DISK_GENERATIONS:
+            oldest_number, oldest = self.generations.pop(0)
+            oldest.close()
+            self._remove_files(self._generation_files().get(oldest_number, []))
+        self.generations.append(self._open_generation(number + 1))
+        self.current_count = 0
+
+    def _store(self, key, value):
+        current = self.generations[-1][1]
+        if key not in current:
+            self.current_count += 1
+        current[key] = value
+        if self.current_count >= max(1, self.max_disk_size // DISK_GENERATIONS):
+            self._rotate()
+
+    def get(self, key):
+        with self.lock:
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                self.memory.move_to_end(key)
+                return embedding
+            generations = self._open_disk()
+            if generations is not None:
+                for position in range(len(generations) - 1, -1, -1):
+                    disk = generations[position][1]
+                    if key in disk:
+                        value = disk[key]
+                        if position != len(generations) - 1:
+                            # Still in use: keep it through the next rotation.
+                            self._store(key, value)
+                        embedding = array("f", value).tolist()
+                        self._remember(key, embedding)
+                        return embedding
+        return None
+
+    def put(self, key, embedding):
+        with self.lock:
+            self._remember(key, embedding)
+            if self._open_disk() is not None:
+                self._store(key, array("f", embedding).tobytes())
+
+    def close(self):
+        with self.lock:
+            for _, disk in self.generations or ():
+                disk.close()
+            self.generations = None
+
+    def _remember(self, key, embedding):
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+
+embedding_cache = EmbeddingCache()
+atexit.register(embedding_cache.close)
+
+
+def get_embedding(text: str, use_openai: bool = USE_OPENAI_EMBEDDING, openai_api_key: str = None, local_server_url: str = EMBEDDING_LOCAL_SERVER_URL,
+                  use_cache: bool = True) -> list:
+    return get_embeddings([text], use_openai, openai_api_key, local_server_url, use_cache)[0]
+
+
+def get_embeddings(texts: list, use_openai: bool = USE_OPENAI_EMBEDDING, openai_api_key: str = None, local_server_url: str = EMBEDDING_LOCAL_SERVER_URL,
+                   use_cache: bool = True) -> list:
+    """
+    Embeddings for several texts, in order. Cached texts are served from the
+    cache; the rest go to OpenAI as one batched request, or to the local
+    server as parallel requests on pooled connections. Failed embeddings come
+    back as None (the error is printed) and are not cached; callers must not
+    store or search with them.
+    use_cache=False skips the cache both ways, for texts that will never be
+    asked for again (e.g. a timestamped exchange being stored).
+    """
+    model = EMBEDDING_OPENAI_MODEL if use_openai else f"local:{local_server_url}"
+    keys = [EmbeddingCache.key(model, text) for text in texts]
+    results = [embedding_cache.get(key) if use_cache else None for key in keys]
+    missing = [i for i, embedding in enumerate(results) if embedding is None]
+    if not missing:
+        return results
+
+    missing_texts = [texts[i] for i in missing]
     if use_openai:
-        return get_openai_embedding(text, openai_api_key)
+        fetched = get_openai_embeddings(missing_texts, openai_api_key)
+    elif len(missing_texts) == 1:
+        fetched = [get_local_embedding(missing_texts[0], local_server_url)]
     else:
-        return get_local_embedding(text, local_server_url)
+        fetched = list(embedding_executor.map(lambda text: get_local_embedding(text, local_server_url), missing_texts))
+
+    for i, embedding in zip(missing, fetched):
+        results[i] = embedding
+        if use_cache and embedding is not None:
+            embedding_cache.put(keys[i], embedding)
+    return results
+
 
 def get_local_embedding(text: str, local_server_url: str) -> list:
     try:
         payload = {"text": text}
-        response = requests.post(local_server_url, json=payload, timeout=10)
+        response = get_http_session().post(local_server_url, json=payload, timeout=10)
         response.raise_for_status()
         data = response.json()
         embedding = data.get("embedding")
@@ -24,9 +202,14 @@ def get_local_embedding(text: str, local_server_url: str) -> list:
         return embedding
     except Exception as e:
         print(f"Error in local embedding provider: {e}")
-        return [0.0] * LOCAL_EMBEDDING_SIZE
+        return None
+
 
 def get_openai_embedding(text: str, openai_api_key: str = None) -> list:
+    return get_openai_embeddings([text], openai_api_key)[0]
+
+
+def get_openai_embeddings(texts: list, openai_api_key: str = None) -> list:
     try:
         if openai_api_key is None:
             openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -38,19 +221,20 @@ def get_openai_embedding(text: str, openai_api_key: str = None) -> list:
             "Authorization": f"Bearer {openai_api_key}",
             "Content-Type": "application/json"
         }
-        payload = {"input": text, "model": EMBEDDING_OPENAI_MODEL}
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
+        payload = {"input": texts, "model": EMBEDDING_OPENAI_MODEL}
+        response = get_http_session().post(url, headers=headers, json=payload, timeout=10)
         response.raise_for_status()
         data = response.json()
-        if "data" in data and len(data["data"]) > 0:
-            embedding = data["data"][0].get("embedding")
-            if embedding is None:
-                raise ValueError("No 'embedding' key in the OpenAI response data.")
-            return embedding
+        if "data" in data and len(data["data"]) == len(texts):
+            embeddings = [None] * len(texts)
+            for position, item in enumerate(data["data"]):
+                embedding = item.get("embedding")
+                if embedding is None:
+                    raise ValueError("No 'embedding' key in the OpenAI response data.")
+                embeddings[item.get("index", position)] = embedding
+            return embeddings
         else:
             raise ValueError("Invalid response structure from OpenAI embeddings API.")
     except Exception as e:
         print(f"Error in OpenAI embedding provider: {e}")
-        return [0.0] * OPENAI_EMBEDDING_SIZE
-
-
+        return [None for _ in texts]
@@ -0,0 +1,159 @@
+# This software is licensed under a **dual-license model**
+# For individuals and businesses earning **under $1M per year**, this software is licensed under the **MIT License**
+# Businesses or organizations with **annual revenue of $1,000,000 or more** must obtain permission to use this software commercially.
+
+# utils/vector_db/ivf_index.py
+#
+# Optional approximate nearest-neighbour index for VectorDB, pure NumPy.
+# IVF (inverted file): spherical k-means splits the unit-length embeddings into
+# n_lists clusters; a query only scores the rows in the n_probe clusters whose
+# centroids are closest to it. Raising n_probe trades latency for recall
+# (n_probe == n_lists is exact search); by default it scales with n_lists.
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of an external, normalised float32 matrix.
+
+    The index stores only row ids per cluster; the vectors stay in the caller's
+    matrix. Rows added after training are assigned to their nearest centroid
+    (incremental update). needs_training() turns True once the collection
+    reaches min_train_size, and again each time it has grown by retrain_growth
+    since the last training; the caller then builds a replacement with
+    trained() (which leaves this index untouched) and swaps it in.
+
+    n_probe=None probes probe_fraction of the lists (at least min_probe).
+    """
+
+    def __init__(self, n_lists=None, n_probe=None, min_train_size=1000, train_iters=10,
+                 sample_per_list=64, retrain_growth=4.0, seed=0, probe_fraction=0.25, min_probe=16):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.probe_fraction = probe_fraction
+        self.min_probe = min_probe
+        self.min_train_size = min_train_size
+        self.train_iters = train_iters
+        self.sample_per_list = sample_per_list
+        self.retrain_growth = retrain_growth
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+        self.lists = []
+        self.list_sizes = None
+        self.trained_size = 0
+        self.size = 0
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def needs_training(self):
+        if not self.is_trained:
+            return self.size >= self.min_train_size
+        return self.size >= self.trained_size * self.retrain_growth
+
+    def default_probe(self):
+        if self.n_probe:
+            return self.n_probe
+        return max(self.min_probe, int(np.ceil(len(self.lists) * self.probe_fraction)))
+
+    def _assign(self, vectors, batch_size=65536):
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            block = vectors[start:start + batch_size]
+            labels[start:start + batch_size] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def _kmeans(self, sample, n_lists):
+        centroids = sample[self.rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.train_iters):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty clusters from random points so every list stays useful.
+            sums[empty] = sample[self.rng.choice(len(sample), int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = sums / norms
+        return np.ascontiguousarray(centroids, dtype=np.float32)
+
+    def build(self, vectors):
+        """
+        Train centroids on (a sample of) vectors and assign every row.
+        Below min_train_size the index stays untrained and callers use exact search.
+        """
+        count = len(vectors)
+        self.size = count
+        if count < self.min_train_size:
+            self.centroids = None
+            self.lists = []
+            return
+        n_lists = self.n_lists or max(1, int(np.sqrt(count)))
+        n_lists = min(n_lists, count)
+        sample_size = min(count, n_lists * self.sample_per_list)
+        sample = vectors[self.rng.choice(count, sample_size, replace=False)] if sample_size < count else vectors
+        self.centroids = self._kmeans(np.asarray(sample, dtype=np.float32), n_lists)
+
+        labels = self._assign(vectors)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(n_lists)]
+        self.list_sizes = np.array([len(ids) for ids in self.lists], dtype=np.int64)
+        self.trained_size = count
+
+    def trained(self, vectors):
+        """
+        A new index with the same settings, built on vectors. Does not touch
+        this one, so it can run on a snapshot outside the caller's lock.
+        """
+        index = IVFIndex(self.n_lists, self.n_probe, self.min_train_size, self.train_iters,
+                         self.sample_per_list, self.retrain_growth, probe_fraction=self.probe_fraction,
+                         min_probe=self.min_probe)
+        index.rng = self.rng
+        index.build(vectors)
+        return index
+
+    def add(self, row_id, vector):
+        """
+        Incremental update for one new row (only counted until the index is trained).
+        """
+        self.size = max(self.size, row_id + 1)
+        if not self.is_trained:
+            return
+        label = int(np.argmax(self.centroids @ vector))
+        ids = self.lists[label]
+        if len(ids) == self.list_sizes[label]:
+            grown = np.empty(max(8, len(ids) * 2), dtype=np.int64)
+            grown[:len(ids)] = ids
+            self.lists[label] = ids = grown
+        ids[self.list_sizes[label]] = row_id
+        self.list_sizes[label] += 1
+
+    def candidates(self, query, n_probe=None):
+        """
+        Row ids in the n_probe clusters nearest to the (normalised) query.
+        """
+        n_probe = min(n_probe or self.default_probe(), len(self.lists))
+        centroid_scores = self.centroids @ query
+        if n_probe < len(self.lists):
+            probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            probe = np.arange(len(self.lists))
+        return np.concatenate([self.lists[i][:self.list_sizes[i]] for i in probe])
+
+    def search(self, vectors, query, top_n, n_probe=None):
+        """
+        Approximate top_n by cosine similarity. Returns (row_ids, scores), best first.
+        """
+        ids = self.candidates(query, n_probe)
+        if ids.size == 0:
+            return ids, np.zeros(0, dtype=np.float32)
+        scores = vectors[ids] @ query
+        if top_n < ids.size:
+            top = np.argpartition(-scores, top_n - 1)[:top_n]
+        else:
+            top = np.arange(ids.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return ids[top], scores[top]
@@ -5,47 +5,274 @@
 import os
 import json
 import numpy as np
+from threading import RLock, Thread
 
-# Define the path for the persistent vector DB JSON file.
+from utils.vector_db.ivf_index import IVFIndex
+from config import VECTOR_DB_ANN, VECTOR_DB_ANN_PROBES
+
+# Legacy JSON vector DB; the binary files below are named after it and it is migrated on first load.
 VECTOR_DB_FILE = "chat_logs/vector_db.json"
 
+
+def _fsync_append(path: str, data: bytes):
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
 class VectorDB:
-    def __init__(self, db_file: str = VECTOR_DB_FILE):
+    """
+    Vector store for conversation memories.
+
+    Embeddings live in one contiguous float32 matrix with every row normalised
+    to unit length when it is added; `entries` is the parallel list of text and
+    metadata. A search is then a single matrix-vector product followed by a
+    partial sort of the top_n scores.
+
+    On disk (next to db_file): <name>.f32 holds the raw float32 rows, <name>.jsonl
+    holds one text/metadata line per row and <name>.meta.json the dimension.
+    Adding an entry appends one row and then one line; on load a partial row, or
+    a row without its line (crash in between), is cut off the files.
+
+    Loaded rows stay memory-mapped (read-only, paged in by the OS as searches
+    touch them) rather than read into RAM. The first add_entry copies them into
+    a growable in-memory matrix.
+
+    With an `index` (e.g. IVFIndex) searches are approximate once the index is
+    trained; exact search is used until then or with exact=True. When the index
+    asks for (re)training, a replacement is trained on a background thread from
+    a snapshot of the rows and swapped in, so add_entry and search never wait
+    on k-means.
+    """
+
+    def __init__(self, db_file: str = VECTOR_DB_FILE, index=None):
         self.db_file = db_file
+        base = os.path.splitext(db_file)[0]
+        self.vectors_file = base + ".f32"
+        self.entries_file = base + ".jsonl"
+        self.meta_file = base + ".meta.json"
         self.entries = []
+        self.dimension = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self.index = index
+        # add_entry may run on a background thread while searches happen on the main one.
+        self.lock = RLock()
+        self._retraining = False
+        # Bumped whenever the rows are replaced (load, compact); a retrain started before is dropped.
+        self._generation = 0
         self.load()
 
+    @property
+    def embeddings(self) -> np.ndarray:
+        """
+        The normalised embedding matrix, one row per entry (a view, do not modify).
+        """
+        return self._vectors[:len(self.entries)]
+
+    def _reset(self):
+        self.entries = []
+        self.dimension = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def _normalise_rows(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _set_matrix(self, embeddings: list):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        self.dimension = matrix.shape[1]
+        self._vectors = np.ascontiguousarray(self._normalise_rows(matrix))
+
+    def _append_vector(self, vector: np.ndarray):
+        count = len(self.entries)
+        if count == self._vectors.shape[0]:
+            # Grow geometrically so appends stay amortised O(dimension).
+            grown = np.zeros((max(16, count * 2), self.dimension), dtype=np.float32)
+            grown[:count] = self._vectors[:count]
+            self._vectors = grown
+        self._vectors[count] = vector
+
     def load(self):
-        if os.path.exists(self.db_file):
-            try:
-                with open(self.db_file, "r", encoding="utf-8") as f:
-                    self.entries = json.load(f)
-            except (json.JSONDecodeError, Exception) as e:
-                print(f"Error loading vector DB: {e}")
-                self.entries = []
+        self._reset()
+        try:
+            if not os.path.exists(self.meta_file) and self.db_file.endswith(".json") and os.path.exists(self.db_file):
+                self._migrate_json()
+            elif os.path.exists(self.meta_file):
+                self._load_binary()
+        except (json.JSONDecodeError, Exception) as e:
+            print(f"Error loading vector DB: {e}")
+            self._reset()
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        with self.lock:
+            self._generation += 1
+            if self.index is not None:
+                self.index.build(self.embeddings)
+
+    def _retrain_index(self):
+        # Rows are only ever appended (growing the matrix copies it), so this view stays a valid snapshot.
+        if self._retraining:
+            return
+        self._retraining = True
+        Thread(target=self._retrain, args=(self.index, self.embeddings, self._generation), daemon=True).start()
+
+    def _retrain(self, index, snapshot, generation):
+        try:
+            new_index = index.trained(snapshot)
+        except Exception as e:
+            print(f"Error retraining vector DB index: {e}")
+            new_index = None
+        with self.lock:
+            self._retraining = False
+            if new_index is None or generation != self._generation or index is not self.index:
+                return
+            # Rows added while training went to the old index only.
+            for row_id in range(len(snapshot), len(self.entries)):
+                new_index.add(row_id, self._vectors[row_id])
+            self.index = new_index
+            if new_index.needs_training():
+                self._retrain_index()
+
+    def _load_binary(self):
+        with open(self.meta_file, "r", encoding="utf-8") as f:
+            self.dimension = json.load(f)["dimension"]
+
+        entries, entries_end = [], 0
+        if os.path.exists(self.entries_file):
+            with open(self.entries_file, "rb") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break
+                    entries_end += len(line)
+
+        row_bytes = self.dimension * 4
+        vectors_size = os.path.getsize(self.vectors_file) if os.path.exists(self.vectors_file) else 0
+        stored_rows = vectors_size // row_bytes
+        if vectors_size % row_bytes:
+            # A torn row would shift every row appended after it.
+            print(f"Vector DB: dropping a partial row at the end of {self.vectors_file}.")
+            with open(self.vectors_file, "r+b") as f:
+                f.truncate(stored_rows * row_bytes)
+
+        entries_size = os.path.getsize(self.entries_file) if os.path.exists(self.entries_file) else 0
+        count = min(len(entries), stored_rows)
+        if count < len(entries) or count < stored_rows or entries_end < entries_size:
+            print(f"Vector DB: dropping incomplete writes, keeping {count} entries.")
+            self._truncate_files(count, entries_end if count == len(entries) else None)
+
+        self.entries = entries[:count]
+        if count:
+            self._vectors = np.memmap(self.vectors_file, dtype=np.float32, mode="r", shape=(count, self.dimension))
         else:
-            self.entries = []
+            self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+
+    def _truncate_files(self, count: int, entries_end: int = None):
+        if os.path.exists(self.vectors_file):
+            with open(self.vectors_file, "r+b") as f:
+                f.truncate(count * self.dimension * 4)
+        if not os.path.exists(self.entries_file):
+            return
+        if entries_end is None:
+            entries_end = 0
+            with open(self.entries_file, "rb") as f:
+                for _ in range(count):
+                    entries_end += len(f.readline())
+        with open(self.entries_file, "r+b") as f:
+            f.truncate(entries_end)
+
+    def _migrate_json(self):
+        with open(self.db_file, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored:
+            self._set_matrix([entry["embedding"] for entry in stored])
+            self.entries = [{k: v for k, v in entry.items() if k != "embedding"} for entry in stored]
+            self.save()
+            print(f"Migrated {len(self.entries)} vector DB entries from {self.db_file} to {self.vectors_file}.")
+
+    def _write_meta(self):
+        with open(self.meta_file, "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "dtype": "float32"}, f)
 
     def save(self):
+        """
+        Rewrite the binary files from memory (compaction). Each file is written
+        to a temporary name and swapped in, so a crash leaves the old copy intact.
+        """
+        if self.dimension is None:
+            return
+        if isinstance(self._vectors, np.memmap):
+            # Windows cannot replace a file that is still mapped.
+            self._vectors = np.array(self._vectors)
         try:
-            with open(self.db_file, "w", encoding="utf-8") as f:
-                json.dump(self.entries, f, indent=4)
+            tmp_vectors, tmp_entries = self.vectors_file + ".tmp", self.entries_file + ".tmp"
+            with open(tmp_vectors, "wb") as f:
+                f.write(np.ascontiguousarray(self.embeddings).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(tmp_entries, "w", encoding="utf-8") as f:
+                for entry in self.entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._write_meta()
+            os.replace(tmp_vectors, self.vectors_file)
+            os.replace(tmp_entries, self.entries_file)
         except Exception as e:
             print(f"Error saving vector DB: {e}")
 
+    def compact(self, keep=None):
+        """
+        Offline compaction: optionally drop entries for which keep(entry) is
+        False, then rewrite both files without any leftover partial writes.
+        """
+        if keep is not None and self.entries:
+            mask = np.array([bool(keep(entry)) for entry in self.entries])
+            self._vectors = np.ascontiguousarray(self.embeddings[mask])
+            self.entries = [entry for entry, kept in zip(self.entries, mask) if kept]
+            self.rebuild_index()
+        self.save()
+
     def add_entry(self, embedding: list, text: str, metadata: dict = None):
         if len(embedding) != 768:
             print("Warning: Embedding length is not 768.")
+        with self.lock:
+            if self.dimension is None:
+                self.dimension = len(embedding)
+                self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            elif len(embedding) != self.dimension:
+                print(f"Error: embedding length {len(embedding)} does not match the DB ({self.dimension}); entry not added.")
+                return
 
-        entry = {
-            "embedding": embedding,
-            "text": text
-        }
-        if metadata:
-            entry["metadata"] = metadata
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
 
-        self.entries.append(entry)
-        self.save()
+            entry = {"text": text}
+            if metadata:
+                entry["metadata"] = metadata
+
+            try:
+                if not os.path.exists(self.meta_file):
+                    self._write_meta()
+                # Row first, then the entry line that commits it.
+                _fsync_append(self.vectors_file, vector.astype(np.float32).tobytes())
+                _fsync_append(self.entries_file, (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            except Exception as e:
+                print(f"Error saving vector DB: {e}")
+
+            self._append_vector(vector)
+            self.entries.append(entry)
+            if self.index is not None:
+                self.index.add(len(self.entries) - 1, vector)
+                if self.index.needs_training():
+                    self._retrain_index()
 
     def cosine_similarity(self, vec1: list, vec2: list) -> float:
         if len(vec1) != len(vec2):
@@ -59,13 +286,41 @@ class VectorDB:
             return 0.0
         return float(np.dot(arr1, arr2) / (norm1 * norm2))
 
-    def search(self, query_embedding: list, top_n: int = 4) -> list:
-        results = []
-        for entry in self.entries:
-            sim = self.cosine_similarity(query_embedding, entry["embedding"])
-            results.append({"entry": entry, "similarity": sim})
-        results.sort(key=lambda x: x["similarity"], reverse=True)
-        return results[:top_n]
+    def _normalised_query(self, query_embedding: list):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[0] != self.dimension:
+            raise ValueError("Both embeddings must be of the same length.")
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else None
+
+    def similarities(self, query_embedding: list) -> np.ndarray:
+        """
+        Cosine similarity of the query against every entry (query norm computed once).
+        """
+        if not self.entries:
+            return np.zeros(0, dtype=np.float32)
+        query = self._normalised_query(query_embedding)
+        if query is None:
+            return np.zeros(len(self.entries), dtype=np.float32)
+        return self.embeddings @ query
+
+    def search(self, query_embedding: list, top_n: int = 4, exact: bool = False, n_probe: int = None) -> list:
+        with self.lock:
+            if top_n <= 0 or not self.entries:
+                return []
+            if not exact and self.index is not None and self.index.is_trained:
+                query = self._normalised_query(query_embedding)
+                if query is not None:
+                    ids, scores = self.index.search(self.embeddings, query, top_n, n_probe)
+                    return [{"entry": self.entries[i], "similarity": float(score)} for i, score in zip(ids, scores)]
+
+            scores = self.similarities(query_embedding)
+            if top_n < scores.size:
+                top = np.argpartition(-scores, top_n - 1)[:top_n]
+                top = top[np.argsort(-scores[top], kind="stable")]
+            else:
+                top = np.argsort(-scores, kind="stable")
+            return [{"entry": self.entries[i], "similarity": float(scores[i])} for i in top]
 
     def get_context_string(self, query_embedding: list, top_n: int = 4) -> str:
         results = self.search(query_embedding, top_n)
@@ -83,4 +338,14 @@ class VectorDB:
         
         return context_str
 
-vector_db = VectorDB()
+vector_db = VectorDB(index=IVFIndex(n_probe=VECTOR_DB_ANN_PROBES) if VECTOR_DB_ANN else None)
+
+
+if __name__ == "__main__":
+    # Offline maintenance: python -m utils.vector_db.vector_db compact
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "compact":
+        vector_db.compact()
+        print(f"Compacted vector DB: {len(vector_db.entries)} entries.")
+    else:
+        print("Usage: python -m utils.vector_db.vector_db compact")
@@ -5,19 +5,56 @@
 # utils/vector_db/vector_db_utils.py
 
 from datetime import datetime, timezone
-from utils.vector_db.get_embedding import get_embedding  
+from utils.vector_db.get_embedding import get_embedding, embedding_executor
 
 def update_system_message_with_context(user_input: str, base_system_message: str, vector_db, top_n: int = 4) -> str:
     
-    retrieval_embedding = get_embedding(user_input, use_openai=False)
-    context_string = vector_db.get_context_string(retrieval_embedding, top_n=top_n)
+    return base_system_message + build_turn_context(user_input, vector_db, top_n=top_n)
+
+
+def build_turn_context(user_input: str, vector_db=None, top_n: int = 4) -> str:
+    """
+    The part of the system prompt that changes every turn: related memories
+    from the vector DB (if one is given) and the current time. Sent after the
+    chat history (see build_llm_payload) so the prefix before it stays cacheable.
+    """
+    context_string = ""
+    if vector_db is not None:
+        retrieval_embedding = get_embedding(user_input, use_openai=False)
+        if retrieval_embedding is not None:
+            context_string = vector_db.get_context_string(retrieval_embedding, top_n=top_n)
     current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S GMT")
-    return f"{base_system_message}{context_string}\nThe current time and date is: {current_time}"
+    return f"{context_string}\nThe current time and date is: {current_time}"
 
 
-def add_exchange_to_vector_db(user_input: str, response: str, vector_db):
+def format_exchange(user_input: str, response: str) -> str:
+    """
+    The text stored (and embedded) in the vector DB for one exchange.
+    """
     timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S GMT")
-    combined_text = f"User: {user_input}\nYou: {response}\nTimestamp: {timestamp}\n"
-    combined_embedding = get_embedding(combined_text, use_openai=False)
-    vector_db.add_entry(combined_embedding, combined_text)
+    return f"User: {user_input}\nYou: {response}\nTimestamp: {timestamp}\n"
+
+
+def add_exchange_to_vector_db(user_input: str, response: str, vector_db, background: bool = False):
+    """
+    Embed the exchange and store it. With background=True the embedding
+    request and the write run on the embedding executor and a Future is
+    returned, so the next turn's retrieval embedding does not wait for it.
+    """
+    combined_text = format_exchange(user_input, response)
+    if background:
+        return embedding_executor.submit(_store_exchange, combined_text, vector_db)
+    _store_exchange(combined_text, vector_db)
+
+
+def _store_exchange(combined_text: str, vector_db):
+    try:
+        # Each stored text carries its own timestamp, so it would never be a cache hit.
+        combined_embedding = get_embedding(combined_text, use_openai=False, use_cache=False)
+        if combined_embedding is None:
+            print("Exchange not stored in vector DB: embedding failed.")
+            return
+        vector_db.add_entry(combined_embedding, combined_text)
+    except Exception as e:
+        print(f"Error storing exchange in vector DB: {e}")
 